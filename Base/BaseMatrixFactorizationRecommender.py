@@ -8,59 +8,205 @@ Created on 16/09/2017
 
 from Base.BaseRecommender import BaseRecommender
 from KNN.ItemKNNCustomSimilarityRecommender import ItemKNNCustomSimilarityRecommender
-from Base.Recommender_utils import check_matrix
-import pickle
+from Base.Recommender_utils import check_matrix, get_block_size_for_available_memory, is_in_sorted_keys
+from Base.ClusteredMIPSIndex import ClusteredMIPSIndex
+from Utils.shared_memory_sparse import dense_to_shared_memory, release_shared_memory
+from Utils.pool_worker_state import init_worker_state, get_worker_state
+import pickle, time, sys, multiprocessing
 import numpy as np
 import scipy.sparse as sps
 
 
-def compute_W_sparse_from_item_latent_factors(ITEM_factors, topK=100):
+def compute_item_block_topK(ITEM_factors, start_item, end_item, topK):
+    """
+    Computes the similarity of the items [start_item, end_item) with all items and selects the TopK of each of them
+    :param ITEM_factors:    array (n_items, n_factors)
+    :param start_item:
+    :param end_item:
+    :param topK:
+    :return: neighbours, weights arrays (end_item - start_item, topK)
+    """
+
+    this_block_weight = np.dot(ITEM_factors[start_item:end_item, :], ITEM_factors.T)
+
+    neighbours, weights = _select_rows_topK(this_block_weight, topK)
+
+    return neighbours.astype(np.int32), weights.astype(np.float32)
+
+
+def _select_rows_topK(block_weight, topK):
+    """
+    Selects the TopK values of each row of a dense block without partitioning all the columns.
+    The columns are split in groups, the TopK-th largest group maximum is a lower bound of the TopK-th value of the row
+    and only the few values above it are sorted. The rows with many values tied at the lower bound, e.g., the
+    similarities of items with all-zero latent factors, are partitioned instead
+    :param block_weight:    array (n_rows, n_columns)
+    :param topK:            <= n_columns
+    :return: columns, values arrays (n_rows, topK)
+    """
+
+    n_rows, n_columns = block_weight.shape
+
+    group_size = n_columns // (4 * topK)
+
+    if group_size <= 1:
+        columns = np.argpartition(-block_weight, topK - 1, axis=1)[:, :topK]
+        return columns, np.take_along_axis(block_weight, columns, axis=1)
+
+    n_groups = n_columns // group_size
+
+    group_max = block_weight[:, :n_groups * group_size].reshape(n_rows, n_groups, group_size).max(axis=2)
+
+    if n_groups * group_size < n_columns:
+        group_max[:, -1] = np.maximum(group_max[:, -1], block_weight[:, n_groups * group_size:].max(axis=1))
+
+    row_threshold = -np.partition(-group_max, topK - 1, axis=1)[:, topK - 1]
+
+    # At least topK candidates for each row
+    candidate_mask = block_weight >= row_threshold[:, None]
+
+    # Sorting the candidates of the rows with many ties costs more than partitioning the whole row
+    partition_row_mask = candidate_mask.sum(axis=1) > 4 * topK
+    candidate_mask[partition_row_mask] = False
+
+    columns = np.empty((n_rows, topK), dtype=np.int64)
+    values = np.empty((n_rows, topK), dtype=block_weight.dtype)
+
+    if partition_row_mask.any():
+        partition_rows = np.nonzero(partition_row_mask)[0]
+        partition_weight = block_weight[partition_rows]
+
+        columns[partition_rows] = np.argpartition(-partition_weight, topK - 1, axis=1)[:, :topK]
+        values[partition_rows] = np.take_along_axis(partition_weight, columns[partition_rows], axis=1)
+
+    # Candidates of the other rows, sorted by row and decreasing value
+    candidate_position = np.flatnonzero(candidate_mask)
+    candidate_row, candidate_column = np.divmod(candidate_position, n_columns)
+    candidate_value = block_weight.reshape(-1)[candidate_position]
+
+    sorted_position = np.lexsort((-candidate_value, candidate_row))
+
+    candidate_row_start = np.zeros(n_rows + 1, dtype=np.int64)
+    candidate_row_start[1:] = np.cumsum(np.bincount(candidate_row, minlength=n_rows))
+
+    sorted_rows = np.nonzero(np.logical_not(partition_row_mask))[0]
+    selected_position = sorted_position[(candidate_row_start[sorted_rows, None] + np.arange(topK)).ravel()]
+
+    columns[sorted_rows] = candidate_column[selected_position].reshape(len(sorted_rows), topK)
+    values[sorted_rows] = candidate_value[selected_position].reshape(len(sorted_rows), topK)
+
+    return columns, values
+
+
+def _compute_item_block_topK_worker(block_start_end):
+
+    start_item, end_item = block_start_end
+    worker_state = get_worker_state()
+
+    return compute_item_block_topK(worker_state["ITEM_factors"], start_item, end_item, worker_state["topK"])
+
+
+def compute_W_sparse_from_item_latent_factors(ITEM_factors, topK=100, block_size=None, n_jobs=1, verbose=True):
+    """
+    Computes the item-item similarity as the dot product of the item latent factors, keeping for each item
+    (column of W_sparse) the TopK most similar items
+    :param ITEM_factors:    array (n_items, n_factors)
+    :param topK:
+    :param block_size:      number of items whose similarity is computed at once, if None it depends on the available memory
+    :param n_jobs:          if > 1 the blocks are computed by a pool of processes, ITEM_factors is placed in shared memory
+    :param verbose:
+    :return: W_sparse as csr matrix |items|x|items|
+    """
+
     n_items, n_factors = ITEM_factors.shape
 
-    block_size = 100
+    local_topK = min(topK, n_items)
+
+    n_processes = n_jobs if n_jobs is not None and n_jobs > 1 else 1
+
+    # The size of the dense block depends on the available memory, which is shared by all the processes
+    if block_size is None:
+        block_size = max(1, get_block_size_for_available_memory(n_items) // n_processes)
+
+    block_size = min(block_size, n_items)
+
+    block_list = [(start_item, min(start_item + block_size, n_items)) for start_item in range(0, n_items, block_size)]
+
+    # Typed buffers, row i contains the TopK neighbours of item i
+    neighbours = np.zeros((n_items, local_topK), dtype=np.int32)
+    weights = np.zeros((n_items, local_topK), dtype=np.float32)
+
+    processed_items = 0
+
+    start_time = time.time()
+    start_time_printBatch = start_time
+
+    def _print_progress():
+        print("Processed {} ( {:.2f}% ) in {:.2f} minutes. Items per second: {:.0f}".format(
+            processed_items,
+            100.0 * float(processed_items) / n_items,
+            (time.time() - start_time) / 60,
+            float(processed_items) / (time.time() - start_time)))
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    if n_processes == 1 or len(block_list) == 1:
+
+        for start_item, end_item in block_list:
+
+            neighbours[start_item:end_item], weights[start_item:end_item] = compute_item_block_topK(ITEM_factors,
+                                                                                                    start_item, end_item,
+                                                                                                    local_topK)
+            processed_items += end_item - start_item
+
+            if verbose and time.time() - start_time_printBatch > 60:
+                _print_progress()
+                start_time_printBatch = time.time()
+
+    else:
 
-    start_item = 0
-    end_item = 0
+        ITEM_factors_descriptor, shared_memory_list = dense_to_shared_memory(ITEM_factors)
+        pool = None
 
-    values = []
-    rows = []
-    cols = []
+        try:
+            pool = multiprocessing.Pool(processes=n_processes,
+                                        initializer=init_worker_state,
+                                        initargs=({"ITEM_factors": ITEM_factors_descriptor}, {"topK": local_topK}))
 
-    # Compute all similarities for each item using vectorization
-    while start_item < n_items:
+            for (start_item, end_item), (block_neighbours, block_weights) in zip(block_list,
+                                                                                 pool.imap(_compute_item_block_topK_worker, block_list)):
 
-        end_item = min(n_items, start_item + block_size)
+                neighbours[start_item:end_item] = block_neighbours
+                weights[start_item:end_item] = block_weights
 
-        this_block_weight = np.dot(ITEM_factors[start_item:end_item, :], ITEM_factors.T)
+                processed_items += end_item - start_item
 
-        for col_index_in_block in range(this_block_weight.shape[0]):
-            this_column_weights = this_block_weight[col_index_in_block, :]
-            item_original_index = start_item + col_index_in_block
+                if verbose and time.time() - start_time_printBatch > 60:
+                    _print_progress()
+                    start_time_printBatch = time.time()
 
-            # Sort indices and select TopK
-            # Sorting is done in three steps. Faster then plain np.argsort for higher number of items
-            # - Partition the data to extract the set of relevant items
-            # - Sort only the relevant items
-            # - Get the original item index
-            relevant_items_partition = (-this_column_weights).argpartition(topK - 1)[0:topK]
-            relevant_items_partition_sorting = np.argsort(-this_column_weights[relevant_items_partition])
-            top_k_idx = relevant_items_partition[relevant_items_partition_sorting]
+            pool.close()
+            pool.join()
 
-            # Incrementally build sparse matrix, do not add zeros
-            notZerosMask = this_column_weights[top_k_idx] != 0.0
-            numNotZeros = np.sum(notZerosMask)
+        finally:
+            # If an exception is raised the workers are still attached to the shared memory
+            if pool is not None:
+                pool.terminate()
 
-            values.extend(this_column_weights[top_k_idx][notZerosMask])
-            rows.extend(top_k_idx[notZerosMask])
-            cols.extend(np.ones(numNotZeros) * item_original_index)
+            release_shared_memory(shared_memory_list)
 
-        start_item += block_size
+    # Item i is the column i of W_sparse, the buffers are already in csc layout. Do not add zeros
+    notZerosMask = weights != 0.0
 
-    W_sparse = sps.csr_matrix((values, (rows, cols)),
+    indptr = np.zeros(n_items + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(notZerosMask.sum(axis=1))
+
+    W_sparse = sps.csc_matrix((weights[notZerosMask], neighbours[notZerosMask], indptr),
                               shape=(n_items, n_items),
                               dtype=np.float32)
 
-    return W_sparse
+    return W_sparse.tocsr()
 
 
 class BaseMatrixFactorizationRecommender(BaseRecommender):
@@ -83,15 +229,20 @@ class BaseMatrixFactorizationRecommender(BaseRecommender):
                 self.RECOMMENDER_NAME, self._cold_user_mask.sum(),
                 self._cold_user_mask.sum() / len(self._cold_user_mask) * 100))
 
+        self._MIPS_index = None
+        self._MIPS_index_parameters = None
+        self._MIPS_index_ITEM_factors = None
+
     def _get_cold_user_mask(self):
         return self._cold_user_mask
 
-    def set_URM_train(self, URM_train_new, estimate_model_for_cold_users=False, topK=100, **kwargs):
+    def set_URM_train(self, URM_train_new, estimate_model_for_cold_users=False, topK=100, n_jobs=1, **kwargs):
         """
 
         :param URM_train_new:
         :param estimate_item_similarity_for_cold_users: Set to TRUE if you want to estimate the item-item similarity for cold users to be used as in a KNN algorithm
         :param topK: 100
+        :param n_jobs: number of processes computing the item-item similarity from the ITEM latent factors
         :param kwargs:
         :return:
         """
@@ -110,7 +261,7 @@ class BaseMatrixFactorizationRecommender(BaseRecommender):
 
             print("{}: Estimating ItemKNN model from ITEM latent factors...".format(self.RECOMMENDER_NAME))
 
-            W_sparse = compute_W_sparse_from_item_latent_factors(self.ITEM_factors, topK=topK)
+            W_sparse = compute_W_sparse_from_item_latent_factors(self.ITEM_factors, topK=topK, n_jobs=n_jobs)
 
             self._ItemKNNRecommender = ItemKNNCustomSimilarityRecommender(self.URM_train)
             self._ItemKNNRecommender.fit(W_sparse, topK=topK)
@@ -188,6 +339,126 @@ class BaseMatrixFactorizationRecommender(BaseRecommender):
 
         return item_scores
 
+    def build_MIPS_index(self, n_clusters=None, n_probe=None, random_seed=None):
+        """
+        Builds an approximate maximum inner product index over ITEM_factors. Once built, recommend computes an
+        approximate ranking whenever the scores are not returned and no items_to_compute are given,
+        the evaluators, which require the scores, still use the exact ranking
+        :param n_clusters:      number of inverted lists, if None sqrt(n_items)
+        :param n_probe:         number of inverted lists visited for each user, it controls the recall/speed trade-off
+        :param random_seed:
+        :return:
+        """
+
+        self._MIPS_index = ClusteredMIPSIndex(self.ITEM_factors, n_clusters=n_clusters, n_probe=n_probe,
+                                              random_seed=random_seed)
+
+        self._MIPS_index_parameters = self._MIPS_index.get_parameters()
+        self._MIPS_index_ITEM_factors = self.ITEM_factors
+
+    def set_MIPS_index_n_probe(self, n_probe):
+
+        assert self._MIPS_index is not None, "{}: MIPS index not built".format(self.RECOMMENDER_NAME)
+
+        self._MIPS_index.set_n_probe(n_probe)
+        self._MIPS_index_parameters = self._MIPS_index.get_parameters()
+
+    def clear_MIPS_index(self):
+
+        self._MIPS_index = None
+        self._MIPS_index_parameters = None
+        self._MIPS_index_ITEM_factors = None
+
+    def _get_MIPS_index(self):
+
+        # If the model has been fit again the index is rebuilt with the same parameters
+        if self._MIPS_index_ITEM_factors is not self.ITEM_factors:
+            print("{}: ITEM_factors changed, rebuilding MIPS index...".format(self.RECOMMENDER_NAME))
+            self.build_MIPS_index(**self._MIPS_index_parameters)
+
+        return self._MIPS_index
+
+    def _compute_ranking_batch(self, user_id_array, cutoff, remove_seen_flag, items_to_compute,
+                               remove_top_pop_flag, remove_CustomItems_flag, reuse_scores_buffer=False):
+        """
+        If the MIPS index is built and the scores are not required the ranking of warm users is approximate,
+        the scores_batch returned is None
+        """
+
+        if self._MIPS_index is None or not reuse_scores_buffer or items_to_compute is not None:
+            return super(BaseMatrixFactorizationRecommender, self)._compute_ranking_batch(
+                user_id_array, cutoff, remove_seen_flag, items_to_compute, remove_top_pop_flag,
+                remove_CustomItems_flag, reuse_scores_buffer=reuse_scores_buffer)
+
+        ranking = - np.ones((len(user_id_array), cutoff), dtype=np.int32)
+        ranking_length = np.zeros(len(user_id_array), dtype=int)
+
+        # Cold users may be scored by the KNN model, they use the exact ranking
+        cold_users_MF_mask = self._get_cold_user_mask()[user_id_array]
+        warm_users_MF_mask = np.logical_not(cold_users_MF_mask)
+
+        if cold_users_MF_mask.any():
+            ranking[cold_users_MF_mask], ranking_length[cold_users_MF_mask], _ = \
+                super(BaseMatrixFactorizationRecommender, self)._compute_ranking_batch(
+                    user_id_array[cold_users_MF_mask], cutoff, remove_seen_flag, items_to_compute,
+                    remove_top_pop_flag, remove_CustomItems_flag, reuse_scores_buffer=reuse_scores_buffer)
+
+        if warm_users_MF_mask.any():
+            ranking[warm_users_MF_mask], ranking_length[warm_users_MF_mask] = self._compute_approximate_ranking(
+                user_id_array[warm_users_MF_mask], cutoff, remove_seen_flag, remove_top_pop_flag,
+                remove_CustomItems_flag)
+
+        return ranking, ranking_length, None
+
+    def _compute_approximate_ranking(self, user_id_array, cutoff, remove_seen_flag, remove_top_pop_flag,
+                                     remove_CustomItems_flag):
+        """
+        Ranks only the candidate items returned by the MIPS index
+        :return:    ranking array (len(user_id_array), cutoff) of int32 padded with -1 after the valid items,
+                    array with the number of valid items in each row
+        """
+
+        candidate_items, candidate_scores = self._get_MIPS_index().get_candidates(self.USER_factors[user_id_array])
+
+        valid_candidate_mask = candidate_items >= 0
+        batch_index = np.arange(len(user_id_array))
+
+        if remove_seen_flag:
+            user_profile_array = self.URM_train[user_id_array]
+            user_profile_array.sort_indices()
+
+            seen_keys = np.repeat(batch_index, np.ediff1d(user_profile_array.indptr)).astype(np.int64) * self.n_items + \
+                        user_profile_array.indices
+
+            candidate_keys = batch_index[:, None].astype(np.int64) * self.n_items + candidate_items
+
+            candidate_scores[np.logical_and(is_in_sorted_keys(seen_keys, candidate_keys), valid_candidate_mask)] = -np.inf
+
+        removed_items_mask = np.zeros(self.n_items, dtype=bool)
+
+        if remove_top_pop_flag:
+            removed_items_mask[self.filterTopPop_ItemsID] = True
+
+        if remove_CustomItems_flag:
+            removed_items_mask[self.items_to_ignore_ID] = True
+
+        if removed_items_mask.any():
+            candidate_scores[np.logical_and(removed_items_mask[candidate_items], valid_candidate_mask)] = -np.inf
+
+        # The partition requires more candidates than the cutoff
+        if candidate_scores.shape[1] <= cutoff:
+            n_padding = cutoff + 1 - candidate_scores.shape[1]
+            candidate_scores = np.hstack((candidate_scores, np.full((len(user_id_array), n_padding), -np.inf,
+                                                                    dtype=candidate_scores.dtype)))
+            candidate_items = np.hstack((candidate_items, - np.ones((len(user_id_array), n_padding),
+                                                                    dtype=candidate_items.dtype)))
+
+        candidate_position, ranking_length = self._compute_top_cutoff_positions(candidate_scores, cutoff)
+
+        ranking = np.where(candidate_position >= 0, candidate_items[batch_index[:, None], candidate_position], -1)
+
+        return ranking.astype(np.int32), ranking_length
+
     def saveModel(self, folder_path, file_name=None):
 
         if file_name is None:
@@ -197,10 +468,23 @@ class BaseMatrixFactorizationRecommender(BaseRecommender):
 
         dictionary_to_save = {"USER_factors": self.USER_factors,
                               "ITEM_factors": self.ITEM_factors,
-                              "_cold_user_mask": self._cold_user_mask}
+                              "_cold_user_mask": self._cold_user_mask,
+                              "_MIPS_index_parameters": self._MIPS_index_parameters}
 
         pickle.dump(dictionary_to_save,
                     open(folder_path + file_name, "wb"),
                     protocol=pickle.HIGHEST_PROTOCOL)
 
         print("{}: Saving complete".format(self.RECOMMENDER_NAME, folder_path + file_name))
+
+    def loadModel(self, folder_path, file_name=None):
+
+        self._MIPS_index_parameters = None
+
+        super(BaseMatrixFactorizationRecommender, self).loadModel(folder_path, file_name=file_name)
+
+        # The index is not saved, it is built again with the same parameters
+        if self._MIPS_index_parameters is not None:
+            self.build_MIPS_index(**self._MIPS_index_parameters)
+        else:
+            self.clear_MIPS_index()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+
+from Base.BaseMatrixFactorizationRecommender import compute_W_sparse_from_item_latent_factors, _select_rows_topK
+
+
+def get_reference_W_sparse(ITEM_factors, topK):
+
+    W_dense = np.dot(ITEM_factors, ITEM_factors.T).astype(np.float32)
+
+    # Column i contains the TopK most similar items of item i
+    for item_id in range(W_dense.shape[1]):
+        W_dense[np.argsort(-W_dense[:, item_id], kind="stable")[topK:], item_id] = 0.0
+
+    return W_dense
+
+
+class MyTestCase(unittest.TestCase):
+
+    def _assert_same_topK_values(self, W_sparse, W_dense):
+
+        # Compared on the sorted values of each column, as ties may select different items
+        W_sparse = W_sparse.toarray()
+
+        self.assertTrue(np.allclose(-np.sort(-W_sparse, axis=0), -np.sort(-W_dense, axis=0), atol=1e-5))
+
+    def test_select_rows_topK(self):
+
+        topK = 5
+        block_weight = np.random.randn(30, 200)
+
+        # Rows with all values tied, or with many values tied at the TopK-th value, are partitioned
+        block_weight[3] = 0.0
+        block_weight[7, 100:] = block_weight[7].max()
+
+        columns, values = _select_rows_topK(block_weight, topK)
+
+        self.assertTrue(np.array_equal(np.take_along_axis(block_weight, columns, axis=1), values))
+
+        for row in range(block_weight.shape[0]):
+            self.assertEqual(len(np.unique(columns[row])), topK)
+            self.assertTrue(np.array_equal(np.sort(values[row]), np.sort(block_weight[row])[-topK:]))
+
+    def test_W_sparse_topK(self):
+
+        n_items, n_factors, topK = 500, 8, 10
+
+        ITEM_factors = np.random.randn(n_items, n_factors).astype(np.float32)
+
+        # Items with all-zero latent factors, all their similarities are tied at zero
+        ITEM_factors[np.random.permutation(n_items)[:n_items // 2]] = 0.0
+
+        W_dense = get_reference_W_sparse(ITEM_factors, topK)
+
+        for n_jobs in [1, 2]:
+            W_sparse = compute_W_sparse_from_item_latent_factors(ITEM_factors, topK=topK, block_size=64,
+                                                                 n_jobs=n_jobs, verbose=False)
+
+            self.assertEqual(W_sparse.shape, (n_items, n_items))
+            self.assertTrue(np.all(np.ediff1d(W_sparse.tocsc().indptr) <= topK))
+            self._assert_same_topK_values(W_sparse, W_dense)
+
+
+if __name__ == '__main__':
+    unittest.main()
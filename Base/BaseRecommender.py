@@ -6,6 +6,7 @@
 """
 
 import numpy as np
+import scipy.sparse as sps
 import pickle, os
 from Base.Recommender_utils import check_matrix
 
@@ -76,6 +77,29 @@ class BaseRecommender(object):
         scores[seen] = -np.inf
         return scores
 
+    def _remove_seen_on_scores_batch(self, user_id_array, scores_batch):
+        """
+        Sets to -np.inf the score of the items seen by each user, for all users in the batch with a single scatter
+        :param user_id_array:
+        :param scores_batch:    array (len(user_id_array), n_items)
+        :return:
+        """
+
+        assert self.URM_train.getformat() == "csr", "Recommender_Base_Class: URM_train is not CSR, this will cause errors in filtering seen items"
+
+        profile_start = self.URM_train.indptr[user_id_array]
+        profile_length = self.URM_train.indptr[user_id_array + 1] - profile_start
+
+        # Batch row of each seen item and its position in URM_train.indices
+        # The profiles of the users are concatenated, each one starting at profile_offset
+        profile_offset = np.cumsum(profile_length) - profile_length
+
+        user_index = np.repeat(np.arange(len(user_id_array)), profile_length)
+        seen_position = np.arange(profile_length.sum()) + np.repeat(profile_start - profile_offset, profile_length)
+
+        scores_batch[user_index, self.URM_train.indices[seen_position]] = -np.inf
+        return scores_batch
+
     def _get_temp_folder(self, custom_temp_folder=None):
         """
         The function returns the path of a folder in result_experiments
@@ -120,60 +144,63 @@ class BaseRecommender(object):
         raise NotImplementedError(
             "BaseRecommender: compute_item_score not assigned for current recommender, unable to compute prediction scores")
 
-    def recommend(self, user_id_array, cutoff=None, remove_seen_flag=True, items_to_compute=None,
-                  remove_top_pop_flag=False, remove_CustomItems_flag=False, return_scores=False):
+    def _compute_item_score_on_user_items(self, user_id_array, user_items_to_compute):
+        """
+        Computes the scores of a different set of items for each user. The default implementation computes the scores
+        of the union of the items. Models whose cost depends on the number of user-item pairs, e.g., neural models,
+        should override it and compute only the requested pairs
+        :param user_id_array:           array containing the user indices whose recommendations need to be computed
+        :param user_items_to_compute:   csr matrix (len(user_id_array), n_items) with the items to compute for each user
+        :return:                        array (len(user_id_array), n_items) with the score, the items not computed
+                                        have score -np.inf
+        """
 
-        # If is a scalar transform it in a 1-cell array
-        if np.isscalar(user_id_array):
-            user_id_array = np.atleast_1d(user_id_array)
-            single_user = True
-        else:
-            single_user = False
+        items_to_compute = np.unique(user_items_to_compute.indices)
 
-        if cutoff is None:
-            cutoff = self.URM_train.shape[1] - 1
+        return self._compute_item_score(user_id_array, items_to_compute=items_to_compute)
+
+    def _compute_item_score_remove_seen(self, user_id_array, items_to_compute=None, reuse_scores_buffer=False):
+        """
+        Computes the scores and sets to -np.inf the score of the items seen by each user. Models which can remove
+        the seen items while computing the scores should override it
+        :param user_id_array:
+        :param items_to_compute:
+        :param reuse_scores_buffer:     if True the scores are not returned to the caller of recommend,
+                                        so they may be written in a buffer reused by the following calls
+        :return:                        array (len(user_id_array), n_items) with the score
+        """
 
-        # Compute the scores using the model-specific function
-        # Vectorize over all users in user_id_array
         scores_batch = self._compute_item_score(user_id_array, items_to_compute=items_to_compute)
 
-        # if self.normalize:
-        #     # normalization will keep the scores in the same range
-        #     # of value of the ratings in dataset
-        #     user_profile = self.URM_train[user_id]
-        #
-        #     rated = user_profile.copy()
-        #     rated.data = np.ones_like(rated.data)
-        #     if self.sparse_weights:
-        #         den = rated.dot(self.W_sparse).toarray().ravel()
-        #     else:
-        #         den = rated.dot(self.W).ravel()
-        #     den[np.abs(den) < 1e-6] = 1.0  # to avoid NaNs
-        #     scores /= den
+        return self._remove_seen_on_scores_batch(user_id_array, scores_batch)
 
-        for user_index in range(len(user_id_array)):
+    def _remove_items_not_to_rank_on_scores(self, user_items_to_rank, scores_batch):
+        """
+        Sets to -np.inf the score of all the items a user should not rank
+        :param user_items_to_rank:      sparse matrix (len(user_id_array), n_items), with the items to rank for each user
+        :param scores_batch:
+        :return:
+        """
 
-            user_id = user_id_array[user_index]
+        items_not_to_rank_mask = np.ones(scores_batch.shape, dtype=bool)
 
-            if remove_seen_flag:
-                scores_batch[user_index, :] = self._remove_seen_on_scores(user_id, scores_batch[user_index, :])
-
-            # Sorting is done in three steps. Faster then plain np.argsort for higher number of items
-            # - Partition the data to extract the set of relevant items
-            # - Sort only the relevant items
-            # - Get the original item index
-            # relevant_items_partition = (-scores_user).argpartition(cutoff)[0:cutoff]
-            # relevant_items_partition_sorting = np.argsort(-scores_user[relevant_items_partition])
-            # ranking = relevant_items_partition[relevant_items_partition_sorting]
-            #
-            # ranking_list.append(ranking)
+        user_index = np.repeat(np.arange(user_items_to_rank.shape[0]), np.ediff1d(user_items_to_rank.indptr))
+        items_not_to_rank_mask[user_index, user_items_to_rank.indices] = False
 
-        if remove_top_pop_flag:
-            scores_batch = self._remove_TopPop_on_scores(scores_batch)
+        scores_batch[items_not_to_rank_mask] = -np.inf
+        return scores_batch
 
-        if remove_CustomItems_flag:
-            scores_batch = self._remove_CustomItems_on_scores(scores_batch)
+    def _compute_top_cutoff_positions(self, scores_batch, cutoff):
+        """
+        Computes the positions of the cutoff highest scores of each row, excluding the -inf scores
+        :return:    array (scores_batch.shape[0], cutoff) of int32 positions, padded with -1 after the valid ones,
+                    array with the number of valid positions in each row
+        """
 
+        # Sorting is done in three steps. Faster then plain np.argsort for higher number of items
+        # - Partition the data to extract the set of relevant items
+        # - Sort only the relevant items
+        # - Get the original item index
         # relevant_items_partition is block_size x cutoff
         relevant_items_partition = (-scores_batch).argpartition(cutoff, axis=1)[:, 0:cutoff]
 
@@ -186,18 +213,140 @@ class BaseRecommender(object):
         ranking = relevant_items_partition[
             np.arange(relevant_items_partition.shape[0])[:, None], relevant_items_partition_sorting]
 
-        ranking_list = [None] * ranking.shape[0]
-
         # Remove from the recommendation list any item that has a -inf score
         # Since -inf is a flag to indicate an item to remove
-        for user_index in range(len(user_id_array)):
-            user_recommendation_list = ranking[user_index]
-            user_item_scores = scores_batch[user_index, user_recommendation_list]
+        # The valid items are moved at the beginning of each row, preserving their order, the others are set to -1
+        ranking_scores = relevant_items_partition_original_value[
+            np.arange(relevant_items_partition.shape[0])[:, None], relevant_items_partition_sorting]
+
+        not_inf_scores_mask = np.logical_not(np.isinf(ranking_scores))
+        ranking_length = not_inf_scores_mask.sum(axis=1)
+
+        compact_ranking = - np.ones(ranking.shape, dtype=np.int32)
+        compact_ranking[np.arange(ranking.shape[1]) < ranking_length[:, None]] = ranking[not_inf_scores_mask]
+
+        return compact_ranking, ranking_length
+
+    def _compute_ranking_batch(self, user_id_array, cutoff, remove_seen_flag, items_to_compute,
+                               remove_top_pop_flag, remove_CustomItems_flag, reuse_scores_buffer=False):
+        """
+        Computes the ranking of a batch of users
+        :param reuse_scores_buffer: if True the scores_batch returned may be overwritten by the following calls
+        :return:    ranking array (len(user_id_array), cutoff) of int32 padded with -1 after the valid items,
+                    array with the number of valid items in each row,
+                    scores_batch
+        """
+
+        # Compute the scores using the model-specific function
+        # Vectorize over all users in user_id_array
+        if sps.issparse(items_to_compute):
+            user_items_to_rank = sps.csr_matrix(items_to_compute)
+            scores_batch = self._compute_item_score_on_user_items(user_id_array, user_items_to_rank)
+        elif remove_seen_flag:
+            user_items_to_rank = None
+            scores_batch = self._compute_item_score_remove_seen(user_id_array, items_to_compute=items_to_compute,
+                                                                reuse_scores_buffer=reuse_scores_buffer)
+        else:
+            user_items_to_rank = None
+            scores_batch = self._compute_item_score(user_id_array, items_to_compute=items_to_compute)
+
+        if user_items_to_rank is not None:
+            scores_batch = self._remove_items_not_to_rank_on_scores(user_items_to_rank, scores_batch)
+
+            if remove_seen_flag:
+                scores_batch = self._remove_seen_on_scores_batch(user_id_array, scores_batch)
+
+        if remove_top_pop_flag:
+            scores_batch = self._remove_TopPop_on_scores(scores_batch)
+
+        if remove_CustomItems_flag:
+            scores_batch = self._remove_CustomItems_on_scores(scores_batch)
+
+        compact_ranking, ranking_length = self._compute_top_cutoff_positions(scores_batch, cutoff)
+
+        return compact_ranking, ranking_length, scores_batch
+
+    def recommend(self, user_id_array, cutoff=None, remove_seen_flag=True, items_to_compute=None,
+                  remove_top_pop_flag=False, remove_CustomItems_flag=False, return_scores=False,
+                  return_ranking_array=False, block_size=None):
+        """
+
+        :param user_id_array:       array containing the user indices whose recommendations need to be computed
+        :param cutoff:
+        :param remove_seen_flag:
+        :param items_to_compute:    array containing the items whose scores are to be computed, or a sparse matrix
+                                        (len(user_id_array), n_items) containing the specific items to rank for each user.
+                                        In the latter case the scores are computed on the union of those items and each
+                                        user ranks only its own items
+        :param remove_top_pop_flag:
+        :param remove_CustomItems_flag:
+        :param return_scores:       If True also the scores array (len(user_id_array), n_items) is returned
+        :param return_ranking_array:    If True the recommendations are returned as an int32 array (len(user_id_array), cutoff)
+                                        padded with -1, together with the array of the number of valid items in each row.
+                                        If False, as a list of lists
+        :param block_size:          If the scores are not returned, they are computed block_size users at a time,
+                                        so that the dense scores of all users are never allocated at once
+        :return:
+        """
+
+        # If is a scalar transform it in a 1-cell array
+        if np.isscalar(user_id_array):
+            user_id_array = np.atleast_1d(user_id_array)
+            single_user = True
+        else:
+            single_user = False
+
+        user_id_array = np.asarray(user_id_array)
+
+        if cutoff is None:
+            cutoff = self.URM_train.shape[1] - 1
+
+        if block_size is None:
+            block_size = min(1000, int(1e8 / self.n_items))
+
+        if sps.issparse(items_to_compute):
+            items_to_compute = sps.csr_matrix(items_to_compute)
+
+        if return_scores or len(user_id_array) <= block_size:
+            ranking, ranking_length, scores_batch = self._compute_ranking_batch(user_id_array, cutoff,
+                                                                                remove_seen_flag, items_to_compute,
+                                                                                remove_top_pop_flag,
+                                                                                remove_CustomItems_flag,
+                                                                                reuse_scores_buffer=not return_scores)
+
+        else:
+            ranking = - np.ones((len(user_id_array), cutoff), dtype=np.int32)
+            ranking_length = np.zeros(len(user_id_array), dtype=int)
+
+            for start_user in range(0, len(user_id_array), block_size):
+                end_user = min(start_user + block_size, len(user_id_array))
+
+                if sps.issparse(items_to_compute):
+                    items_to_compute_block = items_to_compute[start_user:end_user]
+                else:
+                    items_to_compute_block = items_to_compute
+
+                ranking[start_user:end_user], ranking_length[start_user:end_user], _ = self._compute_ranking_batch(
+                    user_id_array[start_user:end_user], cutoff,
+                    remove_seen_flag, items_to_compute_block,
+                    remove_top_pop_flag,
+                    remove_CustomItems_flag,
+                    reuse_scores_buffer=True)
+
+        if return_ranking_array:
+
+            # Return single row for one user
+            if single_user:
+                ranking, ranking_length = ranking[0], ranking_length[0]
+
+            if return_scores:
+                return ranking, ranking_length, scores_batch
 
-            not_inf_scores_mask = np.logical_not(np.isinf(user_item_scores))
+            else:
+                return ranking, ranking_length
 
-            user_recommendation_list = user_recommendation_list[not_inf_scores_mask]
-            ranking_list[user_index] = user_recommendation_list.tolist()
+        ranking_list = [ranking[user_index, 0:ranking_length[user_index]].tolist()
+                        for user_index in range(len(user_id_array))]
 
         # Return single list for one user, instead of list of lists
         if single_user:
@@ -25,6 +25,133 @@ class BaseSimilarityMatrixRecommender(BaseRecommender):
         self._URM_train_format_checked = False
         self._W_sparse_format_checked = False
 
+        self._scoring_kernel = None
+        self._scoring_kernel_checked = False
+        self._scores_buffer = None
+        self._kernel_format_cache = []
+
+    def _get_scoring_kernel(self):
+        """
+        :return: the Cython sparse-times-sparse scoring function, or None if it is not compiled
+        """
+
+        if not self._scoring_kernel_checked:
+
+            try:
+                from Base.Cython.Sparse_Scoring_Cython import compute_sparse_dot_sparse_scores, to_scoring_kernel_format, \
+                    fits_scoring_kernel_format
+                self._scoring_kernel = compute_sparse_dot_sparse_scores
+                self._to_scoring_kernel_format = to_scoring_kernel_format
+                self._fits_scoring_kernel_format = fits_scoring_kernel_format
+
+            except ImportError:
+                print("{}: Unable to load Cython Sparse_Scoring, reverting to Python".format(self.RECOMMENDER_NAME))
+
+            self._scoring_kernel_checked = True
+
+        return self._scoring_kernel
+
+    def _use_scoring_kernel(self, profile_matrix, weight_matrix):
+        """
+        :return: True if the kernel is compiled and the matrices fit its int32 indices, otherwise scipy is used
+        """
+
+        if self._get_scoring_kernel() is None:
+            return False
+
+        return all(self._fits_scoring_kernel_format(X) for X in [profile_matrix, weight_matrix, self.URM_train])
+
+    def _get_scores_buffer(self, n_users, dtype):
+        """
+        :return: array (n_users, n_items) of the given dtype, reused by the following calls
+        """
+
+        if self._scores_buffer is None or self._scores_buffer.shape[0] < n_users or \
+                self._scores_buffer.shape[1] != self.n_items or self._scores_buffer.dtype != dtype:
+            self._scores_buffer = np.empty((n_users, self.n_items), dtype=dtype)
+
+        return self._scores_buffer[:n_users]
+
+    def _get_kernel_format(self, X, dtype):
+        """
+        Converts X to the format used by the Cython kernel without copies. The conversion is kept as long as
+        X is the same object as URM_train or W_sparse, which therefore must not be modified in place
+        :return: X as a csr matrix with data of the given dtype and int32 indices
+        """
+
+        for X_cached, dtype_cached, X_kernel in self._kernel_format_cache:
+            if X_cached is X and dtype_cached == dtype:
+                return X_kernel
+
+        X_kernel = self._to_scoring_kernel_format(X, dtype)
+
+        self._kernel_format_cache = [cache_entry for cache_entry in self._kernel_format_cache
+                                     if cache_entry[0] is self.URM_train or cache_entry[0] is self.W_sparse]
+        self._kernel_format_cache.append((X, dtype, X_kernel))
+
+        return X_kernel
+
+    def _get_scores_dtype(self, profile_matrix, weight_matrix):
+        """
+        :return: the dtype of the scores computed by scipy, float32 only if both matrices are float32
+        """
+
+        if profile_matrix.dtype == np.float32 and weight_matrix.dtype == np.float32:
+            return np.float32
+
+        return np.float64
+
+    def _compute_score_with_kernel(self, user_id_array, profile_matrix, weight_matrix, items_to_compute,
+                                   remove_seen, reuse_scores_buffer):
+        """
+        Computes profile_matrix[user_id_array].dot(weight_matrix) with the Cython kernel
+        :param reuse_scores_buffer:     if True the scores are written in the buffer reused by the following calls
+        """
+
+        dtype = self._get_scores_dtype(profile_matrix, weight_matrix)
+
+        if reuse_scores_buffer:
+            scores_buffer = self._get_scores_buffer(len(user_id_array), dtype)
+        else:
+            scores_buffer = np.empty((len(user_id_array), self.n_items), dtype=dtype)
+
+        if items_to_compute is not None:
+            item_mask = np.zeros(self.n_items, dtype=bool)
+            item_mask[items_to_compute] = True
+        else:
+            item_mask = None
+
+        return self._scoring_kernel(user_id_array,
+                                    self._get_kernel_format(profile_matrix, dtype),
+                                    self._get_kernel_format(weight_matrix, dtype),
+                                    scores_buffer,
+                                    seen=self._get_kernel_format(self.URM_train, dtype) if remove_seen else None,
+                                    item_mask=item_mask)
+
+    def _compute_item_score_remove_seen(self, user_id_array, items_to_compute=None, reuse_scores_buffer=False):
+        """
+        For the item-based and user-based scores the seen items are removed while computing the scores,
+        in the reused buffer if allowed
+        """
+
+        if self._compute_item_score == self._compute_score_item_based:
+            profile_matrix, weight_matrix = self.URM_train, self.W_sparse
+
+        elif self._compute_item_score == self._compute_score_user_based:
+            profile_matrix, weight_matrix = self.W_sparse, self.URM_train
+
+        else:
+            profile_matrix, weight_matrix = None, None
+
+        if profile_matrix is None or not self._use_scoring_kernel(profile_matrix, weight_matrix):
+            return super(BaseSimilarityMatrixRecommender, self)._compute_item_score_remove_seen(
+                user_id_array, items_to_compute=items_to_compute, reuse_scores_buffer=reuse_scores_buffer)
+
+        self._check_format()
+
+        return self._compute_score_with_kernel(user_id_array, profile_matrix, weight_matrix, items_to_compute,
+                                               True, reuse_scores_buffer)
+
     def _compute_score_item_based(self, user_id_array, items_to_compute=None):
         """
         URM_train and W_sparse must have the same format, CSR
@@ -35,6 +162,10 @@ class BaseSimilarityMatrixRecommender(BaseRecommender):
 
         self._check_format()
 
+        if self._use_scoring_kernel(self.URM_train, self.W_sparse):
+            return self._compute_score_with_kernel(user_id_array, self.URM_train, self.W_sparse, items_to_compute,
+                                                   False, False)
+
         user_profile_array = self.URM_train[user_id_array]
 
         if items_to_compute is not None:
@@ -56,6 +187,10 @@ class BaseSimilarityMatrixRecommender(BaseRecommender):
 
         self._check_format()
 
+        if self._use_scoring_kernel(self.W_sparse, self.URM_train):
+            return self._compute_score_with_kernel(user_id_array, self.W_sparse, self.URM_train, items_to_compute,
+                                                   False, False)
+
         user_weights_array = self.W_sparse[user_id_array]
 
         if items_to_compute is not None:
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+
+Approximate maximum inner product search over the item latent factors.
+The item factors are augmented with one dimension so that they all have the same norm, in this space the item with the
+maximum inner product is the nearest neighbour of the query (Bachrach et al., RecSys 2014). The augmented items are
+partitioned with mini-batch k-means in inverted lists, a query computes the exact inner product only for the items in the
+n_probe lists whose centroid has the highest inner product with it.
+
+"""
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+
+class ClusteredMIPSIndex(object):
+    """
+    The recall/speed trade-off is controlled by n_probe, the number of inverted lists visited by each query.
+    With n_probe equal to n_clusters the search is exact.
+    """
+
+    def __init__(self, ITEM_factors, n_clusters=None, n_probe=None, random_seed=None):
+        """
+        :param ITEM_factors:    array (n_items, n_factors)
+        :param n_clusters:      number of inverted lists, if None sqrt(n_items)
+        :param n_probe:         number of inverted lists visited by each query, if None 10% of n_clusters
+        :param random_seed:
+        """
+
+        super(ClusteredMIPSIndex, self).__init__()
+
+        ITEM_factors = np.asarray(ITEM_factors, dtype=np.float32)
+        self.n_items, self.n_factors = ITEM_factors.shape
+
+        if n_clusters is None:
+            n_clusters = int(np.sqrt(self.n_items))
+
+        n_clusters = max(1, min(n_clusters, self.n_items))
+
+        self.n_clusters = n_clusters
+        self.random_seed = random_seed
+
+        # Norm augmentation, all augmented items have unit norm
+        item_norm = np.linalg.norm(ITEM_factors, axis=1)
+        max_norm = max(item_norm.max(), np.finfo(np.float32).tiny)
+
+        ITEM_factors_augmented = np.zeros((self.n_items, self.n_factors + 1), dtype=np.float32)
+        ITEM_factors_augmented[:, :-1] = ITEM_factors / max_norm
+        ITEM_factors_augmented[:, -1] = np.sqrt(np.maximum(1.0 - (item_norm / max_norm) ** 2, 0.0))
+
+        print("ClusteredMIPSIndex: Clustering {} items in {} inverted lists...".format(self.n_items, n_clusters))
+
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=4096, n_init=1, random_state=random_seed)
+        item_cluster = kmeans.fit_predict(ITEM_factors_augmented)
+
+        # Queries have 0 in the augmented dimension, it is not needed to score the centroids
+        self._centroids = kmeans.cluster_centers_[:, :-1].astype(np.float32)
+
+        # Inverted lists, the items of each cluster are contiguous
+        self._item_id = np.argsort(item_cluster, kind="stable").astype(np.int32)
+        self._cluster_indptr = np.zeros(n_clusters + 1, dtype=np.int64)
+        self._cluster_indptr[1:] = np.cumsum(np.bincount(item_cluster, minlength=n_clusters))
+        self._ITEM_factors = ITEM_factors[self._item_id]
+
+        print("ClusteredMIPSIndex: Clustering {} items in {} inverted lists... done!".format(self.n_items, n_clusters))
+
+        self.set_n_probe(n_probe)
+
+    def set_n_probe(self, n_probe):
+        """
+        :param n_probe: number of inverted lists visited by each query, if None 10% of n_clusters
+        """
+
+        if n_probe is None:
+            n_probe = int(np.ceil(self.n_clusters * 0.1))
+
+        assert n_probe >= 1, "ClusteredMIPSIndex: n_probe must be >= 1, provided was {}".format(n_probe)
+
+        self.n_probe = min(n_probe, self.n_clusters)
+
+    def get_parameters(self):
+        return {"n_clusters": self.n_clusters, "n_probe": self.n_probe, "random_seed": self.random_seed}
+
+    def get_candidates(self, query_factors):
+        """
+        Computes the exact inner product of each query with the items in its n_probe closest inverted lists
+        :param query_factors:   array (n_queries, n_factors)
+        :return: candidate_items, candidate_scores arrays (n_queries, max number of candidates), the unused
+                 positions have item -1 and score -np.inf
+        """
+
+        query_factors = np.asarray(query_factors, dtype=np.float32)
+        n_queries = query_factors.shape[0]
+
+        centroid_scores = np.dot(query_factors, self._centroids.T)
+
+        if self.n_probe < self.n_clusters:
+            probed_clusters = np.argpartition(-centroid_scores, self.n_probe - 1, axis=1)[:, :self.n_probe]
+        else:
+            probed_clusters = np.tile(np.arange(self.n_clusters), (n_queries, 1))
+
+        probed_clusters = np.ascontiguousarray(probed_clusters)
+
+        cluster_size = np.ediff1d(self._cluster_indptr)
+
+        # Position of the candidates of each probed cluster in the candidate arrays of the query
+        probed_size = cluster_size[probed_clusters]
+        probed_offset = np.cumsum(probed_size, axis=1) - probed_size
+
+        max_candidates = max(probed_size.sum(axis=1).max(), 1) if n_queries > 0 else 1
+
+        candidate_items = - np.ones((n_queries, max_candidates), dtype=np.int32)
+        candidate_scores = np.full((n_queries, max_candidates), -np.inf, dtype=np.float32)
+
+        # The queries probing the same cluster are scored together, the (query, probe) pairs are grouped by cluster
+        probed_clusters_flat = probed_clusters.ravel()
+        pair_order = np.argsort(probed_clusters_flat, kind="stable")
+        pair_cluster_indptr = np.searchsorted(probed_clusters_flat[pair_order], np.arange(self.n_clusters + 1))
+
+        for cluster_index in np.where(np.ediff1d(pair_cluster_indptr) > 0)[0]:
+
+            start_pos = self._cluster_indptr[cluster_index]
+            end_pos = self._cluster_indptr[cluster_index + 1]
+
+            if end_pos == start_pos:
+                continue
+
+            pair_index = pair_order[pair_cluster_indptr[cluster_index]:pair_cluster_indptr[cluster_index + 1]]
+            query_index = pair_index // self.n_probe
+
+            destination = probed_offset.ravel()[pair_index][:, None] + np.arange(end_pos - start_pos)
+
+            candidate_scores[query_index[:, None], destination] = np.dot(query_factors[query_index],
+                                                                         self._ITEM_factors[start_pos:end_pos].T)
+            candidate_items[query_index[:, None], destination] = self._item_id[start_pos:end_pos]
+
+        return candidate_items, candidate_scores
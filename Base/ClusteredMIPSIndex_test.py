@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+from Base.ClusteredMIPSIndex import ClusteredMIPSIndex
+from MatrixFactorization.PureSVDRecommender import PureSVDRecommender
+
+
+class MyTestCase(unittest.TestCase):
+
+    def test_all_probes_exact(self):
+
+        n_items, n_factors, n_clusters = 300, 8, 10
+
+        ITEM_factors = np.random.randn(n_items, n_factors).astype(np.float32)
+        query_factors = np.random.randn(20, n_factors).astype(np.float32)
+
+        MIPS_index = ClusteredMIPSIndex(ITEM_factors, n_clusters=n_clusters, n_probe=n_clusters, random_seed=42)
+
+        candidate_items, candidate_scores = MIPS_index.get_candidates(query_factors)
+
+        scores_exact = np.dot(query_factors, ITEM_factors.T)
+
+        for query_index in range(len(query_factors)):
+
+            # Each item is a candidate exactly once, with its exact score
+            self.assertTrue(np.array_equal(np.sort(candidate_items[query_index]), np.arange(n_items)))
+            self.assertTrue(np.allclose(candidate_scores[query_index], scores_exact[query_index, candidate_items[query_index]],
+                                        atol=1e-5))
+
+    def test_n_probe(self):
+
+        ITEM_factors = np.random.randn(200, 8)
+
+        MIPS_index = ClusteredMIPSIndex(ITEM_factors, n_clusters=10, n_probe=2, random_seed=42)
+
+        candidate_items, candidate_scores = MIPS_index.get_candidates(np.random.randn(5, 8))
+
+        # Only the items of the probed lists are candidates, padded with -1 and -inf
+        self.assertTrue(candidate_items.shape[1] < 200)
+        self.assertTrue(np.array_equal(candidate_items < 0, np.isneginf(candidate_scores)))
+
+        for query_index in range(5):
+            valid_items = candidate_items[query_index][candidate_items[query_index] >= 0]
+            self.assertEqual(len(np.unique(valid_items)), len(valid_items))
+
+        MIPS_index.set_n_probe(100)
+        self.assertEqual(MIPS_index.n_probe, 10)
+
+    def test_recommender_all_probes_exact(self):
+
+        URM_train = sps.random(100, 150, density=0.1, format="csr")
+        URM_train.data[:] = 1.0
+
+        recommender = PureSVDRecommender(URM_train)
+        recommender.fit(num_factors=10)
+
+        user_id_array = np.arange(100)
+        cutoff = 10
+
+        ranking_exact = recommender.recommend(user_id_array, cutoff=cutoff, return_ranking_array=True)[0]
+
+        recommender.build_MIPS_index(n_clusters=8, n_probe=8, random_seed=42)
+        ranking, ranking_length = recommender.recommend(user_id_array, cutoff=cutoff, return_ranking_array=True)
+
+        # Compared on the scores, as ties may be ranked in a different order
+        scores = np.dot(recommender.USER_factors, recommender.ITEM_factors.T)
+
+        for user_id in user_id_array:
+            if URM_train[user_id].nnz == 0:
+                continue
+
+            self.assertEqual(ranking_length[user_id], cutoff)
+            self.assertEqual(len(np.intersect1d(ranking[user_id], URM_train[user_id].indices)), 0,
+                             "Seen items are recommended")
+            self.assertTrue(np.allclose(scores[user_id, ranking[user_id]], scores[user_id, ranking_exact[user_id]],
+                                        atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: initializedcheck=False
+#cython: language_level=3
+#cython: nonecheck=False
+#cython: cdivision=True
+#cython: unpack_method_calls=True
+#cython: overflowcheck=False
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import multiprocessing
+
+import numpy as np
+import scipy.sparse as sps
+cimport numpy as np
+
+from cython.parallel import prange
+from libc.math cimport INFINITY
+from cython cimport floating
+
+
+def compute_sparse_dot_sparse_scores(row_id_array, A, B, scores, seen=None, item_mask=None, n_threads=None):
+    """
+    Computes the product of the rows row_id_array of A and of B, accumulating it directly in the dense
+    scores buffer, without building the sparse product.
+    In the same pass the items not in item_mask and the items seen by each row have score -inf
+    The data of A and B is converted to the dtype of scores, the conversion copies it unless it already has that
+    dtype and the indices are int32, see to_scoring_kernel_format
+    :param row_id_array:    rows of A to compute, i.e., users
+    :param A:               csr matrix, e.g., URM_train for item-based models or W_sparse for user-based ones
+    :param B:               csr matrix with as many rows as the columns of A
+    :param scores:          C-contiguous float32 or float64 buffer (len(row_id_array), B.shape[1]), it is overwritten
+    :param seen:            csr matrix whose rows row_id_array are the items to set to -inf, or None
+    :param item_mask:       boolean array (B.shape[1]), the items not in the mask have score -inf, or None
+    :param n_threads:       Number of OpenMP threads used to compute the rows, if None all available cores in the
+                            main process and 1 in child processes, e.g., the workers of a parallel evaluation
+    :return: scores
+    """
+
+    assert scores.dtype in [np.float32, np.float64], \
+        "compute_sparse_dot_sparse_scores: scores buffer must be float32 or float64, provided was {}".format(scores.dtype)
+
+    for X in [A, B, seen]:
+        if X is not None and not fits_scoring_kernel_format(X):
+            raise ValueError("compute_sparse_dot_sparse_scores: matrix with shape {} and {} nonzeros does not fit "
+                             "int32 indices".format(X.shape, X.nnz))
+
+    cdef int[:] row_ids = np.asarray(row_id_array, dtype=np.int32)
+
+    cdef int[:] A_indptr = np.asarray(A.indptr, dtype=np.int32)
+    cdef int[:] A_indices = np.asarray(A.indices, dtype=np.int32)
+
+    cdef int[:] B_indptr = np.asarray(B.indptr, dtype=np.int32)
+    cdef int[:] B_indices = np.asarray(B.indices, dtype=np.int32)
+
+    cdef int[:] seen_indptr, seen_indices
+    cdef np.uint8_t[:] item_mask_view
+
+    cdef bint remove_seen = seen is not None
+    cdef bint use_item_mask = item_mask is not None
+
+    if remove_seen:
+        seen_indptr = np.asarray(seen.indptr, dtype=np.int32)
+        seen_indices = np.asarray(seen.indices, dtype=np.int32)
+    else:
+        seen_indptr = np.zeros(1, dtype=np.int32)
+        seen_indices = np.zeros(1, dtype=np.int32)
+
+    if use_item_mask:
+        item_mask_view = np.asarray(item_mask, dtype=np.bool_).view(np.uint8)
+    else:
+        item_mask_view = np.zeros(1, dtype=np.uint8)
+
+    assert scores.shape[0] == len(row_ids) and scores.shape[1] == B.shape[1], \
+        "compute_sparse_dot_sparse_scores: scores buffer has shape {}, expected was {}".format(
+            scores.shape, (len(row_ids), B.shape[1]))
+
+    if n_threads is None:
+        # Processes started by a parallel evaluation already use all cores
+        n_threads = multiprocessing.cpu_count() if multiprocessing.parent_process() is None else 1
+
+    if scores.dtype == np.float64:
+        _compute_scores[double](row_ids, A_indptr, A_indices, np.asarray(A.data, dtype=np.float64),
+                                B_indptr, B_indices, np.asarray(B.data, dtype=np.float64), scores,
+                                remove_seen, seen_indptr, seen_indices, use_item_mask, item_mask_view, n_threads)
+    else:
+        _compute_scores[float](row_ids, A_indptr, A_indices, np.asarray(A.data, dtype=np.float32),
+                               B_indptr, B_indices, np.asarray(B.data, dtype=np.float32), scores,
+                               remove_seen, seen_indptr, seen_indices, use_item_mask, item_mask_view, n_threads)
+
+    return np.asarray(scores)
+
+
+def fits_scoring_kernel_format(X):
+    """
+    :return: True if the indices and indptr of X can be int32, otherwise the scores must be computed with scipy
+    """
+
+    int32_max = np.iinfo(np.int32).max
+
+    return X.nnz <= int32_max and max(X.shape) <= int32_max
+
+
+def to_scoring_kernel_format(X, dtype):
+    """
+    :return: X as a csr matrix with data of the given dtype and int32 indices, which compute_sparse_dot_sparse_scores
+             uses without copying. The arrays of X are shared if they already have these types
+    """
+
+    if not fits_scoring_kernel_format(X):
+        raise ValueError("to_scoring_kernel_format: matrix with shape {} and {} nonzeros does not fit "
+                         "int32 indices".format(X.shape, X.nnz))
+
+    X = sps.csr_matrix(X, dtype=dtype)
+
+    if X.indices.dtype != np.int32 or X.indptr.dtype != np.int32:
+        X = sps.csr_matrix((X.data, X.indices.astype(np.int32), X.indptr.astype(np.int32)), shape=X.shape, copy=False)
+
+    return X
+
+
+cdef void _compute_scores(int[:] row_ids,
+                          int[:] A_indptr, int[:] A_indices, floating[:] A_data,
+                          int[:] B_indptr, int[:] B_indices, floating[:] B_data,
+                          floating[:, :] scores,
+                          bint remove_seen, int[:] seen_indptr, int[:] seen_indices,
+                          bint use_item_mask, np.uint8_t[:] item_mask, int n_threads):
+
+    cdef long row_index, n_rows = row_ids.shape[0]
+
+    for row_index in prange(n_rows, nogil=True, num_threads=n_threads, schedule="dynamic"):
+        _compute_row_scores(row_index, row_ids[row_index], A_indptr, A_indices, A_data, B_indptr, B_indices, B_data,
+                            scores, remove_seen, seen_indptr, seen_indices, use_item_mask, item_mask)
+
+
+cdef void _compute_row_scores(long row_index, int row_id,
+                              int[:] A_indptr, int[:] A_indices, floating[:] A_data,
+                              int[:] B_indptr, int[:] B_indices, floating[:] B_data,
+                              floating[:, :] scores,
+                              bint remove_seen, int[:] seen_indptr, int[:] seen_indices,
+                              bint use_item_mask, np.uint8_t[:] item_mask) nogil:
+
+    cdef long n_items = scores.shape[1]
+    cdef long item_id, A_pos, B_pos, B_row
+    cdef floating A_value
+
+    for item_id in range(n_items):
+        scores[row_index, item_id] = 0.0
+
+    # Same accumulation order as the scipy product
+    for A_pos in range(A_indptr[row_id], A_indptr[row_id + 1]):
+
+        B_row = A_indices[A_pos]
+        A_value = A_data[A_pos]
+
+        for B_pos in range(B_indptr[B_row], B_indptr[B_row + 1]):
+            scores[row_index, B_indices[B_pos]] += A_value * B_data[B_pos]
+
+    if use_item_mask:
+        for item_id in range(n_items):
+            if not item_mask[item_id]:
+                scores[row_index, item_id] = -INFINITY
+
+    if remove_seen:
+        for B_pos in range(seen_indptr[row_id], seen_indptr[row_id + 1]):
+            scores[row_index, seen_indices[B_pos]] = -INFINITY
@@ -8,15 +8,17 @@ Created on 26/06/18
 
 import numpy as np
 import scipy.sparse as sps
-import time, sys, copy
+import time, sys, copy, multiprocessing
 
 from enum import Enum
 from Utils.seconds_to_biggest_unit import seconds_to_biggest_unit
+from Base.Recommender_utils import get_sorted_keys_position
+from Utils.pool_worker_state import init_worker_state, get_worker_state
 
-from Base.Evaluation.metrics import roc_auc, precision, precision_recall_min_denominator, recall, MAP, MRR, ndcg, arhr, \
-    rmse, \
-    Novelty, Coverage_Item, Metrics_Object, Coverage_User, Gini_Diversity, Shannon_Entropy, Diversity_MeanInterList, \
-    Diversity_Herfindahl, AveragePopularity
+from Base.Evaluation.metrics import MAP, MRR, Novelty, Coverage_Item, Metrics_Object, Coverage_User, Gini_Diversity, \
+    Shannon_Entropy, Diversity_MeanInterList, Diversity_Herfindahl, AveragePopularity
+from Base.Evaluation.metrics import roc_auc_batch, precision_batch, precision_recall_min_denominator_batch, \
+    recall_batch, ndcg_batch, ideal_dcg_batch, arhr_batch, rmse_batch
 
 
 class EvaluatorMetrics(Enum):
@@ -89,6 +91,41 @@ def create_empty_metrics_dict(n_items, n_users, URM_train, ignore_items, ignore_
     return empty_dict
 
 
+def merge_metrics_dict(results_dict, other_results_dict):
+    """
+    Merges in results_dict the metrics computed on a different set of users and contained in other_results_dict
+    :param results_dict:
+    :param other_results_dict:
+    :return:
+    """
+
+    for cutoff in results_dict.keys():
+
+        results_current_cutoff = results_dict[cutoff]
+        other_results_current_cutoff = other_results_dict[cutoff]
+
+        for key in results_current_cutoff.keys():
+
+            value = results_current_cutoff[key]
+
+            if isinstance(value, Metrics_Object):
+                value.merge_with_other(other_results_current_cutoff[key])
+            else:
+                results_current_cutoff[key] = value + other_results_current_cutoff[key]
+
+    return results_dict
+
+
+# The worker processes of the parallel evaluation receive the evaluator and recommender objects once, when the pool
+# is created. If the processes are forked they share the memory of the parent, so the recommender is not copied
+def _run_evaluation_on_users_shard(usersToEvaluate_shard):
+    worker_state = get_worker_state()
+    evaluator_object = worker_state["evaluator_object"]
+    recommender_object = worker_state["recommender_object"]
+
+    return evaluator_object._run_evaluation_on_selected_users(recommender_object, usersToEvaluate_shard)
+
+
 def get_result_string(results_run, n_decimals=7):
     output_str = ""
 
@@ -115,10 +152,13 @@ class Evaluator(object):
     def __init__(self, URM_test_list, cutoff_list, minRatingsPerUser=1, exclude_seen=True,
                  diversity_object=None,
                  ignore_items=None,
-                 ignore_users=None):
+                 ignore_users=None,
+                 n_workers=1):
 
         super(Evaluator, self).__init__()
 
+        self.n_workers = n_workers
+
         if ignore_items is None:
             self.ignore_items_flag = False
             self.ignore_items_ID = np.array([])
@@ -134,7 +174,8 @@ class Evaluator(object):
         self.exclude_seen = exclude_seen
 
         if not isinstance(URM_test_list, list):
-            self.URM_test = URM_test_list.copy()
+            self.URM_test = sps.csr_matrix(URM_test_list.copy())
+            self.URM_test.sort_indices()
             URM_test_list = [URM_test_list]
         else:
             raise ValueError("List of URM_test not supported")
@@ -178,6 +219,204 @@ class Evaluator(object):
 
         raise NotImplementedError("The method evaluateRecommender not implemented for this evaluator class")
 
+    def evaluateApproximateRankingRecall(self, recommender_object, block_size=None):
+        """
+        Some recommenders compute an approximate ranking when the scores are not required, e.g., a
+        BaseMatrixFactorizationRecommender with a MIPS index. For each cutoff, this computes the recall of the exact top-cutoff
+        items of the users to evaluate in the approximate top-cutoff, averaged over the users
+        :param recommender_object: the trained recommender object, a BaseRecommender subclass
+        :param block_size:
+        :return: dictionary cutoff -> recall, result string
+        """
+
+        if block_size is None:
+            block_size = min(1000, int(1e8 / self.n_items))
+
+        if self.ignore_items_flag:
+            recommender_object.set_items_to_ignore(self.ignore_items_ID)
+
+        usersToEvaluate = np.array(self.usersToEvaluate)
+
+        recall_sum = {cutoff: 0.0 for cutoff in self.cutoff_list}
+        n_users_evaluated = {cutoff: 0 for cutoff in self.cutoff_list}
+
+        for user_batch_start in range(0, len(usersToEvaluate), block_size):
+
+            test_user_batch_array = usersToEvaluate[user_batch_start:user_batch_start + block_size]
+
+            recommend_kwargs = {"remove_seen_flag": self.exclude_seen,
+                                "cutoff": self.max_cutoff,
+                                "remove_top_pop_flag": False,
+                                "remove_CustomItems_flag": self.ignore_items_flag,
+                                "return_ranking_array": True}
+
+            # The exact ranking is computed together with the scores
+            exact_ranking, exact_ranking_length, _ = recommender_object.recommend(test_user_batch_array,
+                                                                                  return_scores=True,
+                                                                                  **recommend_kwargs)
+
+            approximate_ranking, _ = recommender_object.recommend(test_user_batch_array,
+                                                                  return_scores=False,
+                                                                  **recommend_kwargs)
+
+            batch_index = np.arange(len(test_user_batch_array))[:, None].astype(np.int64)
+
+            for cutoff in self.cutoff_list:
+
+                exact_keys = batch_index * self.n_items + exact_ranking[:, :cutoff]
+                approximate_keys = np.where(approximate_ranking[:, :cutoff] >= 0,
+                                            batch_index * self.n_items + approximate_ranking[:, :cutoff], -1)
+
+                found_mask = np.logical_and(np.isin(exact_keys, approximate_keys), exact_ranking[:, :cutoff] >= 0)
+
+                n_relevant = np.minimum(exact_ranking_length, cutoff)
+                users_with_ranking = n_relevant > 0
+
+                recall_sum[cutoff] += (found_mask.sum(axis=1)[users_with_ranking] / n_relevant[users_with_ranking]).sum()
+                n_users_evaluated[cutoff] += users_with_ranking.sum()
+
+        if self.ignore_items_flag:
+            recommender_object.reset_items_to_ignore()
+
+        results_dict = {}
+        results_run_string = ""
+
+        for cutoff in self.cutoff_list:
+            results_dict[cutoff] = recall_sum[cutoff] / n_users_evaluated[cutoff] if n_users_evaluated[cutoff] > 0 else 0.0
+            results_run_string += "CUTOFF: {} - APPROXIMATE RANKING RECALL: {:.7f}\n".format(cutoff, results_dict[cutoff])
+
+        return results_dict, results_run_string
+
+    def _run_evaluation_on_selected_users(self, recommender_object, usersToEvaluate):
+        """
+        :param recommender_object: the trained recommender object, a BaseRecommender subclass
+        :param usersToEvaluate: list of users to evaluate
+        :return: results_dict, n_users_evaluated
+        """
+
+        raise NotImplementedError("The method _run_evaluation_on_selected_users not implemented for this evaluator class")
+
+    def _run_evaluation_on_all_users(self, recommender_object):
+        """
+        Evaluates all users in usersToEvaluate. If n_workers > 1 the users are split in shards which are evaluated
+        by different processes on the same recommender object, the metrics of each shard are then merged
+        :param recommender_object: the trained recommender object, a BaseRecommender subclass
+        :return: results_dict, n_users_evaluated
+        """
+
+        if self.n_workers is None or self.n_workers <= 1 or len(self.usersToEvaluate) < self.n_workers:
+            return self._run_evaluation_on_selected_users(recommender_object, self.usersToEvaluate)
+
+        print("{}: Evaluating {} users with {} workers".format(self.EVALUATOR_NAME, len(self.usersToEvaluate),
+                                                              self.n_workers))
+
+        usersToEvaluate_shard_list = np.array_split(np.array(self.usersToEvaluate), self.n_workers)
+
+        # The workers are terminated when leaving the context, also if an exception is raised
+        with multiprocessing.Pool(processes=self.n_workers,
+                                  initializer=init_worker_state,
+                                  initargs=({}, {"evaluator_object": self,
+                                                 "recommender_object": recommender_object})) as pool:
+
+            shard_results_list = pool.map(_run_evaluation_on_users_shard, usersToEvaluate_shard_list)
+
+        results_dict, n_users_evaluated = shard_results_list[0]
+
+        for shard_results_dict, shard_n_users_evaluated in shard_results_list[1:]:
+            merge_metrics_dict(results_dict, shard_results_dict)
+            n_users_evaluated += shard_n_users_evaluated
+
+        return results_dict, n_users_evaluated
+
+    def _compute_metrics_on_recommendation_list_batch(self, test_user_batch_array, recommended_items_batch,
+                                                      scores_batch, results_dict):
+        """
+        Computes the metrics for a block of users with vectorized operations, adding them to results_dict
+        :param test_user_batch_array:       array of user indices
+        :param recommended_items_batch:     matrix (n_users, max_cutoff) with the recommendation list of each user,
+                                            padded with -1 if shorter than max_cutoff
+        :param scores_batch:                matrix (n_users, n_items) with the predicted scores
+        :param results_dict:
+        :return:
+        """
+
+        assert self.URM_test.getformat() == "csr", "Evaluator_Base_Class: URM_test is not CSR, this will cause errors in getting relevant items"
+
+        n_users_batch = len(test_user_batch_array)
+
+        URM_test_batch = self.URM_test[test_user_batch_array]
+        URM_test_batch.sort_indices()
+
+        n_test_items = np.ediff1d(URM_test_batch.indptr)
+        recommended_list_length = (recommended_items_batch >= 0).sum(axis=1)
+
+        # Each (user, item) pair is mapped to a unique key which is sorted as the CSR of URM_test_batch is,
+        # a recommended item is relevant if its key is found in the test data
+        test_keys = np.repeat(np.arange(n_users_batch, dtype=np.int64), n_test_items) * self.n_items + \
+                    URM_test_batch.indices
+
+        recommended_keys = np.arange(n_users_batch, dtype=np.int64)[:, None] * self.n_items + recommended_items_batch
+
+        # The padding -1 would be the key of the last item of the previous user
+        is_relevant_batch, test_position = get_sorted_keys_position(test_keys, recommended_keys)
+        is_relevant_batch = np.logical_and(is_relevant_batch, recommended_items_batch >= 0)
+
+        if len(test_keys) > 0:
+            relevance_batch = np.where(is_relevant_batch, URM_test_batch.data[test_position], 0.0)
+        else:
+            relevance_batch = np.zeros(recommended_items_batch.shape, dtype=np.float64)
+
+        ideal_dcg = ideal_dcg_batch(URM_test_batch)
+        user_rmse = rmse_batch(scores_batch, URM_test_batch)
+
+        for cutoff in self.cutoff_list:
+
+            results_current_cutoff = results_dict[cutoff]
+
+            is_relevant_current_cutoff = is_relevant_batch[:, 0:cutoff]
+            recommended_items_current_cutoff = recommended_items_batch[:, 0:cutoff]
+            recommended_list_length_current_cutoff = np.minimum(recommended_list_length, cutoff)
+
+            results_current_cutoff[EvaluatorMetrics.ROC_AUC.value] += roc_auc_batch(is_relevant_current_cutoff,
+                                                                                    recommended_list_length_current_cutoff).sum()
+            results_current_cutoff[EvaluatorMetrics.PRECISION.value] += precision_batch(is_relevant_current_cutoff,
+                                                                                        recommended_list_length_current_cutoff).sum()
+            results_current_cutoff[
+                EvaluatorMetrics.PRECISION_RECALL_MIN_DEN.value] += precision_recall_min_denominator_batch(
+                is_relevant_current_cutoff, recommended_list_length_current_cutoff, n_test_items).sum()
+            results_current_cutoff[EvaluatorMetrics.RECALL.value] += recall_batch(is_relevant_current_cutoff,
+                                                                                  n_test_items).sum()
+            results_current_cutoff[EvaluatorMetrics.NDCG.value] += ndcg_batch(relevance_batch[:, 0:cutoff],
+                                                                              ideal_dcg).sum()
+            results_current_cutoff[EvaluatorMetrics.HIT_RATE.value] += is_relevant_current_cutoff.sum()
+            results_current_cutoff[EvaluatorMetrics.ARHR.value] += arhr_batch(is_relevant_current_cutoff).sum()
+            results_current_cutoff[EvaluatorMetrics.RMSE.value] += user_rmse.sum()
+
+            results_current_cutoff[EvaluatorMetrics.MRR.value].add_recommendations_batch(is_relevant_current_cutoff)
+            results_current_cutoff[EvaluatorMetrics.MAP.value].add_recommendations_batch(is_relevant_current_cutoff,
+                                                                                         recommended_list_length_current_cutoff,
+                                                                                         n_test_items)
+            results_current_cutoff[EvaluatorMetrics.NOVELTY.value].add_recommendations_batch(
+                recommended_items_current_cutoff)
+            results_current_cutoff[EvaluatorMetrics.AVERAGE_POPULARITY.value].add_recommendations_batch(
+                recommended_items_current_cutoff)
+            results_current_cutoff[EvaluatorMetrics.DIVERSITY_GINI.value].add_recommendations_batch(
+                recommended_items_current_cutoff)
+            results_current_cutoff[EvaluatorMetrics.SHANNON_ENTROPY.value].add_recommendations_batch(
+                recommended_items_current_cutoff)
+            results_current_cutoff[EvaluatorMetrics.COVERAGE_ITEM.value].add_recommendations_batch(
+                recommended_items_current_cutoff)
+            results_current_cutoff[EvaluatorMetrics.COVERAGE_USER.value].add_recommendations_batch(
+                recommended_items_current_cutoff, test_user_batch_array)
+            results_current_cutoff[EvaluatorMetrics.DIVERSITY_MEAN_INTER_LIST.value].add_recommendations_batch(
+                recommended_items_current_cutoff)
+            results_current_cutoff[EvaluatorMetrics.DIVERSITY_HERFINDAHL.value].add_recommendations_batch(
+                recommended_items_current_cutoff)
+
+            if EvaluatorMetrics.DIVERSITY_SIMILARITY.value in results_current_cutoff:
+                results_current_cutoff[EvaluatorMetrics.DIVERSITY_SIMILARITY.value].add_recommendations_batch(
+                    recommended_items_current_cutoff)
+
     def get_user_relevant_items(self, user_id):
 
         assert self.URM_test.getformat() == "csr", "Evaluator_Base_Class: URM_test is not CSR, this will cause errors in getting relevant items"
@@ -199,12 +438,14 @@ class EvaluatorHoldout(Evaluator):
     def __init__(self, URM_test_list, cutoff_list, minRatingsPerUser=1, exclude_seen=True,
                  diversity_object=None,
                  ignore_items=None,
-                 ignore_users=None):
+                 ignore_users=None,
+                 n_workers=1):
 
         super(EvaluatorHoldout, self).__init__(URM_test_list, cutoff_list,
                                                diversity_object=diversity_object,
                                                minRatingsPerUser=minRatingsPerUser, exclude_seen=exclude_seen,
-                                               ignore_items=ignore_items, ignore_users=ignore_users)
+                                               ignore_items=ignore_items, ignore_users=ignore_users,
+                                               n_workers=n_workers)
 
     def _run_evaluation_on_selected_users(self, recommender_object, usersToEvaluate, block_size=None):
 
@@ -230,7 +471,7 @@ class EvaluatorHoldout(Evaluator):
         user_batch_start = 0
         user_batch_end = 0
 
-        while user_batch_start < len(self.usersToEvaluate):
+        while user_batch_start < len(usersToEvaluate):
 
             user_batch_end = user_batch_start + block_size
             user_batch_end = min(user_batch_end, len(usersToEvaluate))
@@ -239,17 +480,18 @@ class EvaluatorHoldout(Evaluator):
             user_batch_start = user_batch_end
 
             # Compute predictions for a batch of users using vectorization, much more efficient than computing it one at a time
-            recommended_items_batch_list, scores_batch = recommender_object.recommend(test_user_batch_array,
-                                                                                      remove_seen_flag=self.exclude_seen,
-                                                                                      cutoff=self.max_cutoff,
-                                                                                      remove_top_pop_flag=False,
-                                                                                      remove_CustomItems_flag=self.ignore_items_flag,
-                                                                                      return_scores=True
-                                                                                      )
-
-            assert len(recommended_items_batch_list) == len(
-                test_user_batch_array), "{}: recommended_items_batch_list contained recommendations for {} users, expected was {}".format(
-                self.EVALUATOR_NAME, len(recommended_items_batch_list), len(test_user_batch_array))
+            recommended_items_batch, _, scores_batch = recommender_object.recommend(test_user_batch_array,
+                                                                                    remove_seen_flag=self.exclude_seen,
+                                                                                    cutoff=self.max_cutoff,
+                                                                                    remove_top_pop_flag=False,
+                                                                                    remove_CustomItems_flag=self.ignore_items_flag,
+                                                                                    return_scores=True,
+                                                                                    return_ranking_array=True
+                                                                                    )
+
+            assert len(recommended_items_batch) == len(
+                test_user_batch_array), "{}: recommended_items_batch contained recommendations for {} users, expected was {}".format(
+                self.EVALUATOR_NAME, len(recommended_items_batch), len(test_user_batch_array))
 
             assert scores_batch.shape[0] == len(
                 test_user_batch_array), "{}: scores_batch contained scores for {} users, expected was {}".format(
@@ -259,84 +501,27 @@ class EvaluatorHoldout(Evaluator):
                        1] == self.n_items, "{}: scores_batch contained scores for {} items, expected was {}".format(
                 self.EVALUATOR_NAME, scores_batch.shape[1], self.n_items)
 
-            # Compute recommendation quality for each user in batch
-            for batch_user_index in range(len(recommended_items_batch_list)):
-
-                test_user = test_user_batch_array[batch_user_index]
-
-                relevant_items = self.get_user_relevant_items(test_user)
-                relevant_items_rating = self.get_user_test_ratings(test_user)
-
-                all_items_predicted_ratings = scores_batch[batch_user_index]
-                user_rmse = rmse(all_items_predicted_ratings, relevant_items, relevant_items_rating)
-
-                # Being the URM CSR, the indices are the non-zero column indexes
-                recommended_items = recommended_items_batch_list[batch_user_index]
-                is_relevant = np.in1d(recommended_items, relevant_items, assume_unique=True)
-
-                n_users_evaluated += 1
-
-                for cutoff in self.cutoff_list:
-
-                    results_current_cutoff = results_dict[cutoff]
-
-                    is_relevant_current_cutoff = is_relevant[0:cutoff]
-                    recommended_items_current_cutoff = recommended_items[0:cutoff]
-
-                    results_current_cutoff[EvaluatorMetrics.ROC_AUC.value] += roc_auc(is_relevant_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.PRECISION.value] += precision(is_relevant_current_cutoff)
-                    results_current_cutoff[
-                        EvaluatorMetrics.PRECISION_RECALL_MIN_DEN.value] += precision_recall_min_denominator(
-                        is_relevant_current_cutoff, len(relevant_items))
-                    results_current_cutoff[EvaluatorMetrics.RECALL.value] += recall(is_relevant_current_cutoff,
-                                                                                    relevant_items)
-                    results_current_cutoff[EvaluatorMetrics.NDCG.value] += ndcg(recommended_items_current_cutoff,
-                                                                                relevant_items,
-                                                                                relevance=self.get_user_test_ratings(
-                                                                                    test_user), at=cutoff)
-                    results_current_cutoff[EvaluatorMetrics.HIT_RATE.value] += is_relevant_current_cutoff.sum()
-                    results_current_cutoff[EvaluatorMetrics.ARHR.value] += arhr(is_relevant_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.RMSE.value] += user_rmse
-
-                    results_current_cutoff[EvaluatorMetrics.MRR.value].add_recommendations(is_relevant_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.MAP.value].add_recommendations(is_relevant_current_cutoff,
-                                                                                           relevant_items)
-                    results_current_cutoff[EvaluatorMetrics.NOVELTY.value].add_recommendations(
-                        recommended_items_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.AVERAGE_POPULARITY.value].add_recommendations(
-                        recommended_items_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.DIVERSITY_GINI.value].add_recommendations(
-                        recommended_items_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.SHANNON_ENTROPY.value].add_recommendations(
-                        recommended_items_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.COVERAGE_ITEM.value].add_recommendations(
-                        recommended_items_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.COVERAGE_USER.value].add_recommendations(
-                        recommended_items_current_cutoff, test_user)
-                    results_current_cutoff[EvaluatorMetrics.DIVERSITY_MEAN_INTER_LIST.value].add_recommendations(
-                        recommended_items_current_cutoff)
-                    results_current_cutoff[EvaluatorMetrics.DIVERSITY_HERFINDAHL.value].add_recommendations(
-                        recommended_items_current_cutoff)
-
-                    if EvaluatorMetrics.DIVERSITY_SIMILARITY.value in results_current_cutoff:
-                        results_current_cutoff[EvaluatorMetrics.DIVERSITY_SIMILARITY.value].add_recommendations(
-                            recommended_items_current_cutoff)
-
-                if time.time() - start_time_print > 30 or n_users_evaluated == len(self.usersToEvaluate):
-                    elapsed_time = time.time() - start_time
-                    new_time_value, new_time_unit = seconds_to_biggest_unit(elapsed_time)
-
-                    print("{}: Processed {} ( {:.2f}% ) in {:.2f} {}. Users per second: {:.0f}".format(
-                        self.EVALUATOR_NAME,
-                        n_users_evaluated,
-                        100.0 * float(n_users_evaluated) / len(self.usersToEvaluate),
-                        new_time_value, new_time_unit,
-                        float(n_users_evaluated) / elapsed_time))
-
-                    sys.stdout.flush()
-                    sys.stderr.flush()
-
-                    start_time_print = time.time()
+            # Compute recommendation quality for all users in batch
+            self._compute_metrics_on_recommendation_list_batch(test_user_batch_array, recommended_items_batch,
+                                                               scores_batch, results_dict)
+
+            n_users_evaluated += len(test_user_batch_array)
+
+            if time.time() - start_time_print > 30 or n_users_evaluated == len(usersToEvaluate):
+                elapsed_time = time.time() - start_time
+                new_time_value, new_time_unit = seconds_to_biggest_unit(elapsed_time)
+
+                print("{}: Processed {} ( {:.2f}% ) in {:.2f} {}. Users per second: {:.0f}".format(
+                    self.EVALUATOR_NAME,
+                    n_users_evaluated,
+                    100.0 * float(n_users_evaluated) / len(usersToEvaluate),
+                    new_time_value, new_time_unit,
+                    float(n_users_evaluated) / elapsed_time))
+
+                sys.stdout.flush()
+                sys.stderr.flush()
+
+                start_time_print = time.time()
 
         return results_dict, n_users_evaluated
 
@@ -350,8 +535,7 @@ class EvaluatorHoldout(Evaluator):
         if self.ignore_items_flag:
             recommender_object.set_items_to_ignore(self.ignore_items_ID)
 
-        results_dict, n_users_evaluated = self._run_evaluation_on_selected_users(recommender_object,
-                                                                                 self.usersToEvaluate)
+        results_dict, n_users_evaluated = self._run_evaluation_on_all_users(recommender_object)
 
         if (n_users_evaluated > 0):
 
@@ -396,7 +580,8 @@ class EvaluatorNegativeItemSample(Evaluator):
     def __init__(self, URM_test_list, URM_test_negative, cutoff_list, minRatingsPerUser=1, exclude_seen=True,
                  diversity_object=None,
                  ignore_items=None,
-                 ignore_users=None):
+                 ignore_users=None,
+                 n_workers=1):
         """
 
         The EvaluatorNegativeItemSample computes the recommendations by sorting the test items as well as the test_negative items
@@ -410,13 +595,15 @@ class EvaluatorNegativeItemSample(Evaluator):
         :param diversity_object:
         :param ignore_items:
         :param ignore_users:
+        :param n_workers:           Number of processes among which the users to evaluate are split
         """
 
         super(EvaluatorNegativeItemSample, self).__init__(URM_test_list, cutoff_list,
                                                           diversity_object=diversity_object,
                                                           minRatingsPerUser=minRatingsPerUser,
                                                           exclude_seen=exclude_seen,
-                                                          ignore_items=ignore_items, ignore_users=ignore_users)
+                                                          ignore_items=ignore_items, ignore_users=ignore_users,
+                                                          n_workers=n_workers)
 
         self.URM_items_to_rank = sps.csr_matrix(self.URM_test.copy().astype(np.bool)) + sps.csr_matrix(
             URM_test_negative.copy().astype(np.bool))
@@ -432,12 +619,10 @@ class EvaluatorNegativeItemSample(Evaluator):
 
         return items_to_compute
 
-    def evaluateRecommender(self, recommender_object):
-        """
-        :param recommender_object: the trained recommender object, a BaseRecommender subclass
-        :param URM_test_list: list of URMs to test the recommender against, or a single URM object
-        :param cutoff_list: list of cutoffs to be use to report the scores, or a single cutoff
-        """
+    def _run_evaluation_on_selected_users(self, recommender_object, usersToEvaluate, block_size=None):
+
+        if block_size is None:
+            block_size = min(1000, int(1e8 / self.n_items))
 
         results_dict = {}
 
@@ -454,101 +639,57 @@ class EvaluatorNegativeItemSample(Evaluator):
 
         n_users_evaluated = 0
 
-        if self.ignore_items_flag:
-            recommender_object.set_items_to_ignore(self.ignore_items_ID)
-
-        for test_user in self.usersToEvaluate:
-
-            # Being the URM CSR, the indices are the non-zero column indexes
-            relevant_items = self.get_user_relevant_items(test_user)
-            relevant_items_rating = self.get_user_test_ratings(test_user)
-
-            n_users_evaluated += 1
-
-            items_to_compute = self._get_user_specific_items_to_compute(test_user)
-
-            recommended_items, all_items_predicted_ratings = recommender_object.recommend(np.atleast_1d(test_user),
-                                                                                          remove_seen_flag=self.exclude_seen,
-                                                                                          cutoff=self.max_cutoff,
-                                                                                          remove_top_pop_flag=False,
-                                                                                          items_to_compute=items_to_compute,
-                                                                                          remove_CustomItems_flag=self.ignore_items_flag,
-                                                                                          return_scores=True
-                                                                                          )
+        user_batch_start = 0
+        user_batch_end = 0
 
-            assert len(
-                recommended_items) == 1, "{}: recommended_items contained recommendations for {} users, expected was {}".format(
-                self.EVALUATOR_NAME, len(recommended_items), 1)
+        while user_batch_start < len(usersToEvaluate):
 
-            assert all_items_predicted_ratings.shape[
-                       0] == 1, "{}: all_items_predicted_ratings contained scores for {} users, expected was {}".format(
-                self.EVALUATOR_NAME, all_items_predicted_ratings.shape[0], 1)
+            user_batch_end = user_batch_start + block_size
+            user_batch_end = min(user_batch_end, len(usersToEvaluate))
 
-            assert all_items_predicted_ratings.shape[
-                       1] == self.n_items, "{}: all_items_predicted_ratings contained scores for {} items, expected was {}".format(
-                self.EVALUATOR_NAME, all_items_predicted_ratings.shape[1], self.n_items)
+            test_user_batch_array = np.array(usersToEvaluate[user_batch_start:user_batch_end])
+            user_batch_start = user_batch_end
 
-            recommended_items = np.array(recommended_items[0])
-            user_rmse = rmse(all_items_predicted_ratings[0], relevant_items, relevant_items_rating)
+            # The scores are computed only for the union of the items to rank of all users in the batch,
+            # each user then ranks only its own items
+            user_items_to_rank = self.URM_items_to_rank[test_user_batch_array]
 
-            recommender_object.reset_items_to_ignore()
+            recommended_items_batch, _, scores_batch = recommender_object.recommend(test_user_batch_array,
+                                                                                    remove_seen_flag=self.exclude_seen,
+                                                                                    cutoff=self.max_cutoff,
+                                                                                    remove_top_pop_flag=False,
+                                                                                    items_to_compute=user_items_to_rank,
+                                                                                    remove_CustomItems_flag=self.ignore_items_flag,
+                                                                                    return_scores=True,
+                                                                                    return_ranking_array=True
+                                                                                    )
 
-            is_relevant = np.in1d(recommended_items, relevant_items, assume_unique=True)
+            assert len(recommended_items_batch) == len(
+                test_user_batch_array), "{}: recommended_items_batch contained recommendations for {} users, expected was {}".format(
+                self.EVALUATOR_NAME, len(recommended_items_batch), len(test_user_batch_array))
 
-            for cutoff in self.cutoff_list:
+            assert scores_batch.shape[0] == len(
+                test_user_batch_array), "{}: scores_batch contained scores for {} users, expected was {}".format(
+                self.EVALUATOR_NAME, scores_batch.shape[0], len(test_user_batch_array))
 
-                results_current_cutoff = results_dict[cutoff]
+            assert scores_batch.shape[
+                       1] == self.n_items, "{}: scores_batch contained scores for {} items, expected was {}".format(
+                self.EVALUATOR_NAME, scores_batch.shape[1], self.n_items)
 
-                is_relevant_current_cutoff = is_relevant[0:cutoff]
-                recommended_items_current_cutoff = recommended_items[0:cutoff]
-
-                results_current_cutoff[EvaluatorMetrics.ROC_AUC.value] += roc_auc(is_relevant_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.PRECISION.value] += precision(is_relevant_current_cutoff)
-                results_current_cutoff[
-                    EvaluatorMetrics.PRECISION_RECALL_MIN_DEN.value] += precision_recall_min_denominator(
-                    is_relevant_current_cutoff, len(relevant_items))
-                results_current_cutoff[EvaluatorMetrics.RECALL.value] += recall(is_relevant_current_cutoff,
-                                                                                relevant_items)
-                results_current_cutoff[EvaluatorMetrics.NDCG.value] += ndcg(recommended_items_current_cutoff,
-                                                                            relevant_items,
-                                                                            relevance=self.get_user_test_ratings(
-                                                                                test_user), at=cutoff)
-                results_current_cutoff[EvaluatorMetrics.HIT_RATE.value] += is_relevant_current_cutoff.sum()
-                results_current_cutoff[EvaluatorMetrics.ARHR.value] += arhr(is_relevant_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.RMSE.value] += user_rmse
-
-                results_current_cutoff[EvaluatorMetrics.MRR.value].add_recommendations(is_relevant_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.MAP.value].add_recommendations(is_relevant_current_cutoff,
-                                                                                       relevant_items)
-                results_current_cutoff[EvaluatorMetrics.NOVELTY.value].add_recommendations(
-                    recommended_items_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.AVERAGE_POPULARITY.value].add_recommendations(
-                    recommended_items_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.DIVERSITY_GINI.value].add_recommendations(
-                    recommended_items_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.SHANNON_ENTROPY.value].add_recommendations(
-                    recommended_items_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.COVERAGE_ITEM.value].add_recommendations(
-                    recommended_items_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.COVERAGE_USER.value].add_recommendations(
-                    recommended_items_current_cutoff, test_user)
-                results_current_cutoff[EvaluatorMetrics.DIVERSITY_MEAN_INTER_LIST.value].add_recommendations(
-                    recommended_items_current_cutoff)
-                results_current_cutoff[EvaluatorMetrics.DIVERSITY_HERFINDAHL.value].add_recommendations(
-                    recommended_items_current_cutoff)
+            # Compute recommendation quality for all users in batch
+            self._compute_metrics_on_recommendation_list_batch(test_user_batch_array, recommended_items_batch,
+                                                               scores_batch, results_dict)
 
-                if EvaluatorMetrics.DIVERSITY_SIMILARITY.value in results_current_cutoff:
-                    results_current_cutoff[EvaluatorMetrics.DIVERSITY_SIMILARITY.value].add_recommendations(
-                        recommended_items_current_cutoff)
+            n_users_evaluated += len(test_user_batch_array)
 
-            if time.time() - start_time_print > 30 or n_users_evaluated == len(self.usersToEvaluate):
+            if time.time() - start_time_print > 30 or n_users_evaluated == len(usersToEvaluate):
                 elapsed_time = time.time() - start_time
                 new_time_value, new_time_unit = seconds_to_biggest_unit(elapsed_time)
 
                 print("{}: Processed {} ( {:.2f}% ) in {:.2f} {}. Users per second: {:.0f}".format(
                     self.EVALUATOR_NAME,
                     n_users_evaluated,
-                    100.0 * float(n_users_evaluated) / len(self.usersToEvaluate),
+                    100.0 * float(n_users_evaluated) / len(usersToEvaluate),
                     new_time_value, new_time_unit,
                     float(n_users_evaluated) / elapsed_time))
 
@@ -557,6 +698,20 @@ class EvaluatorNegativeItemSample(Evaluator):
 
                 start_time_print = time.time()
 
+        return results_dict, n_users_evaluated
+
+    def evaluateRecommender(self, recommender_object):
+        """
+        :param recommender_object: the trained recommender object, a BaseRecommender subclass
+        :param URM_test_list: list of URMs to test the recommender against, or a single URM object
+        :param cutoff_list: list of cutoffs to be use to report the scores, or a single cutoff
+        """
+
+        if self.ignore_items_flag:
+            recommender_object.set_items_to_ignore(self.ignore_items_ID)
+
+        results_dict, n_users_evaluated = self._run_evaluation_on_all_users(recommender_object)
+
         if (n_users_evaluated > 0):
 
             for cutoff in self.cutoff_list:
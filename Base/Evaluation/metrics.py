@@ -20,6 +20,13 @@ class Metrics_Object(object):
     def add_recommendations(self, recommended_items_ids):
         raise NotImplementedError()
 
+    def add_recommendations_batch(self, recommended_items_batch):
+        """
+        :param recommended_items_batch:     matrix (n_users, cutoff) with a recommendation list in each row,
+                                            lists shorter than the cutoff are padded with -1
+        """
+        raise NotImplementedError()
+
     def get_metric_value(self):
         raise NotImplementedError()
 
@@ -42,11 +49,14 @@ class Coverage_Item(Metrics_Object):
         if len(recommended_items_ids) > 0:
             self.recommended_mask[recommended_items_ids] = True
 
+    def add_recommendations_batch(self, recommended_items_batch):
+        self.recommended_mask[recommended_items_batch[recommended_items_batch >= 0]] = True
+
     def get_metric_value(self):
         return self.recommended_mask.sum() / (len(self.recommended_mask) - self.n_ignore_items)
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Coverage_Item, "Coverage_Item: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Coverage_Item), "Coverage_Item: attempting to merge with a metric object of different type"
 
         self.recommended_mask = np.logical_or(self.recommended_mask, other_metric_object.recommended_mask)
 
@@ -66,11 +76,14 @@ class Coverage_User(Metrics_Object):
     def add_recommendations(self, recommended_items_ids, user_id):
         self.users_mask[user_id] = len(recommended_items_ids) > 0
 
+    def add_recommendations_batch(self, recommended_items_batch, user_id_array):
+        self.users_mask[user_id_array] = (recommended_items_batch >= 0).any(axis=1)
+
     def get_metric_value(self):
         return self.users_mask.sum() / (len(self.users_mask) - self.n_ignore_users)
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Coverage_User, "Coverage_User: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Coverage_User), "Coverage_User: attempting to merge with a metric object of different type"
 
         self.users_mask = np.logical_or(self.users_mask, other_metric_object.users_mask)
 
@@ -90,11 +103,15 @@ class MAP(Metrics_Object):
         self.cumulative_AP += average_precision(is_relevant, pos_items)
         self.n_users += 1
 
+    def add_recommendations_batch(self, is_relevant_batch, recommended_list_length, n_test_items):
+        self.cumulative_AP += average_precision_batch(is_relevant_batch, recommended_list_length, n_test_items).sum()
+        self.n_users += len(is_relevant_batch)
+
     def get_metric_value(self):
         return self.cumulative_AP / self.n_users
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is MAP, "MAP: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, MAP), "MAP: attempting to merge with a metric object of different type"
 
         self.cumulative_AP += other_metric_object.cumulative_AP
         self.n_users += other_metric_object.n_users
@@ -115,11 +132,15 @@ class MRR(Metrics_Object):
         self.cumulative_RR += rr(is_relevant)
         self.n_users += 1
 
+    def add_recommendations_batch(self, is_relevant_batch):
+        self.cumulative_RR += rr_batch(is_relevant_batch).sum()
+        self.n_users += len(is_relevant_batch)
+
     def get_metric_value(self):
         return self.cumulative_RR / self.n_users
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is MAP, "MRR: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, MRR), "MRR: attempting to merge with a metric object of different type"
 
         self.cumulative_RR += other_metric_object.cumulative_RR
         self.n_users += other_metric_object.n_users
@@ -146,6 +167,10 @@ class Gini_Diversity(Metrics_Object):
         if len(recommended_items_ids) > 0:
             self.recommended_counter[recommended_items_ids] += 1
 
+    def add_recommendations_batch(self, recommended_items_batch):
+        self.recommended_counter += np.bincount(recommended_items_batch[recommended_items_batch >= 0],
+                                                minlength=len(self.recommended_counter))
+
     def get_metric_value(self):
         recommended_counter = self.recommended_counter.copy()
 
@@ -167,7 +192,7 @@ class Gini_Diversity(Metrics_Object):
         return gini_diversity
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Gini_Diversity, "Gini_Diversity: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Gini_Diversity), "Gini_Diversity: attempting to merge with a metric object of different type"
 
         self.recommended_counter += other_metric_object.recommended_counter
 
@@ -194,6 +219,10 @@ class Diversity_Herfindahl(Metrics_Object):
         if len(recommended_items_ids) > 0:
             self.recommended_counter[recommended_items_ids] += 1
 
+    def add_recommendations_batch(self, recommended_items_batch):
+        self.recommended_counter += np.bincount(recommended_items_batch[recommended_items_batch >= 0],
+                                                minlength=len(self.recommended_counter))
+
     def get_metric_value(self):
 
         recommended_counter = self.recommended_counter.copy()
@@ -211,7 +240,7 @@ class Diversity_Herfindahl(Metrics_Object):
         return herfindahl_index
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Diversity_Herfindahl, "Diversity_Herfindahl: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Diversity_Herfindahl), "Diversity_Herfindahl: attempting to merge with a metric object of different type"
 
         self.recommended_counter += other_metric_object.recommended_counter
 
@@ -241,6 +270,10 @@ class Shannon_Entropy(Metrics_Object):
         if len(recommended_items_ids) > 0:
             self.recommended_counter[recommended_items_ids] += 1
 
+    def add_recommendations_batch(self, recommended_items_batch):
+        self.recommended_counter += np.bincount(recommended_items_batch[recommended_items_batch >= 0],
+                                                minlength=len(self.recommended_counter))
+
     def get_metric_value(self):
         assert np.all(
             self.recommended_counter >= 0.0), "Shannon_Entropy: self.recommended_counter contains negative counts"
@@ -264,7 +297,7 @@ class Shannon_Entropy(Metrics_Object):
         return shannon_entropy
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Gini_Diversity, "Shannon_Entropy: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Shannon_Entropy), "Shannon_Entropy: attempting to merge with a metric object of different type"
 
         assert np.all(
             self.recommended_counter >= 0.0), "Shannon_Entropy: self.recommended_counter contains negative counts"
@@ -313,6 +346,17 @@ class Novelty(Metrics_Object):
 
             self.novelty += np.sum(-np.log2(probability) / self.n_items)
 
+    def add_recommendations_batch(self, recommended_items_batch):
+
+        self.n_evaluated_users += len(recommended_items_batch)
+
+        recommended_items_popularity = self.item_popularity[recommended_items_batch[recommended_items_batch >= 0]]
+
+        probability = recommended_items_popularity / self.n_interactions
+        probability = probability[probability != 0]
+
+        self.novelty += np.sum(-np.log2(probability) / self.n_items)
+
     def get_metric_value(self):
 
         if self.n_evaluated_users == 0:
@@ -321,7 +365,7 @@ class Novelty(Metrics_Object):
         return self.novelty / self.n_evaluated_users
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Novelty, "Novelty: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Novelty), "Novelty: attempting to merge with a metric object of different type"
 
         self.novelty = self.novelty + other_metric_object.novelty
         self.n_evaluated_users = self.n_evaluated_users + other_metric_object.n_evaluated_users
@@ -356,6 +400,20 @@ class AveragePopularity(Metrics_Object):
 
             self.cumulative_popularity += np.sum(recommended_items_popularity) / len(recommended_items_ids)
 
+    def add_recommendations_batch(self, recommended_items_batch):
+
+        self.n_evaluated_users += len(recommended_items_batch)
+
+        valid_mask = recommended_items_batch >= 0
+        recommended_list_length = valid_mask.sum(axis=1)
+
+        recommended_items_popularity = np.zeros(recommended_items_batch.shape, dtype=np.float64)
+        recommended_items_popularity[valid_mask] = self.item_popularity_normalized[recommended_items_batch[valid_mask]]
+
+        non_empty_mask = recommended_list_length > 0
+        self.cumulative_popularity += np.sum(recommended_items_popularity[non_empty_mask].sum(axis=1) /
+                                             recommended_list_length[non_empty_mask])
+
     def get_metric_value(self):
 
         if self.n_evaluated_users == 0:
@@ -364,7 +422,7 @@ class AveragePopularity(Metrics_Object):
         return self.cumulative_popularity / self.n_evaluated_users
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Novelty, "AveragePopularity: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, AveragePopularity), "AveragePopularity: attempting to merge with a metric object of different type"
 
         self.cumulative_popularity = self.cumulative_popularity + other_metric_object.cumulative_popularity
         self.n_evaluated_users = self.n_evaluated_users + other_metric_object.n_evaluated_users
@@ -409,6 +467,11 @@ class Diversity_similarity(Metrics_Object):
 
         self.n_evaluated_users += 1
 
+    def add_recommendations_batch(self, recommended_items_batch):
+
+        for recommended_items_ids in recommended_items_batch:
+            self.add_recommendations(recommended_items_ids[recommended_items_ids >= 0])
+
     def get_metric_value(self):
 
         if self.n_evaluated_users == 0:
@@ -417,7 +480,7 @@ class Diversity_similarity(Metrics_Object):
         return self.diversity / self.n_evaluated_users
 
     def merge_with_other(self, other_metric_object):
-        assert other_metric_object is Diversity_similarity, "Diversity: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Diversity_similarity), "Diversity: attempting to merge with a metric object of different type"
 
         self.diversity = self.diversity + other_metric_object.diversity
         self.n_evaluated_users = self.n_evaluated_users + other_metric_object.n_evaluated_users
@@ -493,6 +556,14 @@ class Diversity_MeanInterList(Metrics_Object):
         if len(recommended_items_ids) > 0:
             self.recommended_counter[recommended_items_ids] += 1
 
+    def add_recommendations_batch(self, recommended_items_batch):
+
+        assert recommended_items_batch.shape[1] <= self.cutoff, "Diversity_MeanInterList: recommended list is contains more elements than cutoff"
+
+        self.n_evaluated_users += len(recommended_items_batch)
+        self.recommended_counter += np.bincount(recommended_items_batch[recommended_items_batch >= 0],
+                                                minlength=len(self.recommended_counter))
+
     def get_metric_value(self):
 
         # Requires to compute the number of common elements for all couples of users
@@ -522,7 +593,7 @@ class Diversity_MeanInterList(Metrics_Object):
 
     def merge_with_other(self, other_metric_object):
 
-        assert other_metric_object is Diversity_MeanInterList, "Diversity_MeanInterList: attempting to merge with a metric object of different type"
+        assert isinstance(other_metric_object, Diversity_MeanInterList), "Diversity_MeanInterList: attempting to merge with a metric object of different type"
 
         assert np.all(
             self.recommended_counter >= 0.0), "Diversity_MeanInterList: self.recommended_counter contains negative counts"
@@ -673,6 +744,151 @@ def dcg(scores):
                   dtype=np.float32)
 
 
+#########################################################################################################
+##########                                                                                     ##########
+##########                              BATCH METRICS                                          ##########
+##########                                                                                     ##########
+#########################################################################################################
+
+# The following functions compute the same metrics as their single-user counterparts for a block of users at once.
+# Each row of is_relevant_batch is the is_relevant array of a user, truncated at the cutoff.
+# Recommendation lists shorter than the cutoff are padded with False, their true length is in recommended_list_length.
+
+
+def roc_auc_batch(is_relevant_batch, recommended_list_length):
+    valid_mask = np.arange(is_relevant_batch.shape[1]) < recommended_list_length[:, None]
+    is_negative = np.logical_and(valid_mask, np.logical_not(is_relevant_batch))
+
+    n_pos = is_relevant_batch.sum(axis=1)
+    n_neg = is_negative.sum(axis=1)
+
+    # For each relevant item, count the negative ones ranked after it
+    neg_ranked_after = n_neg[:, None] - np.cumsum(is_negative, axis=1)
+    pos_before_neg_count = np.sum(neg_ranked_after * is_relevant_batch, axis=1, dtype=np.float64)
+
+    auc_score = np.zeros(len(is_relevant_batch), dtype=np.float64)
+
+    valid_pairs_mask = np.logical_and(n_pos > 0, n_neg > 0)
+    auc_score[valid_pairs_mask] = pos_before_neg_count[valid_pairs_mask] / (n_pos[valid_pairs_mask] * n_neg[valid_pairs_mask])
+    auc_score[n_neg == 0] = 1.0
+
+    return auc_score
+
+
+def arhr_batch(is_relevant_batch):
+    p_reciprocal = 1 / np.arange(1, is_relevant_batch.shape[1] + 1, 1.0, dtype=np.float64)
+    return is_relevant_batch.dot(p_reciprocal)
+
+
+def precision_batch(is_relevant_batch, recommended_list_length):
+    precision_score = np.zeros(len(is_relevant_batch), dtype=np.float64)
+
+    non_empty_mask = recommended_list_length > 0
+    precision_score[non_empty_mask] = is_relevant_batch[non_empty_mask].sum(axis=1) / recommended_list_length[non_empty_mask]
+
+    return precision_score
+
+
+def precision_recall_min_denominator_batch(is_relevant_batch, recommended_list_length, n_test_items):
+    precision_score = np.zeros(len(is_relevant_batch), dtype=np.float64)
+
+    non_empty_mask = recommended_list_length > 0
+    denominator = np.minimum(n_test_items, recommended_list_length)
+    precision_score[non_empty_mask] = is_relevant_batch[non_empty_mask].sum(axis=1) / denominator[non_empty_mask]
+
+    return precision_score
+
+
+def recall_batch(is_relevant_batch, n_test_items):
+    return is_relevant_batch.sum(axis=1) / n_test_items
+
+
+def rr_batch(is_relevant_batch):
+    # reciprocal rank of the FIRST relevant item in the ranked list (0 if none)
+    rr_score = np.zeros(len(is_relevant_batch), dtype=np.float64)
+
+    has_relevant_mask = is_relevant_batch.any(axis=1)
+    rr_score[has_relevant_mask] = 1. / (is_relevant_batch[has_relevant_mask].argmax(axis=1) + 1)
+
+    return rr_score
+
+
+def average_precision_batch(is_relevant_batch, recommended_list_length, n_test_items):
+    a_p = np.zeros(len(is_relevant_batch), dtype=np.float64)
+
+    p_at_k = is_relevant_batch * np.cumsum(is_relevant_batch, axis=1, dtype=np.float64) / (
+                1 + np.arange(is_relevant_batch.shape[1]))
+
+    non_empty_mask = recommended_list_length > 0
+    denominator = np.minimum(n_test_items, recommended_list_length)
+    a_p[non_empty_mask] = p_at_k[non_empty_mask].sum(axis=1) / denominator[non_empty_mask]
+
+    return a_p
+
+
+def dcg_batch(scores_batch):
+    return np.sum((np.power(2, scores_batch) - 1) / np.log(np.arange(scores_batch.shape[1], dtype=np.float64) + 2),
+                  axis=1)
+
+
+def ideal_dcg_batch(URM_test_batch):
+    """
+    Computes the ideal DCG of each row of a CSR matrix containing the test relevance of each user
+    :param URM_test_batch:
+    :return:
+    """
+
+    profile_length = np.ediff1d(URM_test_batch.indptr)
+    row_index = np.repeat(np.arange(URM_test_batch.shape[0]), profile_length)
+
+    # Sort the relevance of each user in descending order and get the position of each value within its row
+    relevance_sorted = URM_test_batch.data[np.lexsort((-URM_test_batch.data, row_index))]
+    position_in_row = np.arange(len(relevance_sorted)) - np.repeat(URM_test_batch.indptr[:-1], profile_length)
+
+    gain = (np.power(2, relevance_sorted.astype(np.float64)) - 1) / np.log(position_in_row + 2)
+
+    return np.bincount(row_index, weights=gain, minlength=URM_test_batch.shape[0])
+
+
+def ndcg_batch(relevance_batch, ideal_dcg):
+    """
+    :param relevance_batch:     matrix with the relevance of the item recommended in each position, 0 if not relevant
+    :param ideal_dcg:           ideal DCG of each user, see ideal_dcg_batch
+    :return:
+    """
+
+    rank_dcg = dcg_batch(relevance_batch)
+
+    ndcg_ = np.zeros(len(relevance_batch), dtype=np.float64)
+
+    non_zero_mask = rank_dcg != 0.0
+    ndcg_[non_zero_mask] = rank_dcg[non_zero_mask] / ideal_dcg[non_zero_mask]
+
+    return ndcg_
+
+
+def rmse_batch(scores_batch, URM_test_batch):
+    # Important, some items will have -np.inf score and are treated as if they did not exist
+
+    profile_length = np.ediff1d(URM_test_batch.indptr)
+    row_index = np.repeat(np.arange(URM_test_batch.shape[0]), profile_length)
+
+    relevant_items_error = (scores_batch[row_index, URM_test_batch.indices] - URM_test_batch.data) ** 2
+
+    finite_prediction_mask = np.isfinite(relevant_items_error)
+
+    squared_error = np.bincount(row_index[finite_prediction_mask], weights=relevant_items_error[finite_prediction_mask],
+                                minlength=URM_test_batch.shape[0])
+    n_finite_predictions = np.bincount(row_index[finite_prediction_mask], minlength=URM_test_batch.shape[0])
+
+    rmse = np.full(URM_test_batch.shape[0], np.nan, dtype=np.float64)
+
+    finite_users_mask = n_finite_predictions > 0
+    rmse[finite_users_mask] = np.sqrt(squared_error[finite_users_mask] / n_finite_predictions[finite_users_mask])
+
+    return rmse
+
+
 metrics = ['AUC', 'Precision' 'Recall', 'MAP', 'NDCG']
 
 
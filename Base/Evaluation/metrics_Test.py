@@ -283,6 +283,70 @@ class MyTestCase(unittest.TestCase):
                                      (2 ** 4 - 1) / np.log(5)) / idcg))
         self.assertTrue(np.allclose(ndcg(ranked_list_3, pos_items, pos_relevances), 0.0))
 
+    def test_batch_metrics(self):
+
+        from Base.Evaluation.metrics import roc_auc, precision, precision_recall_min_denominator, recall, rr, \
+            average_precision, arhr, ndcg, rmse
+        from Base.Evaluation.metrics import roc_auc_batch, precision_batch, precision_recall_min_denominator_batch, \
+            recall_batch, rr_batch, average_precision_batch, arhr_batch, ndcg_batch, ideal_dcg_batch, rmse_batch
+        import scipy.sparse as sps
+
+        n_users = 50
+        n_items = 30
+        cutoff = 10
+
+        # Every user has at least one test item
+        URM_test = sps.random(n_users, n_items, density=0.2, format="csr", random_state=42)
+        URM_test = URM_test + sps.csr_matrix((np.ones(n_users), (np.arange(n_users), np.arange(n_users) % n_items)),
+                                             shape=(n_users, n_items))
+        URM_test.data = np.random.randint(1, 6, len(URM_test.data)).astype(np.float64)
+        URM_test.sort_indices()
+
+        scores_batch = np.random.rand(n_users, n_items)
+        scores_batch[np.random.rand(n_users, n_items) < 0.2] = -np.inf
+
+        recommended_list_length = np.random.randint(0, cutoff + 1, n_users)
+        is_relevant_batch = np.zeros((n_users, cutoff), dtype=bool)
+        relevance_batch = np.zeros((n_users, cutoff), dtype=np.float64)
+
+        single_user_results = []
+
+        for user_id in range(n_users):
+
+            pos_items = URM_test.indices[URM_test.indptr[user_id]:URM_test.indptr[user_id + 1]]
+            pos_relevance = URM_test.data[URM_test.indptr[user_id]:URM_test.indptr[user_id + 1]]
+
+            recommended_items = np.random.permutation(n_items)[:recommended_list_length[user_id]]
+            is_relevant = np.in1d(recommended_items, pos_items, assume_unique=True)
+
+            is_relevant_batch[user_id, :len(is_relevant)] = is_relevant
+            relevance_batch[user_id, :len(is_relevant)] = [pos_relevance[pos_items == item][0] if item in pos_items else 0.0
+                                                           for item in recommended_items]
+
+            single_user_results.append([roc_auc(is_relevant),
+                                        precision(is_relevant),
+                                        precision_recall_min_denominator(is_relevant, len(pos_items)),
+                                        recall(is_relevant, pos_items),
+                                        rr(is_relevant),
+                                        average_precision(is_relevant, pos_items),
+                                        arhr(is_relevant),
+                                        ndcg(recommended_items, pos_items, relevance=pos_relevance, at=cutoff),
+                                        rmse(scores_batch[user_id], pos_items, pos_relevance)])
+
+        n_test_items = np.ediff1d(URM_test.indptr)
+
+        batch_results = np.column_stack([roc_auc_batch(is_relevant_batch, recommended_list_length),
+                                         precision_batch(is_relevant_batch, recommended_list_length),
+                                         precision_recall_min_denominator_batch(is_relevant_batch, recommended_list_length, n_test_items),
+                                         recall_batch(is_relevant_batch, n_test_items),
+                                         rr_batch(is_relevant_batch),
+                                         average_precision_batch(is_relevant_batch, recommended_list_length, n_test_items),
+                                         arhr_batch(is_relevant_batch),
+                                         ndcg_batch(relevance_batch, ideal_dcg_batch(URM_test)),
+                                         rmse_batch(scores_batch, URM_test)])
+
+        self.assertTrue(np.allclose(np.array(single_user_results), batch_results, equal_nan=True, atol=1e-5),
+                        "batch metrics incorrect")
 
 if __name__ == '__main__':
     unittest.main()
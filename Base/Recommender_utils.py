@@ -111,6 +111,81 @@ def similarityMatrixTopK(item_weights, k=100, verbose=False):
     return W_sparse
 
 
+def get_sorted_keys_position(sorted_keys, keys):
+    """
+    Looks up integer keys in a sorted array of unique keys. Cells of a sparse matrix can be encoded as the int64
+    key row*n_cols + col, which allows to check in bulk whether sampled cells are in the matrix
+    :param sorted_keys:     sorted array of unique keys
+    :param keys:            array of keys to look up, of any shape
+    :return: is_present, boolean array with the shape of keys, and key_position, the position of each key in
+             sorted_keys, valid only where is_present is True
+    """
+
+    keys = np.asarray(keys)
+
+    if len(sorted_keys) == 0:
+        return np.zeros(keys.shape, dtype=bool), np.zeros(keys.shape, dtype=np.int64)
+
+    key_position = np.searchsorted(sorted_keys, keys)
+
+    # Keys greater than the last one are not present, any valid position can be compared
+    key_position[key_position == len(sorted_keys)] = 0
+
+    return sorted_keys[key_position] == keys, key_position
+
+
+def is_in_sorted_keys(sorted_keys, keys):
+    """
+    :return: boolean array with the shape of keys, True if the key is in sorted_keys. See get_sorted_keys_position
+    """
+
+    return get_sorted_keys_position(sorted_keys, keys)[0]
+
+
+def get_available_memory(default_memory=1e9):
+    """
+    Returns the memory in bytes that can be allocated without swapping, including the reclaimable page cache.
+    psutil is used if installed, otherwise MemAvailable is read from /proc/meminfo (Linux)
+    :param default_memory:      memory in bytes assumed as available if it cannot be determined
+    :return:
+    """
+
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/meminfo", "r") as meminfo_file:
+            for line in meminfo_file:
+                if line.startswith("MemAvailable:"):
+                    # The value is in kB
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return default_memory
+
+
+def get_block_size_for_available_memory(n_columns, bytes_per_cell=24, memory_fraction=0.1, default_memory=1e9):
+    """
+    Computes the number of rows of a dense block with n_columns such that it uses at most a fraction of the
+    available physical memory
+    :param n_columns:
+    :param bytes_per_cell:      memory required by each cell of the block, including temporary copies
+    :param memory_fraction:     fraction of the available memory the block can use
+    :param default_memory:      memory in bytes assumed as available if it cannot be determined (e.g., Windows without psutil)
+    :return: block size, at least 1
+    """
+
+    available_memory = get_available_memory(default_memory=default_memory)
+
+    block_size = int(available_memory * memory_fraction / (bytes_per_cell * max(n_columns, 1)))
+
+    return max(block_size, 1)
+
+
 def reshapeSparse(sparseMatrix, newShape):
     if sparseMatrix.shape[0] > newShape[0] or sparseMatrix.shape[1] > newShape[1]:
         ValueError("New shape cannot be smaller than SparseMatrix. SparseMatrix shape is: {}, newShape is {}".format(
@@ -6,7 +6,7 @@ Created on 30/09/17
 @author: Maurizio Ferrari Dacrema
 """
 
-from Base.Recommender_utils import similarityMatrixTopK
+from Base.Recommender_utils import similarityMatrixTopK, get_sorted_keys_position, is_in_sorted_keys
 
 import numpy as np
 import scipy.sparse as sps
@@ -46,6 +46,26 @@ class MyTestCase(unittest.TestCase):
 
         self.assertTrue(np.allclose(topk_on_dense_input, topk_on_sparse_input), "sparseToSparse CSC incorrect")
 
+    def test_get_sorted_keys_position(self):
+
+        URM = sps.random(50, 30, density=0.1, format="csr")
+        URM.sort_indices()
+
+        sorted_keys = np.repeat(np.arange(50, dtype=np.int64), np.ediff1d(URM.indptr)) * 30 + URM.indices
+
+        row = np.random.randint(0, 50, (40, 7))
+        col = np.random.randint(0, 30, (40, 7))
+
+        is_present, key_position = get_sorted_keys_position(sorted_keys, row * 30 + col)
+
+        self.assertEqual(is_present.shape, row.shape)
+        self.assertTrue(np.array_equal(is_present, URM[row.ravel(), col.ravel()].A1.reshape(row.shape) != 0))
+        self.assertTrue(np.array_equal(sorted_keys[key_position[is_present]], (row * 30 + col)[is_present]))
+
+        # Keys greater than the last one and empty key arrays
+        self.assertFalse(is_in_sorted_keys(sorted_keys, np.array([50 * 30 + 1])).any())
+        self.assertFalse(is_in_sorted_keys(np.zeros(0, dtype=np.int64), row * 30 + col).any())
+
 
 if __name__ == '__main__':
     unittest.main()
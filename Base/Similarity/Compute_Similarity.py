@@ -80,10 +80,13 @@ class Compute_Similarity:
 
                 except ImportError:
                     print("Unable to load Cython Compute_Similarity, reverting to Python")
+                    # The number of OpenMP threads only applies to the Cython implementation
+                    args.pop("n_threads", None)
                     self.compute_similarity_object = Compute_Similarity_Python(dataMatrix, **args)
 
 
             elif use_implementation == "python":
+                args.pop("n_threads", None)
                 self.compute_similarity_object = Compute_Similarity_Python(dataMatrix, **args)
 
             else:
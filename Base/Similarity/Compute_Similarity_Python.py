@@ -184,16 +184,15 @@ class Compute_Similarity_Python:
     def compute_similarity(self, start_col=None, end_col=None, block_size=100):
         """
         Compute the similarity for the given dataset
+        The similarities are computed on a dense block of block_size columns at a time. Normalization and TopK
+        selection are applied to the whole block with vectorized operations
         :param self:
         :param start_col: column to begin with
         :param end_col: column to stop before, end_col is excluded
+        :param block_size: number of columns computed at once
         :return:
         """
 
-        values = []
-        rows = []
-        cols = []
-
         start_time = time.time()
         start_time_print_batch = start_time
         processedItems = 0
@@ -232,6 +231,13 @@ class Compute_Similarity_Python:
         if end_col is not None and end_col > start_col_local and end_col < self.n_columns:
             end_col_local = end_col
 
+        # Data structure to incrementally build sparse matrix
+        # Preinitialize max possible length
+        values = np.zeros((end_col_local - start_col_local) * self.TopK, dtype=np.float32)
+        rows = np.zeros((end_col_local - start_col_local) * self.TopK, dtype=np.int32)
+        cols = np.zeros((end_col_local - start_col_local) * self.TopK, dtype=np.int32)
+        sparse_data_pointer = 0
+
         start_col_block = start_col_local
 
         this_block_size = 0
@@ -242,80 +248,79 @@ class Compute_Similarity_Python:
             end_col_block = min(start_col_block + block_size, end_col_local)
             this_block_size = end_col_block - start_col_block
 
-            # All data points for a given item
+            # All data points for a given item, shape |rows|x|block|
             item_data = self.dataMatrix[:, start_col_block:end_col_block]
-            item_data = item_data.toarray().squeeze()
-
-            # If only 1 feature avoid last dimension to disappear
-            if item_data.ndim == 1:
-                item_data = np.atleast_2d(item_data)
+            item_data = item_data.toarray()
 
             if self.use_row_weights:
                 this_block_weights = self.dataMatrix_weighted.T.dot(item_data)
 
             else:
-                # Compute item similarities
+                # Compute item similarities, shape |columns|x|block|
                 this_block_weights = self.dataMatrix.T.dot(item_data)
 
-            for col_index_in_block in range(this_block_size):
+            this_block_weights = np.asarray(this_block_weights, dtype=np.float64)
 
-                if this_block_size == 1:
-                    this_column_weights = this_block_weights
-                else:
-                    this_column_weights = this_block_weights[:, col_index_in_block]
+            block_column_index = np.arange(start_col_block, end_col_block)
+            block_position = np.arange(this_block_size)
 
-                columnIndex = col_index_in_block + start_col_block
-                this_column_weights[columnIndex] = 0.0
+            # Do not compute the similarity on the diagonal
+            this_block_weights[block_column_index, block_position] = 0.0
 
-                # Apply normalization and shrinkage, ensure denominator != 0
-                if self.normalize:
+            # Apply normalization and shrinkage, ensure denominator != 0
+            # Rows of the denominator refer to all the columns, columns to the ones in this block
+            if self.normalize:
 
-                    if self.asymmetric_cosine:
-                        denominator = sumOfSquared_to_alpha[
-                                          columnIndex] * sumOfSquared_to_1_minus_alpha + self.shrink + 1e-6
-                    else:
-                        denominator = sumOfSquared[columnIndex] * sumOfSquared + self.shrink + 1e-6
+                if self.asymmetric_cosine:
+                    denominator = np.outer(sumOfSquared_to_1_minus_alpha, sumOfSquared_to_alpha[block_column_index]) \
+                                  + self.shrink + 1e-6
+                else:
+                    denominator = np.outer(sumOfSquared, sumOfSquared[block_column_index]) + self.shrink + 1e-6
+
+                this_block_weights = np.multiply(this_block_weights, 1 / denominator)
 
-                    this_column_weights = np.multiply(this_column_weights, 1 / denominator)
 
+            # Apply the specific denominator for Tanimoto
+            elif self.tanimoto_coefficient:
+                denominator = sumOfSquared[block_column_index] + sumOfSquared.reshape((-1, 1)) - this_block_weights \
+                              + self.shrink + 1e-6
+                this_block_weights = np.multiply(this_block_weights, 1 / denominator)
 
-                # Apply the specific denominator for Tanimoto
-                elif self.tanimoto_coefficient:
-                    denominator = sumOfSquared[columnIndex] + sumOfSquared - this_column_weights + self.shrink + 1e-6
-                    this_column_weights = np.multiply(this_column_weights, 1 / denominator)
+            elif self.dice_coefficient:
+                denominator = sumOfSquared[block_column_index] + sumOfSquared.reshape((-1, 1)) + self.shrink + 1e-6
+                this_block_weights = np.multiply(this_block_weights, 1 / denominator)
 
-                elif self.dice_coefficient:
-                    denominator = sumOfSquared[columnIndex] + sumOfSquared + self.shrink + 1e-6
-                    this_column_weights = np.multiply(this_column_weights, 1 / denominator)
+            elif self.tversky_coefficient:
+                denominator = this_block_weights + \
+                              (sumOfSquared[block_column_index] - this_block_weights) * self.tversky_alpha + \
+                              (sumOfSquared.reshape((-1, 1)) - this_block_weights) * self.tversky_beta + \
+                              self.shrink + 1e-6
+                this_block_weights = np.multiply(this_block_weights, 1 / denominator)
 
-                elif self.tversky_coefficient:
-                    denominator = this_column_weights + \
-                                  (sumOfSquared[columnIndex] - this_column_weights) * self.tversky_alpha + \
-                                  (sumOfSquared - this_column_weights) * self.tversky_beta + self.shrink + 1e-6
-                    this_column_weights = np.multiply(this_column_weights, 1 / denominator)
+            # If no normalization or tanimoto is selected, apply only shrink
+            elif self.shrink != 0:
+                this_block_weights = this_block_weights / self.shrink
 
-                # If no normalization or tanimoto is selected, apply only shrink
-                elif self.shrink != 0:
-                    this_column_weights = this_column_weights / self.shrink
+            if self.TopK > 0:
 
-                # this_column_weights = this_column_weights.toarray().ravel()
+                # Select the unordered set of TopK items of every column of the block at once
+                # The ordering within the TopK is irrelevant to build the sparse matrix
+                top_k_idx = np.argpartition(-this_block_weights, self.TopK - 1, axis=0)[0:self.TopK, :]
+                top_k_values = np.take_along_axis(this_block_weights, top_k_idx, axis=0)
 
-                # Sort indices and select TopK
-                # Sorting is done in three steps. Faster then plain np.argsort for higher number of items
-                # - Partition the data to extract the set of relevant items
-                # - Sort only the relevant items
-                # - Get the original item index
-                relevant_items_partition = (-this_column_weights).argpartition(self.TopK - 1)[0:self.TopK]
-                relevant_items_partition_sorting = np.argsort(-this_column_weights[relevant_items_partition])
-                top_k_idx = relevant_items_partition[relevant_items_partition_sorting]
+                # Transpose to store the data column by column, do not add zeros
+                top_k_idx = top_k_idx.T
+                top_k_values = top_k_values.T
 
-                # Incrementally build sparse matrix, do not add zeros
-                notZerosMask = this_column_weights[top_k_idx] != 0.0
+                notZerosMask = top_k_values != 0.0
                 numNotZeros = np.sum(notZerosMask)
 
-                values.extend(this_column_weights[top_k_idx][notZerosMask])
-                rows.extend(top_k_idx[notZerosMask])
-                cols.extend(np.ones(numNotZeros) * columnIndex)
+                values[sparse_data_pointer:sparse_data_pointer + numNotZeros] = top_k_values[notZerosMask]
+                rows[sparse_data_pointer:sparse_data_pointer + numNotZeros] = top_k_idx[notZerosMask]
+                cols[sparse_data_pointer:sparse_data_pointer + numNotZeros] = np.repeat(block_column_index,
+                                                                                        notZerosMask.sum(axis=1))
+
+                sparse_data_pointer += numNotZeros
 
             # Add previous block size
             processedItems += this_block_size
@@ -336,7 +341,7 @@ class Compute_Similarity_Python:
 
         # End while on columns
 
-        W_sparse = sps.csr_matrix((values, (rows, cols)),
+        W_sparse = sps.csr_matrix((values[:sparse_data_pointer], (rows[:sparse_data_pointer], cols[:sparse_data_pointer])),
                                   shape=(self.n_columns, self.n_columns),
                                   dtype=np.float32)
 
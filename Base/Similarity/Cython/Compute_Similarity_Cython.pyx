@@ -1,9 +1,3 @@
-"""
-Created on 23/10/17
-
-@author: Maurizio Ferrari Dacrema
-"""
-
 #cython: boundscheck=False
 #cython: wraparound=True
 #cython: initializedcheck=False
@@ -12,6 +6,11 @@ Created on 23/10/17
 #cython: cdivision=True
 #cython: unpack_method_calls=True
 #cython: overflowcheck=False
+"""
+Created on 23/10/17
+
+@author: Maurizio Ferrari Dacrema
+"""
 
 """
 Determine the operative system. The interface of numpy returns a different type for argsort under windows and linux
@@ -27,14 +26,12 @@ ELSE:
 
 
 
-import time, sys
+import time, sys, multiprocessing
 
 import numpy as np
 cimport numpy as np
 
-from cpython.array cimport array, clone
-
-from libc.math cimport sqrt
+from cython.parallel import prange, threadid
 
 
 
@@ -45,12 +42,16 @@ from Base.Recommender_utils import check_matrix
 
 cdef class Compute_Similarity_Cython:
 
-    cdef int TopK
+    cdef int TopK, n_threads
     cdef long n_columns, n_rows
 
-    cdef double[:] this_item_weights
-    cdef int[:] this_item_weights_mask, this_item_weights_id
-    cdef int this_item_weights_counter
+    # Scratch buffers, one row per thread
+    cdef double[:,:] this_item_weights
+    cdef int[:,:] this_item_weights_mask, this_item_weights_id
+
+    # Top-K min-heap, one row per thread
+    cdef double[:,:] top_k_heap_values
+    cdef int[:,:] top_k_heap_id
 
     cdef int[:] user_to_item_row_ptr, user_to_item_cols
     cdef int[:] item_to_user_rows, item_to_user_col_ptr
@@ -66,7 +67,7 @@ cdef class Compute_Similarity_Cython:
 
     def __init__(self, dataMatrix, topK = 100, shrink=0, normalize = True,
                  asymmetric_alpha = 0.5, tversky_alpha = 1.0, tversky_beta = 1.0,
-                 similarity = "cosine", row_weights = None):
+                 similarity = "cosine", row_weights = None, n_threads = None):
         """
         Computes the cosine similarity on the columns of dataMatrix
         If it is computed on URM=|users|x|items|, pass the URM as is.
@@ -76,6 +77,7 @@ cdef class Compute_Similarity_Cython:
         :param shrink:
         :param normalize:           If True divide the dot product by the product of the norms
         :param row_weights:         Multiply the values in each row by a specified value. Array
+        :param n_threads:           Number of OpenMP threads used to compute the columns, if None all available cores
         :param asymmetric_alpha     Coefficient alpha for the asymmetric cosine
         :param similarity:  "cosine"        computes Cosine similarity
                             "adjusted"      computes Adjusted Cosine, removing the average of the users
@@ -138,11 +140,20 @@ cdef class Compute_Similarity_Cython:
                              " Passed value was '{}'".format(similarity))
 
 
+        if n_threads is None:
+            n_threads = multiprocessing.cpu_count()
+
+        assert n_threads >= 1, "Compute_Similarity_Cython: n_threads must be a positive integer, provided was {}".format(n_threads)
+
+        self.n_threads = n_threads
+
         self.TopK = min(topK, self.n_columns)
-        self.this_item_weights = np.zeros(self.n_columns, dtype=np.float64)
-        self.this_item_weights_id = np.zeros(self.n_columns, dtype=np.int32)
-        self.this_item_weights_mask = np.zeros(self.n_columns, dtype=np.int32)
-        self.this_item_weights_counter = 0
+        self.this_item_weights = np.zeros((self.n_threads, self.n_columns), dtype=np.float64)
+        self.this_item_weights_id = np.zeros((self.n_threads, self.n_columns), dtype=np.int32)
+        self.this_item_weights_mask = np.zeros((self.n_threads, self.n_columns), dtype=np.int32)
+
+        self.top_k_heap_values = np.zeros((self.n_threads, max(self.TopK, 1)), dtype=np.float64)
+        self.top_k_heap_id = np.zeros((self.n_threads, max(self.TopK, 1)), dtype=np.int32)
 
         # Copy data to avoid altering the original object
         dataMatrix = dataMatrix.copy()
@@ -308,16 +319,7 @@ cdef class Compute_Similarity_Cython:
 
 
 
-    cdef int[:] getUsersThatRatedItem(self, long item_id):
-        return self.item_to_user_rows[self.item_to_user_col_ptr[item_id]:self.item_to_user_col_ptr[item_id+1]]
-
-    cdef int[:] getItemsRatedByUser(self, long user_id):
-        return self.user_to_item_cols[self.user_to_item_row_ptr[user_id]:self.user_to_item_row_ptr[user_id+1]]
-
-
-
-
-    cdef computeItemSimilarities(self, long item_id_input):
+    cdef int computeItemSimilarities(self, long item_id_input, int thread_id) nogil:
         """
         For every item the cosine similarity against other items depends on whether they have users in common. The more
         common users the higher the similarity.
@@ -341,244 +343,338 @@ cdef class Compute_Similarity_Cython:
         -- Given a user, get the items he rated (second item)
         -- Update the similarity of the items he rated
         
-        
+        The similarities are written in the scratch buffers of thread_id, the function returns the number of items
+        whose similarity has been touched. Their ids are in self.this_item_weights_id[thread_id, :counter]
         """
 
-        # Create template used to initialize an array with zeros
-        # Much faster than np.zeros(self.n_columns)
-        #cdef array[double] template_zero = array('d')
-        #cdef array[double] result = clone(template_zero, self.n_columns, zero=True)
-
-
-        cdef long user_index, user_id, item_index, item_id, item_id_second
-
-        cdef int[:] users_that_rated_item = self.getUsersThatRatedItem(item_id_input)
-        cdef int[:] items_rated_by_user
+        cdef long user_index, user_id, item_index, item_id_second
+        cdef long user_start_pos, user_end_pos, item_start_pos, item_end_pos
 
         cdef double rating_item_input, rating_item_second, row_weight
 
-        # Clean previous item
-        for item_index in range(self.this_item_weights_counter):
-            item_id = self.this_item_weights_id[item_index]
-            self.this_item_weights_mask[item_id] = False
-            self.this_item_weights[item_id] = 0.0
-
-        self.this_item_weights_counter = 0
-
+        cdef int this_item_weights_counter = 0
 
+        user_start_pos = self.item_to_user_col_ptr[item_id_input]
+        user_end_pos = self.item_to_user_col_ptr[item_id_input+1]
 
         # Get users that rated the items
-        for user_index in range(len(users_that_rated_item)):
+        for user_index in range(user_start_pos, user_end_pos):
 
-            user_id = users_that_rated_item[user_index]
-            rating_item_input = self.item_to_user_data[self.item_to_user_col_ptr[item_id_input]+user_index]
+            user_id = self.item_to_user_rows[user_index]
+            rating_item_input = self.item_to_user_data[user_index]
 
             if self.use_row_weights:
                 row_weight = self.row_weights[user_id]
             else:
                 row_weight = 1.0
 
-            # Get all items rated by that user
-            items_rated_by_user = self.getItemsRatedByUser(user_id)
+            item_start_pos = self.user_to_item_row_ptr[user_id]
+            item_end_pos = self.user_to_item_row_ptr[user_id+1]
 
-            for item_index in range(len(items_rated_by_user)):
+            # Get all items rated by that user
+            for item_index in range(item_start_pos, item_end_pos):
 
-                item_id_second = items_rated_by_user[item_index]
+                item_id_second = self.user_to_item_cols[item_index]
 
                 # Do not compute the similarity on the diagonal
                 if item_id_second != item_id_input:
                     # Increment similairty
-                    rating_item_second = self.user_to_item_data[self.user_to_item_row_ptr[user_id]+item_index]
+                    rating_item_second = self.user_to_item_data[item_index]
 
-                    self.this_item_weights[item_id_second] += rating_item_input*rating_item_second*row_weight
+                    self.this_item_weights[thread_id, item_id_second] += rating_item_input*rating_item_second*row_weight
 
 
-                    # Update global data structure
-                    if not self.this_item_weights_mask[item_id_second]:
+                    # Update thread data structure
+                    if not self.this_item_weights_mask[thread_id, item_id_second]:
 
-                        self.this_item_weights_mask[item_id_second] = True
-                        self.this_item_weights_id[self.this_item_weights_counter] = item_id_second
-                        self.this_item_weights_counter += 1
+                        self.this_item_weights_mask[thread_id, item_id_second] = True
+                        self.this_item_weights_id[thread_id, this_item_weights_counter] = item_id_second
+                        this_item_weights_counter += 1
 
 
+        return this_item_weights_counter
 
 
-    def compute_similarity(self, start_col=None, end_col=None):
+
+
+    cdef void applyNormalization(self, long itemIndex, int thread_id, int this_item_weights_counter) nogil:
         """
-        Compute the similarity for the given dataset
-        :param self:
-        :param start_col: column to begin with
-        :param end_col: column to stop before, end_col is excluded
-        :return:
+        Apply normalization and shrinkage to the similarities computed for itemIndex, ensure denominator != 0
+        Only the items touched by computeItemSimilarities are considered, all the others are zero
         """
 
-        cdef int print_block_size = 500
+        cdef int innerIndex
+        cdef long innerItemIndex
+        cdef double weight
 
-        cdef int itemIndex, innerItemIndex, item_id, local_topK
-        cdef long long topKItemIndex
+        for innerIndex in range(this_item_weights_counter):
 
-        cdef long long[:] top_k_idx
+            innerItemIndex = self.this_item_weights_id[thread_id, innerIndex]
+            weight = self.this_item_weights[thread_id, innerItemIndex]
 
-        # Declare numpy data type to use vetor indexing and simplify the topK selection code
-        cdef np.ndarray[LONG_t, ndim=1] top_k_partition, top_k_partition_sorting
-        cdef np.ndarray[np.float64_t, ndim=1] this_item_weights_np
-        #cdef double[:] this_item_weights
+            if self.normalize:
 
-        cdef long processedItems = 0
+                if self.asymmetric_cosine:
+                    weight /= self.sumOfSquared_to_alpha[itemIndex] * self.sumOfSquared_to_1_minus_alpha[innerItemIndex]\
+                              + self.shrink + 1e-6
 
-        # Data structure to incrementally build sparse matrix
-        # Preinitialize max possible length
-        cdef double[:] values = np.zeros((self.n_columns*self.TopK))
-        cdef int[:] rows = np.zeros((self.n_columns*self.TopK,), dtype=np.int32)
-        cdef int[:] cols = np.zeros((self.n_columns*self.TopK,), dtype=np.int32)
-        cdef long sparse_data_pointer = 0
+                else:
+                    weight /= self.sumOfSquared[itemIndex] * self.sumOfSquared[innerItemIndex]\
+                              + self.shrink + 1e-6
 
-        cdef int start_col_local = 0, end_col_local = self.n_columns
+            # Apply the specific denominator for Tanimoto
+            elif self.tanimoto_coefficient:
+                weight /= self.sumOfSquared[itemIndex] + self.sumOfSquared[innerItemIndex] -\
+                          weight + self.shrink + 1e-6
 
-        cdef array[double] template_zero = array('d')
+            elif self.dice_coefficient:
+                weight /= self.sumOfSquared[itemIndex] + self.sumOfSquared[innerItemIndex] +\
+                          self.shrink + 1e-6
 
+            elif self.tversky_coefficient:
+                weight /= weight + \
+                          (self.sumOfSquared[itemIndex]-weight)*self.tversky_alpha + \
+                          (self.sumOfSquared[innerItemIndex]-weight)*self.tversky_beta +\
+                          self.shrink + 1e-6
 
+            elif self.shrink != 0:
+                weight /= self.shrink
 
-        if start_col is not None and start_col>0 and start_col<self.n_columns:
-            start_col_local = start_col
+            self.this_item_weights[thread_id, innerItemIndex] = weight
 
-        if end_col is not None and end_col>start_col_local and end_col<self.n_columns:
-            end_col_local = end_col
 
 
 
+    cdef void heapSiftDown(self, int thread_id, int heap_position, int heap_size) nogil:
+        """
+        Restore the min-heap property of the thread top-K heap starting from heap_position
+        """
 
+        cdef int child_position
+        cdef double value = self.top_k_heap_values[thread_id, heap_position]
+        cdef int item_id = self.top_k_heap_id[thread_id, heap_position]
 
+        while True:
 
-        start_time = time.time()
-        last_print_time = start_time
+            child_position = 2*heap_position + 1
 
-        itemIndex = start_col_local
+            if child_position >= heap_size:
+                break
 
-        # Compute all similarities for each item
-        while itemIndex < end_col_local:
+            if child_position + 1 < heap_size and \
+                    self.top_k_heap_values[thread_id, child_position + 1] < self.top_k_heap_values[thread_id, child_position]:
+                child_position += 1
 
-            processedItems += 1
+            if self.top_k_heap_values[thread_id, child_position] >= value:
+                break
 
-            # Computed similarities go in self.this_item_weights
-            self.computeItemSimilarities(itemIndex)
+            self.top_k_heap_values[thread_id, heap_position] = self.top_k_heap_values[thread_id, child_position]
+            self.top_k_heap_id[thread_id, heap_position] = self.top_k_heap_id[thread_id, child_position]
+            heap_position = child_position
 
+        self.top_k_heap_values[thread_id, heap_position] = value
+        self.top_k_heap_id[thread_id, heap_position] = item_id
 
-            # Apply normalization and shrinkage, ensure denominator != 0
-            if self.normalize:
-                for innerItemIndex in range(self.n_columns):
 
-                    if self.asymmetric_cosine:
-                        self.this_item_weights[innerItemIndex] /= self.sumOfSquared_to_alpha[itemIndex] * self.sumOfSquared_to_1_minus_alpha[innerItemIndex]\
-                                                             + self.shrink + 1e-6
 
-                    else:
-                        self.this_item_weights[innerItemIndex] /= self.sumOfSquared[itemIndex] * self.sumOfSquared[innerItemIndex]\
-                                                             + self.shrink + 1e-6
 
-            # Apply the specific denominator for Tanimoto
-            elif self.tanimoto_coefficient:
-                for innerItemIndex in range(self.n_columns):
-                    self.this_item_weights[innerItemIndex] /= self.sumOfSquared[itemIndex] + self.sumOfSquared[innerItemIndex] -\
-                                                         self.this_item_weights[innerItemIndex] + self.shrink + 1e-6
+    cdef int selectTopK(self, int thread_id, int this_item_weights_counter) nogil:
+        """
+        Select the TopK non-zero similarities among the touched items using a min-heap of size TopK.
+        The heap is then sorted in place, the result is in self.top_k_heap_values[thread_id, :heap_size]
+        and self.top_k_heap_id[thread_id, :heap_size] in decreasing order of similarity
+        As in the python implementation the TopK is selected among all items, the untouched ones have similarity zero,
+        therefore negative similarities are kept only if there are less than TopK positive and zero ones
+        :return: heap_size
+        """
 
-            elif self.dice_coefficient:
-                for innerItemIndex in range(self.n_columns):
-                    self.this_item_weights[innerItemIndex] /= self.sumOfSquared[itemIndex] + self.sumOfSquared[innerItemIndex] +\
-                                                         self.shrink + 1e-6
+        cdef int innerIndex, item_id, heap_size = 0, heap_position, last_position
+        cdef int n_positive = 0, n_nonzero = 0
+        cdef long n_negative_to_keep
+        cdef double weight, tmp_value
+        cdef int tmp_id
 
-            elif self.tversky_coefficient:
-                for innerItemIndex in range(self.n_columns):
-                    self.this_item_weights[innerItemIndex] /= self.this_item_weights[innerItemIndex] + \
-                                                              (self.sumOfSquared[itemIndex]-self.this_item_weights[innerItemIndex])*self.tversky_alpha + \
-                                                              (self.sumOfSquared[innerItemIndex]-self.this_item_weights[innerItemIndex])*self.tversky_beta +\
-                                                              self.shrink + 1e-6
+        for innerIndex in range(this_item_weights_counter):
 
-            elif self.shrink != 0:
-                for innerItemIndex in range(self.n_columns):
-                    self.this_item_weights[innerItemIndex] /= self.shrink
+            item_id = self.this_item_weights_id[thread_id, innerIndex]
+            weight = self.this_item_weights[thread_id, item_id]
 
+            # Do not add zeros
+            if weight == 0.0:
+                continue
 
-            if self.TopK == 0:
+            n_nonzero += 1
 
-                for innerItemIndex in range(self.n_columns):
-                    self.W_dense[innerItemIndex,itemIndex] = self.this_item_weights[innerItemIndex]
+            if weight > 0.0:
+                n_positive += 1
 
-            else:
+            if heap_size < self.TopK:
 
-                # Sort indices and select TopK
-                # Using numpy implies some overhead, unfortunately the plain C qsort function is even slower
-                #top_k_idx = np.argsort(this_item_weights) [-self.TopK:]
+                # Append and sift up
+                heap_position = heap_size
+                heap_size += 1
 
-                # Sorting is done in three steps. Faster then plain np.argsort for higher number of items
-                # because we avoid sorting elements we already know we don't care about
-                # - Partition the data to extract the set of TopK items, this set is unsorted
-                # - Sort only the TopK items, discarding the rest
-                # - Get the original item index
-                #
+                while heap_position > 0 and self.top_k_heap_values[thread_id, (heap_position-1)//2] > weight:
+                    self.top_k_heap_values[thread_id, heap_position] = self.top_k_heap_values[thread_id, (heap_position-1)//2]
+                    self.top_k_heap_id[thread_id, heap_position] = self.top_k_heap_id[thread_id, (heap_position-1)//2]
+                    heap_position = (heap_position-1)//2
 
+                self.top_k_heap_values[thread_id, heap_position] = weight
+                self.top_k_heap_id[thread_id, heap_position] = item_id
 
+            elif weight > self.top_k_heap_values[thread_id, 0]:
 
-                #this_item_weights_np = clone(template_zero, self.this_item_weights_counter, zero=False)
-                this_item_weights_np = np.zeros(self.n_columns, dtype=np.float64)
+                # Replace the smallest of the TopK
+                self.top_k_heap_values[thread_id, 0] = weight
+                self.top_k_heap_id[thread_id, 0] = item_id
+                self.heapSiftDown(thread_id, 0, heap_size)
 
-                # Add weights in the same ordering as the self.this_item_weights_id data structure
-                for innerItemIndex in range(self.this_item_weights_counter):
-                    item_id = self.this_item_weights_id[innerItemIndex]
-                    this_item_weights_np[innerItemIndex] = - self.this_item_weights[item_id]
 
+        # Heap sort, moving the smallest element at the end leaves the array in decreasing order
+        last_position = heap_size - 1
 
-                local_topK = min([self.TopK, self.this_item_weights_counter])
+        while last_position > 0:
 
-                # Get the unordered set of topK items
-                top_k_partition = np.argpartition(this_item_weights_np, local_topK-1)[0:local_topK]
-                # Sort only the elements in the partition
-                top_k_partition_sorting = np.argsort(this_item_weights_np[top_k_partition])
-                # Get original index
-                top_k_idx = top_k_partition[top_k_partition_sorting]
+            tmp_value = self.top_k_heap_values[thread_id, 0]
+            tmp_id = self.top_k_heap_id[thread_id, 0]
 
+            self.top_k_heap_values[thread_id, 0] = self.top_k_heap_values[thread_id, last_position]
+            self.top_k_heap_id[thread_id, 0] = self.top_k_heap_id[thread_id, last_position]
 
+            self.top_k_heap_values[thread_id, last_position] = tmp_value
+            self.top_k_heap_id[thread_id, last_position] = tmp_id
 
-                # Incrementally build sparse matrix, do not add zeros
-                for innerItemIndex in range(len(top_k_idx)):
+            self.heapSiftDown(thread_id, 0, last_position)
+            last_position -= 1
 
-                    topKItemIndex = top_k_idx[innerItemIndex]
+        # The heap is sorted, the negative similarities are at the end
+        if heap_size > n_positive:
+            n_negative_to_keep = self.TopK - n_positive - (self.n_columns - n_nonzero)
 
-                    item_id = self.this_item_weights_id[topKItemIndex]
+            if n_negative_to_keep < 0:
+                n_negative_to_keep = 0
 
-                    if self.this_item_weights[item_id] != 0.0:
+            if heap_size > n_positive + n_negative_to_keep:
+                heap_size = n_positive + n_negative_to_keep
 
-                        values[sparse_data_pointer] = self.this_item_weights[item_id]
-                        rows[sparse_data_pointer] = item_id
-                        cols[sparse_data_pointer] = itemIndex
+        return heap_size
 
-                        sparse_data_pointer += 1
 
 
-            itemIndex += 1
 
+    cdef void computeColumn(self, long itemIndex, int thread_id, long sparse_data_offset,
+                            double[:] values, int[:] rows, int[:] column_nnz, long column_position) nogil:
+        """
+        Compute the similarity column of itemIndex with the scratch buffers of thread_id.
+        The TopK values are written in values[sparse_data_offset:sparse_data_offset+TopK], which is a slot owned
+        only by this column, hence no synchronization between threads is required
+        """
 
-            if processedItems % print_block_size==0 or processedItems==end_col_local:
+        cdef int innerIndex, item_id, this_item_weights_counter, heap_size
 
-                current_time = time.time()
+        # Computed similarities go in self.this_item_weights[thread_id]
+        this_item_weights_counter = self.computeItemSimilarities(itemIndex, thread_id)
 
-                # Set block size to the number of items necessary in order to print every 30 seconds
-                if current_time - start_time != 0:
-                    itemPerSec = processedItems/(current_time - start_time)
-                else:
-                    itemPerSec = 1
+        self.applyNormalization(itemIndex, thread_id, this_item_weights_counter)
+
+        if self.TopK == 0:
+
+            for innerIndex in range(this_item_weights_counter):
+                item_id = self.this_item_weights_id[thread_id, innerIndex]
+                self.W_dense[item_id, itemIndex] = self.this_item_weights[thread_id, item_id]
+
+        else:
+
+            heap_size = self.selectTopK(thread_id, this_item_weights_counter)
+
+            for innerIndex in range(heap_size):
+                values[sparse_data_offset + innerIndex] = self.top_k_heap_values[thread_id, innerIndex]
+                rows[sparse_data_offset + innerIndex] = self.top_k_heap_id[thread_id, innerIndex]
+
+            column_nnz[column_position] = heap_size
+
+
+        # Clean the scratch buffers for the next item
+        for innerIndex in range(this_item_weights_counter):
+            item_id = self.this_item_weights_id[thread_id, innerIndex]
+            self.this_item_weights_mask[thread_id, item_id] = False
+            self.this_item_weights[thread_id, item_id] = 0.0
+
+
+
+
+    def compute_similarity(self, start_col=None, end_col=None):
+        """
+        Compute the similarity for the given dataset
+        The columns are processed in parallel by self.n_threads OpenMP threads, each with its own scratch buffers
+        :param self:
+        :param start_col: column to begin with
+        :param end_col: column to stop before, end_col is excluded
+        :return:
+        """
+
+        cdef long print_block_size = 500
 
-                print_block_size = int(itemPerSec*30)
+        cdef long itemIndex, blockItemIndex, block_end_col
+        cdef int thread_id
+
+        cdef long processedItems = 0
+
+        cdef int start_col_local = 0, end_col_local = self.n_columns
+
+        if start_col is not None and start_col>0 and start_col<self.n_columns:
+            start_col_local = start_col
+
+        if end_col is not None and end_col>start_col_local and end_col<self.n_columns:
+            end_col_local = end_col
+
+        # Each column owns a slot of TopK cells in the data structure, no thread writes in the slot of another
+        # Preinitialize max possible length
+        cdef long TopK_slot = self.TopK
+        cdef double[:] values = np.zeros(((end_col_local-start_col_local)*TopK_slot), dtype=np.float64)
+        cdef int[:] rows = np.zeros(((end_col_local-start_col_local)*TopK_slot,), dtype=np.int32)
+        cdef int[:] column_nnz = np.zeros((end_col_local-start_col_local,), dtype=np.int32)
 
-                if current_time - last_print_time > 30  or processedItems==end_col_local:
 
-                    print("Similarity column {} ( {:2.0f} % ), {:.2f} column/sec, elapsed time {:.2f} min".format(
-                        processedItems, processedItems*1.0/(end_col_local-start_col_local)*100, itemPerSec, (time.time()-start_time) / 60))
+        start_time = time.time()
+        last_print_time = start_time
 
-                    last_print_time = current_time
+        itemIndex = start_col_local
 
-                    sys.stdout.flush()
-                    sys.stderr.flush()
+        # Compute all similarities in blocks of columns, progress is printed between blocks
+        while itemIndex < end_col_local:
+
+            block_end_col = min(itemIndex + print_block_size, end_col_local)
+
+            for blockItemIndex in prange(itemIndex, block_end_col, nogil=True, schedule='dynamic', num_threads=self.n_threads):
+
+                thread_id = threadid()
+
+                self.computeColumn(blockItemIndex, thread_id, (blockItemIndex - start_col_local)*TopK_slot,
+                                   values, rows, column_nnz, blockItemIndex - start_col_local)
+
+            itemIndex = block_end_col
+            processedItems = itemIndex - start_col_local
+
+            current_time = time.time()
+
+            # Set block size to the number of items necessary in order to print every 30 seconds
+            if current_time - start_time != 0:
+                itemPerSec = processedItems/(current_time - start_time)
+            else:
+                itemPerSec = 1
+
+            print_block_size = max(int(itemPerSec*30), 1)
+
+            if current_time - last_print_time > 30  or itemIndex==end_col_local:
+
+                print("Similarity column {} ( {:2.0f} % ), {:.2f} column/sec, elapsed time {:.2f} min".format(
+                    processedItems, processedItems*1.0/(end_col_local-start_col_local)*100, itemPerSec, (time.time()-start_time) / 60))
+
+                last_print_time = current_time
+
+                sys.stdout.flush()
+                sys.stderr.flush()
 
         # End while on columns
 
@@ -589,12 +685,18 @@ cdef class Compute_Similarity_Cython:
 
         else:
 
-            values = np.array(values[0:sparse_data_pointer])
-            rows = np.array(rows[0:sparse_data_pointer])
-            cols = np.array(cols[0:sparse_data_pointer])
+            # Remove the unused cells of each column slot, the result is already in CSC format
+            column_nnz_np = np.array(column_nnz)
+
+            used_cells_mask = np.arange(self.TopK) < column_nnz_np.reshape((-1, 1))
+            used_cells_mask = used_cells_mask.ravel()
+
+            indptr = np.zeros(self.n_columns + 1, dtype=np.int64)
+            indptr[start_col_local+1:end_col_local+1] = np.cumsum(column_nnz_np)
+            indptr[end_col_local+1:] = indptr[end_col_local]
 
-            W_sparse = sps.csr_matrix((values, (rows, cols)),
-                                    shape=(self.n_columns, self.n_columns),
-                                    dtype=np.float32)
+            W_sparse = sps.csc_matrix((np.array(values)[used_cells_mask], np.array(rows)[used_cells_mask], indptr),
+                                      shape=(self.n_columns, self.n_columns),
+                                      dtype=np.float32)
 
-            return W_sparse
+            return W_sparse.tocsr()
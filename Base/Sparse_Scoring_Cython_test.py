@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+from KNN.ItemKNNCustomSimilarityRecommender import ItemKNNCustomSimilarityRecommender
+
+try:
+    from Base.Cython.Sparse_Scoring_Cython import compute_sparse_dot_sparse_scores, to_scoring_kernel_format, \
+        fits_scoring_kernel_format
+    cython_compiled = True
+except ImportError:
+    cython_compiled = False
+
+
+def get_reference_scores(A, B, row_id_array, seen=None, items_to_compute=None):
+
+    scores = A[row_id_array].dot(B).toarray()
+
+    if items_to_compute is not None:
+        item_mask = np.zeros(B.shape[1], dtype=bool)
+        item_mask[items_to_compute] = True
+        scores[:, np.logical_not(item_mask)] = -np.inf
+
+    if seen is not None:
+        scores[seen[row_id_array].toarray() != 0] = -np.inf
+
+    return scores
+
+
+@unittest.skipUnless(cython_compiled, "Sparse_Scoring_Cython is not compiled")
+class MyTestCase(unittest.TestCase):
+
+    n_users, n_items = 80, 50
+
+    def setUp(self):
+
+        self.URM_train = sps.random(self.n_users, self.n_items, density=0.1, format="csr")
+        self.W_sparse = sps.random(self.n_items, self.n_items, density=0.2, format="csr", dtype=np.float32)
+
+        self.row_id_array = np.random.permutation(self.n_users)[:30]
+
+    def test_scores(self):
+
+        for dtype in [np.float32, np.float64]:
+
+            A = to_scoring_kernel_format(self.URM_train, dtype)
+            B = to_scoring_kernel_format(self.W_sparse, dtype)
+
+            scores = np.empty((len(self.row_id_array), self.n_items), dtype=dtype)
+            compute_sparse_dot_sparse_scores(self.row_id_array, A, B, scores)
+
+            scores_reference = get_reference_scores(A, B, self.row_id_array)
+
+            # Same accumulation order as scipy
+            self.assertTrue(np.array_equal(scores, scores_reference))
+
+    def test_scores_remove_seen_items_to_compute(self):
+
+        items_to_compute = np.random.permutation(self.n_items)[:20]
+        item_mask = np.zeros(self.n_items, dtype=bool)
+        item_mask[items_to_compute] = True
+
+        scores = np.empty((len(self.row_id_array), self.n_items), dtype=np.float64)
+        compute_sparse_dot_sparse_scores(self.row_id_array, self.URM_train, self.W_sparse, scores,
+                                         seen=self.URM_train, item_mask=item_mask, n_threads=2)
+
+        scores_reference = get_reference_scores(self.URM_train, self.W_sparse.astype(np.float64), self.row_id_array,
+                                                seen=self.URM_train, items_to_compute=items_to_compute)
+
+        self.assertTrue(np.array_equal(scores, scores_reference))
+
+    def test_recommender_scores(self):
+
+        recommender = ItemKNNCustomSimilarityRecommender(self.URM_train)
+        recommender.fit(self.W_sparse)
+
+        # URM_train is float32, the scores are float64 if W_sparse is float64, as with scipy
+        for dtype in [np.float32, np.float64]:
+
+            recommender.W_sparse = recommender.W_sparse.astype(dtype)
+
+            scores_reference = get_reference_scores(recommender.URM_train, recommender.W_sparse, self.row_id_array)
+            scores = recommender._compute_item_score(self.row_id_array)
+
+            self.assertEqual(scores.dtype, dtype)
+            self.assertTrue(np.array_equal(scores, scores_reference))
+
+            # Rankings computed block-wise in the reused buffer, with the seen items removed
+            ranking = recommender.recommend(self.row_id_array, cutoff=10, block_size=7)
+
+            for user_index, user_id in enumerate(self.row_id_array):
+                user_scores = scores_reference[user_index].copy()
+                user_scores[self.URM_train[user_id].indices] = -np.inf
+
+                self.assertTrue(np.array_equal(user_scores[ranking[user_index]], np.sort(user_scores)[::-1][:10]))
+
+    def test_int32_overflow(self):
+
+        # More columns than int32 indices allow, without allocating them
+        X = sps.csr_matrix(([1.0], ([0], [2 ** 31 + 5])), shape=(1, 2 ** 31 + 10))
+
+        self.assertFalse(fits_scoring_kernel_format(X))
+        self.assertTrue(fits_scoring_kernel_format(self.URM_train))
+
+        with self.assertRaises(ValueError):
+            to_scoring_kernel_format(X, np.float32)
+
+        with self.assertRaises(ValueError):
+            compute_sparse_dot_sparse_scores(np.array([0]), self.URM_train[:1, :1], X, np.empty((1, 1)))
+
+        # Matrices which do not fit are scored with scipy
+        recommender = ItemKNNCustomSimilarityRecommender(self.URM_train)
+        recommender.fit(self.W_sparse)
+        recommender._get_scoring_kernel()
+        recommender._fits_scoring_kernel_format = lambda X: False
+
+        scores = recommender._compute_item_score(self.row_id_array)
+
+        self.assertTrue(np.allclose(scores, get_reference_scores(recommender.URM_train, recommender.W_sparse,
+                                                                 self.row_id_array)))
+
+        ranking = recommender.recommend(self.row_id_array, cutoff=10)
+        self.assertEqual(len(ranking), len(self.row_id_array))
+
+
+if __name__ == '__main__':
+    unittest.main()
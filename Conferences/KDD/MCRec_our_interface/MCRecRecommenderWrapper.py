@@ -25,11 +25,13 @@ from keras.layers import Embedding, Input, Dense, merge, Reshape, Flatten, conca
 from keras.optimizers import Adagrad, Adam, SGD, RMSprop, Nadam
 from keras.regularizers import l2
 from Conferences.KDD.MCRec_github.code.Dataset import Dataset
+from Conferences.KDD.MCRec_our_interface.MetapathFeatureStore import MetapathFeatureStore, build_node_feature_table
 
 from time import time
 
 from Base.BaseRecommender import BaseRecommender
 from Base.Incremental_Training_Early_Stopping import Incremental_Training_Early_Stopping
+from Base.Recommender_utils import is_in_sorted_keys
 
 
 def slice(x, index):
@@ -328,141 +330,64 @@ def get_model(usize, isize, path_nums, timestamps, length, layers=[20, 10], reg_
     return model
 
 
-def get_train_instances(user_feature, item_feature, type_feature, path_umtm, path_umum, path_umtmum, path_uuum,
-                        path_nums, timestamps, train_list,
-                        num_negatives, batch_size, num_items, user_item_map, shuffle=True):
+def get_train_instances(path_store_list, feature_table, type_offset, train_list,
+                        num_negatives, batch_size, num_items, shuffle=True):
+    """
+    :param path_store_list:     MetapathFeatureStore of umtm, umum, umtmum, uuum
+    :param feature_table:       node features as built by build_node_feature_table
+    :param type_offset:
+    :param train_list:          list of the train [u, i] pairs
+    :return: num_batches_per_epoch, generator of the batches. Each positive is followed by its negatives
+    """
+
     num_batches_per_epoch = int((len(train_list) - 1) / batch_size) + 1
 
+    train_array = np.array(train_list, dtype=np.int64).reshape((-1, 2))
+
+    # Sorted keys user*num_items + item of the train pairs, to check whether a sampled item is a positive
+    train_keys = np.unique(train_array[:, 0] * num_items + train_array[:, 1])
+
+    def sample_negative_items(user_array):
+
+        neg_item_array = np.zeros(len(user_array), dtype=np.int64)
+        to_sample = np.arange(len(user_array))
+
+        while len(to_sample) > 0:
+            neg_item_array[to_sample] = np.random.randint(1, num_items - 1, size=len(to_sample))
+
+            sampled_keys = user_array[to_sample] * num_items + neg_item_array[to_sample]
+
+            to_sample = to_sample[is_in_sorted_keys(train_keys, sampled_keys)]
+
+        return neg_item_array
+
     def data_generator():
-        data_size = len(train_list)
+        data_size = len(train_array)
         while True:
             if shuffle == True:
-                np.random.shuffle(train_list)
+                np.random.shuffle(train_array)
 
             for batch_num in range(num_batches_per_epoch):
                 start_index = batch_num * batch_size
                 end_index = min((batch_num + 1) * batch_size, data_size)
-                k = 0
-                _user_input = np.zeros((batch_size * (num_negatives + 1),))
-                _item_input = np.zeros((batch_size * (num_negatives + 1),))
-                _umtm_input = np.zeros((batch_size * (num_negatives + 1), path_nums[0], timestamps[0], 64))
-                _umum_input = np.zeros((batch_size * (num_negatives + 1), path_nums[1], timestamps[1], 64))
-                _umtmum_input = np.zeros((batch_size * (num_negatives + 1), path_nums[2], timestamps[2], 64))
-                _uuum_input = np.zeros((batch_size * (num_negatives + 1), path_nums[3], timestamps[3], 64))
-                _labels = np.zeros(batch_size * (num_negatives + 1))
-
-                for u, i in train_list[start_index: end_index]:
-
-                    _user_input[k] = u
-                    _item_input[k] = i
-
-                    if (u, i) in path_umtm:
-                        for p_i in range(len(path_umtm[(u, i)])):
-                            for p_j in range(len(path_umtm[(u, i)][p_i])):
-                                type_id = path_umtm[(u, i)][p_i][p_j][0]
-                                index = path_umtm[(u, i)][p_i][p_j][1]
-                                if type_id == 1:
-                                    _umtm_input[k][p_i][p_j] = user_feature[index]
-                                elif type_id == 2:
-                                    _umtm_input[k][p_i][p_j] = item_feature[index]
-                                elif type_id == 3:
-                                    _umtm_input[k][p_i][p_j] = type_feature[index]
-
-                    if (u, i) in path_umum:
-                        for p_i in range(len(path_umum[(u, i)])):
-                            for p_j in range(len(path_umum[(u, i)][p_i])):
-                                type_id = path_umum[(u, i)][p_i][p_j][0]
-                                index = path_umum[(u, i)][p_i][p_j][1]
-                                if type_id == 1:
-                                    _umum_input[k][p_i][p_j] = user_feature[index]
-                                elif type_id == 2:
-                                    _umum_input[k][p_i][p_j] = item_feature[index]
-                                elif type_id == 3:
-                                    _umum_input[k][p_i][p_j] = type_feature[index]
-
-                    if (u, i) in path_umtmum:
-                        for p_i in range(len(path_umtmum[(u, i)])):
-                            for p_j in range(len(path_umtmum[(u, i)][p_i])):
-                                type_id = path_umtmum[(u, i)][p_i][p_j][0]
-                                index = path_umtmum[(u, i)][p_i][p_j][1]
-                                if type_id == 1:
-                                    _umtmum_input[k][p_i][p_j] = user_feature[index]
-                                elif type_id == 2:
-                                    _umtmum_input[k][p_i][p_j] = item_feature[index]
-                                elif type_id == 3:
-                                    _umtmum_input[k][p_i][p_j] = type_feature[index]
-
-                    if (u, i) in path_uuum:
-                        for p_i in range(len(path_uuum[(u, i)])):
-                            for p_j in range(len(path_uuum[(u, i)][p_i])):
-                                type_id = path_uuum[(u, i)][p_i][p_j][0]
-                                index = path_uuum[(u, i)][p_i][p_j][1]
-                                if type_id == 1:
-                                    _uuum_input[k][p_i][p_j] = user_feature[index]
-                                elif type_id == 2:
-                                    _uuum_input[k][p_i][p_j] = item_feature[index]
-                                elif type_id == 3:
-                                    _uuum_input[k][p_i][p_j] = type_feature[index]
-                    _labels[k] = 1.0
-                    k += 1
-                    # negative instances
-                    for t in range(num_negatives):
-                        j = np.random.randint(1, num_items - 1)
-                        while j in user_item_map[u]:
-                            j = np.random.randint(1, num_items - 1)
-
-                        _user_input[k] = u
-                        _item_input[k] = j
-
-                        if (u, j) in path_umtm:
-                            for p_i in range(len(path_umtm[(u, j)])):
-                                for p_j in range(len(path_umtm[(u, j)][p_i])):
-                                    type_id = path_umtm[(u, j)][p_i][p_j][0]
-                                    index = path_umtm[(u, j)][p_i][p_j][1]
-                                    if type_id == 1:
-                                        _umtm_input[k][p_i][p_j] = user_feature[index]
-                                    elif type_id == 2:
-                                        _umtm_input[k][p_i][p_j] = item_feature[index]
-                                    elif type_id == 3:
-                                        _umtm_input[k][p_i][p_j] = type_feature[index]
-
-                        if (u, j) in path_umum:
-                            for p_i in range(len(path_umum[(u, j)])):
-                                for p_j in range(len(path_umum[(u, j)][p_i])):
-                                    type_id = path_umum[(u, j)][p_i][p_j][0]
-                                    index = path_umum[(u, j)][p_i][p_j][1]
-                                    if type_id == 1:
-                                        _umum_input[k][p_i][p_j] = user_feature[index]
-                                    elif type_id == 2:
-                                        _umum_input[k][p_i][p_j] = item_feature[index]
-                                    elif type_id == 3:
-                                        _umum_input[k][p_i][p_j] = type_feature[index]
-                        if (u, j) in path_umtmum:
-                            for p_i in range(len(path_umtmum[(u, j)])):
-                                for p_j in range(len(path_umtmum[(u, j)][p_i])):
-                                    type_id = path_umtmum[(u, j)][p_i][p_j][0]
-                                    index = path_umtmum[(u, j)][p_i][p_j][1]
-                                    if type_id == 1:
-                                        _umtmum_input[k][p_i][p_j] = user_feature[index]
-                                    elif type_id == 2:
-                                        _umtmum_input[k][p_i][p_j] = item_feature[index]
-                                    elif type_id == 3:
-                                        _umtmum_input[k][p_i][p_j] = type_feature[index]
-
-                        if (u, j) in path_uuum:
-                            for p_i in range(len(path_uuum[(u, j)])):
-                                for p_j in range(len(path_uuum[(u, j)][p_i])):
-                                    type_id = path_uuum[(u, j)][p_i][p_j][0]
-                                    index = path_uuum[(u, j)][p_i][p_j][1]
-                                    if type_id == 1:
-                                        _uuum_input[k][p_i][p_j] = user_feature[index]
-                                    elif type_id == 2:
-                                        _uuum_input[k][p_i][p_j] = item_feature[index]
-                                    elif type_id == 3:
-                                        _uuum_input[k][p_i][p_j] = type_feature[index]
-                        _labels[k] = 0.0
-                        k += 1
-                yield ([_user_input, _item_input, _umtm_input, _umum_input, _umtmum_input, _uuum_input], _labels)
+
+                batch_pairs = train_array[start_index:end_index]
+
+                # Each row contains the positive item followed by the negative ones
+                _user_input = np.repeat(batch_pairs[:, 0], num_negatives + 1)
+                _item_input = np.repeat(batch_pairs[:, 1:2], num_negatives + 1, axis=1)
+                _item_input[:, 1:] = sample_negative_items(np.repeat(batch_pairs[:, 0], num_negatives)).reshape(
+                    (-1, num_negatives))
+                _item_input = _item_input.ravel()
+
+                _labels = np.zeros((len(batch_pairs), num_negatives + 1))
+                _labels[:, 0] = 1.0
+                _labels = _labels.ravel()
+
+                _path_inputs = [path_store.get_path_features(_user_input, _item_input, feature_table, type_offset)
+                                for path_store in path_store_list]
+
+                yield ([_user_input, _item_input] + _path_inputs, _labels)
 
     return num_batches_per_epoch, data_generator()
 
@@ -544,78 +469,70 @@ class MCRecML100k_RecommenderWrapper(BaseRecommender, Incremental_Training_Early
 
         return item_scores
 
+    def _compute_item_score_on_user_items(self, user_id_array, user_items_to_compute):
+
+        item_scores = - np.ones((len(user_id_array), self.n_items - 1)) * np.inf
+
+        # Only the requested user-item pairs are scored, e.g., the negative items sampled for each user,
+        # all users in the block at once. Dataset adds 1 to user and item id
+        user_index = np.repeat(np.arange(len(user_id_array)), np.ediff1d(user_items_to_compute.indptr))
+
+        user_input = np.asarray(user_id_array)[user_index] + 1
+        item_input = user_items_to_compute.indices + 1
+
+        path_inputs = [path_store.get_path_features(user_input, item_input, self._feature_table, self._type_offset)
+                       for path_store in self._path_store_list]
+
+        predictions = self.model.predict([user_input, item_input] + path_inputs, batch_size=256, verbose=0)
+
+        item_scores[user_index, user_items_to_compute.indices] = predictions.ravel()
+
+        return item_scores
+
     def __compute_score_MCRec_single_user(self, user_id):
         # Works for a single user at a time
 
-        user_input = []
-        item_input = []
-        umtm_input = np.zeros((self.n_items, self._path_nums[0], self._timestamps[0], self._length))
-        umum_input = np.zeros((self.n_items, self._path_nums[1], self._timestamps[1], self._length))
-        umtmum_input = np.zeros((self.n_items, self._path_nums[2], self._timestamps[2], self._length))
-        uuum_input = np.zeros((self.n_items, self._path_nums[3], self._timestamps[3], self._length))
-
-        u = user_id
-
-        k = 0
-        for i in range(1, self.n_items):
-
-            user_input.append(u)
-            item_input.append(i)
-
-            if (u, i) in self._path_umtm:
-                for p_i in range(len(self._path_umtm[(u, i)])):
-                    for p_j in range(len(self._path_umtm[(u, i)][p_i])):
-                        type_id = self._path_umtm[(u, i)][p_i][p_j][0]
-                        index = self._path_umtm[(u, i)][p_i][p_j][1]
-                        if type_id == 1:
-                            umtm_input[k][p_i][p_j] = self._user_feature[index]
-                        elif type_id == 2:
-                            umtm_input[k][p_i][p_j] = self._item_feature[index]
-                        elif type_id == 3:
-                            umtm_input[k][p_i][p_j] = self._type_feature[index]
-
-            if (u, i) in self._path_umum:
-                for p_i in range(len(self._path_umum[(u, i)])):
-                    for p_j in range(len(self._path_umum[(u, i)][p_i])):
-                        type_id = self._path_umum[(u, i)][p_i][p_j][0]
-                        index = self._path_umum[(u, i)][p_i][p_j][1]
-                        if type_id == 1:
-                            umum_input[k][p_i][p_j] = self._user_feature[index]
-                        elif type_id == 2:
-                            umum_input[k][p_i][p_j] = self._item_feature[index]
-                        elif type_id == 3:
-                            umum_input[k][p_i][p_j] = self._type_feature[index]
-
-            if (u, i) in self._path_umtmum:
-                for p_i in range(len(self._path_umtmum[(u, i)])):
-                    for p_j in range(len(self._path_umtmum[(u, i)][p_i])):
-                        type_id = self._path_umtmum[(u, i)][p_i][p_j][0]
-                        index = self._path_umtmum[(u, i)][p_i][p_j][1]
-                        if type_id == 1:
-                            umtmum_input[k][p_i][p_j] = self._user_feature[index]
-                        elif type_id == 2:
-                            umtmum_input[k][p_i][p_j] = self._item_feature[index]
-                        elif type_id == 3:
-                            umtmum_input[k][p_i][p_j] = self._type_feature[index]
-            if (u, i) in self._path_uuum:
-                for p_i in range(len(self._path_uuum[(u, i)])):
-                    for p_j in range(len(self._path_uuum[(u, i)][p_i])):
-                        type_id = self._path_uuum[(u, i)][p_i][p_j][0]
-                        index = self._path_uuum[(u, i)][p_i][p_j][1]
-                        if type_id == 1:
-                            uuum_input[k][p_i][p_j] = self._user_feature[index]
-                        elif type_id == 2:
-                            uuum_input[k][p_i][p_j] = self._item_feature[index]
-                        elif type_id == 3:
-                            uuum_input[k][p_i][p_j] = self._type_feature[index]
-            k += 1
-
-        predictions = self.model.predict(
-            [np.array(user_input), np.array(item_input), umtm_input, umum_input, umtmum_input, uuum_input],
-            batch_size=256, verbose=0)
+        item_input = np.arange(1, self.n_items)
+        user_input = np.ones_like(item_input) * user_id
+
+        path_inputs = [path_store.get_path_features(user_input, item_input, self._feature_table, self._type_offset)
+                       for path_store in self._path_store_list]
+
+        predictions = self.model.predict([user_input, item_input] + path_inputs, batch_size=256, verbose=0)
 
         return predictions
 
+    def _build_path_stores(self, dataset, dataset_path, cache_folder):
+        """
+        Builds the indexed path feature stores, memory-mapped in cache_folder if provided, otherwise kept in memory
+        """
+
+        # Path files as loaded by Dataset
+        path_file_suffix_list = [".umtm_5_1", ".umum_5_1", ".uuum_5_1", ".ummm_5_1"]
+        path_dict_list = [dataset.path_umtm, dataset.path_umum, dataset.path_umtmum, dataset.path_uuum]
+
+        self._path_store_list = []
+
+        for path_index in range(len(path_dict_list)):
+
+            if cache_folder is not None:
+                cache_file_path = cache_folder + os.path.basename(dataset_path) + path_file_suffix_list[path_index]
+            else:
+                cache_file_path = None
+
+            path_store = MetapathFeatureStore(path_dict_list[path_index],
+                                              self.path_nums[path_index],
+                                              self.timestamps[path_index],
+                                              self.n_items,
+                                              cache_file_path=cache_file_path,
+                                              source_file_path=dataset_path + path_file_suffix_list[path_index])
+
+            self._path_store_list.append(path_store)
+
+        self._feature_table, self._type_offset = build_node_feature_table(dataset.user_feature,
+                                                                          dataset.item_feature,
+                                                                          dataset.type_feature)
+
     def fit(self,
             latent_dim=128,
             reg_latent=0,
@@ -625,6 +542,7 @@ class MCRecML100k_RecommenderWrapper(BaseRecommender, Incremental_Training_Early
             epochs=30,
             batch_size=256,
             num_negatives=4,
+            path_store_folder=None,
             **earlystopping_kwargs):
 
         self.latent_dim = latent_dim
@@ -637,9 +555,10 @@ class MCRecML100k_RecommenderWrapper(BaseRecommender, Incremental_Training_Early
         self.num_negatives = num_negatives
 
         dataset = 'ml-100k'
+        dataset_path = 'Conferences/KDD/MCRec_github/data/' + dataset
 
         t1 = time()
-        dataset = Dataset('Conferences/KDD/MCRec_github/data/' + dataset)
+        dataset = Dataset(dataset_path)
         trainMatrix, testRatings, testNegatives = dataset.trainMatrix, dataset.testRatings, dataset.testNegatives
 
         # # Replace train data with the train split passed as parameter
@@ -648,10 +567,6 @@ class MCRecML100k_RecommenderWrapper(BaseRecommender, Incremental_Training_Early
         self._train = dataset.train
         self._user_item_map = dataset.user_item_map
         item_user_map = dataset.item_user_map
-        path_umtm = dataset.path_umtm
-        path_umum = dataset.path_umum
-        path_umtmum = dataset.path_umtmum
-        path_uuum = dataset.path_uuum
 
         user_feature, item_feature, type_feature = dataset.user_feature, dataset.item_feature, dataset.type_feature
 
@@ -668,6 +583,11 @@ class MCRecML100k_RecommenderWrapper(BaseRecommender, Incremental_Training_Early
         print('path nums = ', self.path_nums)
         print('timestamps = ', self.timestamps)
 
+        if path_store_folder is None:
+            print("{}: No path store folder provided, the path stores are kept in memory".format(self.RECOMMENDER_NAME))
+
+        self._build_path_stores(dataset, dataset_path, path_store_folder)
+
         print("MCRec_RecommenderWrapper: building model")
         self.model = get_model(self.n_users, self.n_items, self.path_nums, self.timestamps, self.length, self.layers,
                                self.reg_layes, self.latent_dim, self.reg_latent)
@@ -691,10 +611,6 @@ class MCRecML100k_RecommenderWrapper(BaseRecommender, Incremental_Training_Early
         # Originally these were global variables
         self._testRatings = testRatings
         self._testNegatives = testNegatives
-        self._path_umtm = path_umtm
-        self._path_umum = path_umum
-        self._path_umtmum = path_umtmum
-        self._path_uuum = path_uuum
         self._path_nums = self.path_nums
         self._timestamps = self.timestamps
         self._length = self.length
@@ -728,20 +644,13 @@ class MCRecML100k_RecommenderWrapper(BaseRecommender, Incremental_Training_Early
         t1 = time()
 
         # Generate training instance
-        train_steps, train_batches = get_train_instances(self._user_feature,
-                                                         self._item_feature,
-                                                         self._type_feature,
-                                                         self._path_umtm,
-                                                         self._path_umum,
-                                                         self._path_umtmum,
-                                                         self._path_uuum,
-                                                         self._path_nums,
-                                                         self._timestamps,
+        train_steps, train_batches = get_train_instances(self._path_store_list,
+                                                         self._feature_table,
+                                                         self._type_offset,
                                                          self._train,
                                                          self.num_negatives,
                                                          self.batch_size,
                                                          self.n_items,
-                                                         self._user_item_map,
                                                          True)
         t = time()
         # print('[%.1f s] epoch %d train_steps %d' % (t - t1, currentEpoch, train_steps))
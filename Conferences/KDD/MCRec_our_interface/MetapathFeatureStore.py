@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+
+Indexed store of the metapath instances of MCRec.
+The paths of each (user, item) pair are stored once as a dense tensor of node references
+(pair, path_num, timestamps) and the rows are found via a sorted index of the pairs, so that the
+input tensors of a whole batch are built with a gather on the node feature table.
+
+"""
+
+import numpy as np
+import os
+
+from Base.Recommender_utils import get_sorted_keys_position
+
+
+class MetapathFeatureStore(object):
+    """
+    The node of each path step is stored as its type (as in Dataset.types, 0 means no node) and its index.
+    Row 0 contains no node and is used for the pairs without paths.
+    If a cache_file_path is provided the arrays are saved on disk and loaded memory-mapped, the cache is rebuilt
+    if older than source_file_path or if it was built with different n_items, path_num or timestamps.
+    """
+
+    # Node types having a feature, as in Dataset.types
+    FEATURE_TYPES = [1, 2, 3]
+
+    def __init__(self, path_dict, path_num, timestamps, n_items, cache_file_path=None, source_file_path=None,
+                 path_arrays=None):
+        """
+        :param path_dict:           dictionary (u, i) -> list of paths, each is a list of [type_id, index], as
+                                    loaded by Dataset.load_path_as_map
+        :param path_num:
+        :param timestamps:
+        :param n_items:             used to build the pair keys user*n_items + item
+        :param cache_file_path:
+        :param source_file_path:
+        :param path_arrays:         paths sampled by MetapathSampler, as loaded by load_sampled_paths,
+                                    used instead of path_dict
+        """
+
+        super(MetapathFeatureStore, self).__init__()
+
+        self.path_num = path_num
+        self.timestamps = timestamps
+        self.n_items = n_items
+
+        array_names = ["pair_keys", "node_type", "node_index"]
+
+        if cache_file_path is not None and self._is_cache_valid(cache_file_path, array_names, source_file_path):
+
+            print("MetapathFeatureStore: Loading cache '{}'".format(cache_file_path))
+
+            array_dict = {array_name: np.load(cache_file_path + "_" + array_name + ".npy", mmap_mode="r")
+                          for array_name in array_names}
+
+        else:
+
+            if path_arrays is None:
+                path_arrays = self._path_dict_to_arrays(path_dict)
+
+            array_dict = self._build_arrays(path_arrays)
+
+            if cache_file_path is not None:
+
+                print("MetapathFeatureStore: Saving cache '{}'".format(cache_file_path))
+
+                cache_folder = os.path.dirname(cache_file_path)
+
+                if cache_folder != "" and not os.path.isdir(cache_folder):
+                    os.makedirs(cache_folder)
+
+                for array_name in array_names:
+                    np.save(cache_file_path + "_" + array_name + ".npy", array_dict[array_name])
+
+                # Saved last, a cache without it is incomplete
+                np.save(cache_file_path + "_parameters.npy", self._get_cache_parameters())
+
+                array_dict = {array_name: np.load(cache_file_path + "_" + array_name + ".npy", mmap_mode="r")
+                              for array_name in array_names}
+
+        self._pair_keys = array_dict["pair_keys"]
+        self._node_type = array_dict["node_type"]
+        self._node_index = array_dict["node_index"]
+
+    def _get_cache_parameters(self):
+        return np.array([self.n_items, self.path_num, self.timestamps], dtype=np.int64)
+
+    def _is_cache_valid(self, cache_file_path, array_names, source_file_path):
+
+        parameters_file_path = cache_file_path + "_parameters.npy"
+
+        if not os.path.isfile(parameters_file_path):
+            return False
+
+        # The pair keys depend on n_items, the arrays on path_num and timestamps
+        if not np.array_equal(np.load(parameters_file_path), self._get_cache_parameters()):
+            print("MetapathFeatureStore: Cache '{}' was built with different parameters, rebuilding it".format(cache_file_path))
+            return False
+
+        for array_name in array_names:
+            array_file_path = cache_file_path + "_" + array_name + ".npy"
+
+            if not os.path.isfile(array_file_path):
+                return False
+
+            if source_file_path is not None and os.path.getmtime(array_file_path) < os.path.getmtime(source_file_path):
+                return False
+
+        return True
+
+    def _path_dict_to_arrays(self, path_dict):
+
+        pair_list = list(path_dict.keys())
+        n_pairs = len(pair_list)
+
+        user_array = np.array([u for u, i in pair_list], dtype=np.int64)
+        item_array = np.array([i for u, i in pair_list], dtype=np.int64)
+
+        node_type = np.zeros((n_pairs, self.path_num, self.timestamps), dtype=np.int8)
+        node_index = np.zeros((n_pairs, self.path_num, self.timestamps), dtype=np.int32)
+
+        for pair_index, pair in enumerate(pair_list):
+            for p_i, path in enumerate(path_dict[pair][:self.path_num]):
+                for p_j, (type_id, index) in enumerate(path[:self.timestamps]):
+                    if type_id in self.FEATURE_TYPES:
+                        node_type[pair_index, p_i, p_j] = type_id
+                        node_index[pair_index, p_i, p_j] = index
+
+        return {"user": user_array, "item": item_array, "node_type": node_type, "node_index": node_index}
+
+    def _build_arrays(self, path_arrays):
+
+        n_pairs = len(path_arrays["user"])
+
+        pair_keys = path_arrays["user"].astype(np.int64) * self.n_items + path_arrays["item"]
+
+        assert path_arrays["node_type"].shape[1:] == (self.path_num, self.timestamps), \
+            "MetapathFeatureStore: paths have shape {}, expected was {}".format(path_arrays["node_type"].shape[1:],
+                                                                              (self.path_num, self.timestamps))
+
+        # Sort the pairs so that the rows can be found with a binary search, row 0 is left empty
+        sort_index = np.argsort(pair_keys, kind="stable")
+
+        node_type = np.zeros((n_pairs + 1, self.path_num, self.timestamps), dtype=np.int8)
+        node_index = np.zeros((n_pairs + 1, self.path_num, self.timestamps), dtype=np.int32)
+
+        node_type[1:] = path_arrays["node_type"][sort_index]
+        node_index[1:] = path_arrays["node_index"][sort_index]
+
+        # Node types without a feature are treated as missing nodes
+        missing_node = np.logical_not(np.isin(node_type, self.FEATURE_TYPES))
+        node_type[missing_node] = 0
+        node_index[missing_node] = 0
+
+        return {"pair_keys": pair_keys[sort_index], "node_type": node_type, "node_index": node_index}
+
+    def get_rows(self, user_array, item_array):
+        """
+        :return: the row of each (user, item) pair, 0 if the pair has no paths
+        """
+
+        pair_keys = np.asarray(user_array, dtype=np.int64) * self.n_items + np.asarray(item_array, dtype=np.int64)
+
+        is_present, key_position = get_sorted_keys_position(self._pair_keys, pair_keys)
+
+        return np.where(is_present, key_position + 1, 0)
+
+    def get_path_features(self, user_array, item_array, feature_table, type_offset):
+        """
+        Builds the input tensor of the paths of each (user, item) pair
+        :param feature_table:   array (n_nodes, fea_size) whose first row is zero, see build_node_feature_table
+        :param type_offset:     array with the first row in feature_table of each node type
+        :return: array (len(user_array), path_num, timestamps, fea_size)
+        """
+
+        rows = self.get_rows(user_array, item_array)
+
+        node_type = self._node_type[rows]
+        node_id = type_offset[node_type] + self._node_index[rows]
+
+        # Steps without a node point to the zero row
+        node_id[node_type == 0] = 0
+
+        return feature_table[node_id]
+
+
+def build_node_feature_table(user_feature, item_feature, type_feature):
+    """
+    Concatenates the node features in a single table, preceded by a zero row used for the missing nodes
+    :return: feature_table, type_offset. The feature of the node with type t and index i is in row type_offset[t] + i
+    """
+
+    fea_size = user_feature.shape[1]
+
+    feature_table = np.concatenate([np.zeros((1, fea_size)), user_feature, item_feature, type_feature]).astype(np.float32)
+
+    type_offset = np.zeros(max(MetapathFeatureStore.FEATURE_TYPES) + 1, dtype=np.int64)
+    type_offset[1] = 1
+    type_offset[2] = type_offset[1] + len(user_feature)
+    type_offset[3] = type_offset[2] + len(item_feature)
+
+    return feature_table, type_offset
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest, tempfile, shutil
+
+import numpy as np
+
+from Conferences.KDD.MCRec_our_interface.MetapathFeatureStore import MetapathFeatureStore, build_node_feature_table
+
+
+def get_random_path_dict(n_users, n_items, n_types, path_num, timestamps):
+
+    path_dict = {}
+
+    for user in range(n_users):
+        for item in np.random.choice(n_items, 5, replace=False):
+
+            n_paths = np.random.randint(1, path_num + 2)
+
+            # Node types 1 user, 2 item, 3 type as in Dataset.types, index 0 is a valid node of each type
+            path_dict[(user, int(item))] = [[[type_id, np.random.randint(0, [n_users, n_items, n_types][type_id - 1])]
+                                             for type_id in np.random.randint(1, 4, timestamps)]
+                                            for _ in range(n_paths)]
+
+    return path_dict
+
+
+def get_path_features_reference(path_dict, user, item, user_feature, item_feature, type_feature, path_num, timestamps):
+
+    fea_size = user_feature.shape[1]
+    path_features = np.zeros((path_num, timestamps, fea_size), dtype=np.float32)
+
+    for p_i, path in enumerate(path_dict.get((user, item), [])[:path_num]):
+        for p_j, (type_id, index) in enumerate(path[:timestamps]):
+            path_features[p_i, p_j] = [user_feature, item_feature, type_feature][type_id - 1][index]
+
+    return path_features
+
+
+class MyTestCase(unittest.TestCase):
+
+    n_users, n_items, n_types = 20, 30, 4
+    path_num, timestamps, fea_size = 3, 4, 6
+
+    def setUp(self):
+
+        self.path_dict = get_random_path_dict(self.n_users, self.n_items, self.n_types, self.path_num, self.timestamps)
+
+        self.user_feature = np.random.rand(self.n_users, self.fea_size)
+        self.item_feature = np.random.rand(self.n_items, self.fea_size)
+        self.type_feature = np.random.rand(self.n_types, self.fea_size)
+
+        self.feature_table, self.type_offset = build_node_feature_table(self.user_feature, self.item_feature, self.type_feature)
+
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_folder, ignore_errors=True)
+
+    def _assert_path_features(self, path_store):
+
+        user_array = np.repeat(np.arange(self.n_users), self.n_items)
+        item_array = np.tile(np.arange(self.n_items), self.n_users)
+
+        path_features = path_store.get_path_features(user_array, item_array, self.feature_table, self.type_offset)
+
+        for index in range(len(user_array)):
+            path_features_reference = get_path_features_reference(self.path_dict, user_array[index], item_array[index],
+                                                                  self.user_feature, self.item_feature, self.type_feature,
+                                                                  self.path_num, self.timestamps)
+
+            self.assertTrue(np.allclose(path_features[index], path_features_reference))
+
+    def test_get_path_features(self):
+
+        path_store = MetapathFeatureStore(self.path_dict, self.path_num, self.timestamps, self.n_items)
+
+        self._assert_path_features(path_store)
+
+        rows = path_store.get_rows(np.array([0, self.n_users + 1]), np.array([self.n_items - 1, 0]))
+        self.assertEqual(rows[1], 0)
+
+    def test_cache(self):
+
+        cache_file_path = self.temp_folder + "/paths"
+
+        MetapathFeatureStore(self.path_dict, self.path_num, self.timestamps, self.n_items, cache_file_path=cache_file_path)
+
+        # Loaded from the cache, path_dict is not used
+        path_store = MetapathFeatureStore({}, self.path_num, self.timestamps, self.n_items, cache_file_path=cache_file_path)
+
+        self.assertTrue(isinstance(path_store._node_type, np.memmap))
+        self._assert_path_features(path_store)
+
+        # A cache built with different parameters is rebuilt
+        path_store = MetapathFeatureStore(self.path_dict, self.path_num, self.timestamps, self.n_items + 10,
+                                          cache_file_path=cache_file_path)
+
+        self.assertEqual(path_store.n_items, self.n_items + 10)
+        self._assert_path_features(path_store)
+
+        path_store = MetapathFeatureStore({}, self.path_num - 1, self.timestamps, self.n_items + 10,
+                                          cache_file_path=cache_file_path)
+
+        self.assertEqual(len(path_store._pair_keys), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
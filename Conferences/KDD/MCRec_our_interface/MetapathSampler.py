@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+
+Vectorized and multi-process version of the metapath instance sampler of MCRec
+(MCRec_github/code/metapathbasedPathSampleForMovielens.py).
+
+All paths have the form start_user - first_node - second_node - end_item.
+For a given start user the candidate first nodes are fixed, while the candidate second nodes depend only
+on the end item, hence all the end items of a user are processed at once on a grid
+(n_items, n_first_nodes, n_second_nodes). The graph is stored as CSR adjacency matrices and the
+similarities are computed as products of the normalized embeddings.
+
+The sampled paths are saved in a binary .npz file with the same layout used by MetapathFeatureStore.
+
+"""
+
+import numpy as np
+import scipy.sparse as sps
+import pandas as pd
+import time, sys, multiprocessing
+
+from Base.Recommender_utils import is_in_sorted_keys
+from Utils.pool_worker_state import init_worker_state, get_worker_state
+
+
+# Node types as in Dataset.types
+USER_TYPE = 1
+ITEM_TYPE = 2
+GENRE_TYPE = 3
+
+
+def load_adjacency_file(file_path, shape=None, symmetric=False):
+    """
+    Loads the first two tab separated columns of file_path as a binary CSR adjacency matrix
+    :param file_path:
+    :param shape:
+    :param symmetric:   if True also the reverse edges are added, as for the user-user and item-item files
+    :return:
+    """
+
+    edges = pd.read_csv(file_path, sep="\t", header=None, usecols=[0, 1], dtype=np.int64).values
+
+    row = edges[:, 0]
+    col = edges[:, 1]
+
+    if symmetric:
+        row, col = np.concatenate([row, col]), np.concatenate([col, row])
+
+    if shape is None:
+        shape = (row.max() + 1, col.max() + 1)
+
+    adjacency = sps.csr_matrix((np.ones(len(row), dtype=np.float32), (row, col)), shape=shape)
+
+    # Repeated edges are merged
+    adjacency.data[:] = 1.0
+    adjacency.sort_indices()
+
+    return adjacency
+
+
+def load_embedding_file(file_path, n_rows):
+    """
+    Loads a file whose lines are "id value_1 value_2 ..." in a dense array, rows not in the file are zero
+    """
+
+    data = pd.read_csv(file_path, sep=" ", header=None, dtype=np.float64).values
+
+    embedding = np.zeros((n_rows, data.shape[1] - 1))
+    embedding[data[:, 0].astype(np.int64)] = data[:, 1:]
+
+    return embedding
+
+
+def save_sampled_paths(file_path, path_arrays):
+    """
+    Saves the sampled paths in a binary file
+    :param file_path:
+    :param path_arrays:     as returned by MetapathSampler.sample
+    :return:
+    """
+
+    np.savez(file_path, **path_arrays)
+
+
+def load_sampled_paths(file_path):
+    """
+    :param file_path:
+    :return: dictionary with the arrays of the sampled paths
+    """
+
+    with np.load(file_path) as data:
+        return {array_name: data[array_name] for array_name in data.files}
+
+
+def _top_k_per_row(X, k):
+    """
+    Selects for each row of the CSR matrix X the k columns with highest value, ties are resolved by column index
+    :return: column array (n_rows, k) padded with -1 and corresponding value array
+    """
+
+    row_index = np.repeat(np.arange(X.shape[0]), np.ediff1d(X.indptr))
+
+    # Sort by row, descending value and column
+    sort_index = np.lexsort((X.indices, -X.data, row_index))
+
+    rank = np.arange(X.nnz) - np.repeat(X.indptr[:-1], np.ediff1d(X.indptr))
+    rank = rank[np.argsort(sort_index, kind="stable")]
+
+    selected = rank < k
+
+    top_k_cols = - np.ones((X.shape[0], k), dtype=np.int64)
+    top_k_values = np.zeros((X.shape[0], k))
+
+    top_k_cols[row_index[selected], rank[selected]] = X.indices[selected]
+    top_k_values[row_index[selected], rank[selected]] = X.data[selected]
+
+    return top_k_cols, top_k_values
+
+
+def _padded_neighbors(adjacency):
+    """
+    :return: the neighbors of each row of the CSR adjacency as an array (n_rows, max_degree) padded with -1
+    """
+
+    degree = np.ediff1d(adjacency.indptr)
+
+    neighbors = - np.ones((adjacency.shape[0], max(degree.max(initial=0), 1)), dtype=np.int64)
+
+    row_index = np.repeat(np.arange(adjacency.shape[0]), degree)
+    col_index = np.arange(adjacency.nnz) - np.repeat(adjacency.indptr[:-1], degree)
+
+    neighbors[row_index, col_index] = adjacency.indices
+
+    return neighbors
+
+
+def _adjacency_keys(adjacency):
+    """
+    :return: sorted keys row*n_cols + col of the non-zero cells of the CSR adjacency
+    """
+
+    row_index = np.repeat(np.arange(adjacency.shape[0], dtype=np.int64), np.ediff1d(adjacency.indptr))
+
+    return np.unique(row_index * adjacency.shape[1] + adjacency.indices)
+
+
+def _is_edge(adjacency_keys, n_cols, row, col):
+    """
+    :return: boolean array, True if (row, col) is an edge. Negative row or col are never edges
+    """
+
+    keys = row.astype(np.int64) * n_cols + col
+
+    return np.logical_and(is_in_sorted_keys(adjacency_keys, keys), np.logical_and(row >= 0, col >= 0))
+
+
+class MetapathSampler(object):
+    """
+    Samples for each (user, item) pair the max_paths instances of a metapath with highest similarity.
+    The candidate neighbors are selected as in the original implementation:
+        umum: the limit items of the user and the limit users of the item with highest similarity
+        umtm: the limit items of the user with highest similarity and all genres of the item
+        uuum: all user neighbors of the user and the limit users of the item with highest similarity
+        ummm: the limit items of the user with highest similarity and all item neighbors of the item
+    Only paths with similarity greater than min_similarity are kept. Ties are resolved by the order of the
+    candidates, sorted by similarity and then by id. Repeated edges are merged.
+    """
+
+    METAPATH_LIST = ["umum", "umtm", "uuum", "ummm"]
+
+    def __init__(self, URM, ICM_genre, UCM_neighbors, ICM_neighbors, user_embedding, item_embedding,
+                 limit=10, max_paths=5, min_similarity=0.7):
+        """
+        :param URM:             csr matrix |users|x|items| of the interactions
+        :param ICM_genre:       csr matrix |items|x|genres|
+        :param UCM_neighbors:   csr matrix |users|x|users| symmetric
+        :param ICM_neighbors:   csr matrix |items|x|items| symmetric
+        :param user_embedding:  array |users|x|features|
+        :param item_embedding:  array |items|x|features|
+        :param limit:
+        :param max_paths:
+        :param min_similarity:
+        """
+
+        super(MetapathSampler, self).__init__()
+
+        self.n_users, self.n_items = URM.shape
+        self.limit = limit
+        self.max_paths = max_paths
+        self.min_similarity = min_similarity
+
+        URM = self._to_binary_csr(URM)
+        ICM_genre = self._to_binary_csr(ICM_genre)
+        UCM_neighbors = self._to_binary_csr(UCM_neighbors)
+        ICM_neighbors = self._to_binary_csr(ICM_neighbors)
+
+        self.n_genres = ICM_genre.shape[1]
+
+        # Cosine similarity as dot product of the normalized embeddings
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._user_embedding = user_embedding / np.linalg.norm(user_embedding, axis=1, keepdims=True)
+            self._item_embedding = item_embedding / np.linalg.norm(item_embedding, axis=1, keepdims=True)
+
+        # Similarity of each interaction, then the limit items of each user and users of each item
+        URM_similarity = URM.copy()
+        URM_similarity.data = self._user_item_similarity(*self._csr_row_col(URM))
+
+        self._user_top_items, self._user_top_items_similarity = _top_k_per_row(URM_similarity, self.limit)
+
+        URM_similarity_T = sps.csr_matrix(URM_similarity.T)
+        URM_similarity_T.sort_indices()
+
+        self._item_top_users, self._item_top_users_similarity = _top_k_per_row(URM_similarity_T, self.limit)
+
+        self._item_genres = _padded_neighbors(ICM_genre)
+        self._user_neighbors = _padded_neighbors(UCM_neighbors)
+        self._item_neighbors = _padded_neighbors(ICM_neighbors)
+
+        self._URM_keys = _adjacency_keys(URM)
+        self._ICM_genre_keys = _adjacency_keys(ICM_genre)
+        self._UCM_neighbors_keys = _adjacency_keys(UCM_neighbors)
+        self._ICM_neighbors_keys = _adjacency_keys(ICM_neighbors)
+
+    def _to_binary_csr(self, X):
+
+        X = sps.csr_matrix(X, dtype=np.float64, copy=True)
+        X.eliminate_zeros()
+        X.data[:] = 1.0
+        X.sort_indices()
+
+        return X
+
+    def _csr_row_col(self, X):
+        return np.repeat(np.arange(X.shape[0]), np.ediff1d(X.indptr)), X.indices
+
+    def _user_item_similarity(self, user_array, item_array):
+
+        similarity = np.zeros(len(user_array))
+
+        # Computed in blocks to limit the memory of the gathered embeddings
+        block_size = 1000000
+
+        for start_index in range(0, len(user_array), block_size):
+            end_index = min(start_index + block_size, len(user_array))
+
+            similarity[start_index:end_index] = np.sum(self._user_embedding[user_array[start_index:end_index]] *
+                                                       self._item_embedding[item_array[start_index:end_index]], axis=1)
+
+        return similarity
+
+    def _get_candidate_grid(self, metapath, user_id, item_array):
+        """
+        Builds the grid of candidate paths user_id - first_node - second_node - item for all items in item_array
+        :return: first_node (1, n_first, 1), second_node (n_items, 1, n_second), path similarity and valid mask
+                 (n_items, n_first, n_second), node types
+        """
+
+        item_column = item_array[:, None, None]
+
+        if metapath == "uuum":
+            first_node = self._user_neighbors[user_id][None, :, None]
+            first_similarity = np.ones(first_node.shape)
+        else:
+            first_node = self._user_top_items[user_id][None, :, None]
+            first_similarity = self._user_top_items_similarity[user_id][None, :, None]
+
+        if metapath == "umum":
+
+            second_node = self._item_top_users[item_array][:, None, :]
+            second_similarity = self._item_top_users_similarity[item_array][:, None, :]
+
+            valid = _is_edge(self._URM_keys, self.n_items, second_node, first_node)
+            valid = np.logical_and(valid, second_node != user_id)
+            valid = np.logical_and(valid, first_node != item_column)
+
+            path_similarity = np.zeros(valid.shape)
+            path_similarity[valid] = (self._user_item_similarity(np.broadcast_to(second_node, valid.shape)[valid],
+                                                                 np.broadcast_to(first_node, valid.shape)[valid]) +
+                                      np.broadcast_to(second_similarity, valid.shape)[valid] +
+                                      np.broadcast_to(first_similarity, valid.shape)[valid]) / 3.0
+
+            node_types = [USER_TYPE, ITEM_TYPE, USER_TYPE, ITEM_TYPE]
+
+        elif metapath == "umtm":
+
+            second_node = self._item_genres[item_array][:, None, :]
+
+            valid = _is_edge(self._ICM_genre_keys, self.n_genres, first_node, second_node)
+            valid = np.logical_and(valid, first_node != item_column)
+
+            path_similarity = np.broadcast_to(first_similarity, valid.shape)
+
+            node_types = [USER_TYPE, ITEM_TYPE, GENRE_TYPE, ITEM_TYPE]
+
+        elif metapath == "uuum":
+
+            second_node = self._item_top_users[item_array][:, None, :]
+            second_similarity = self._item_top_users_similarity[item_array][:, None, :]
+
+            valid = _is_edge(self._UCM_neighbors_keys, self.n_users, first_node, second_node)
+            valid = np.logical_and(valid, second_node != user_id)
+
+            path_similarity = np.broadcast_to(second_similarity, valid.shape)
+
+            node_types = [USER_TYPE, USER_TYPE, USER_TYPE, ITEM_TYPE]
+
+        elif metapath == "ummm":
+
+            second_node = self._item_neighbors[item_array][:, None, :]
+
+            valid = _is_edge(self._ICM_neighbors_keys, self.n_items, first_node, second_node)
+            valid = np.logical_and(valid, first_node != item_column)
+
+            path_similarity = np.broadcast_to(first_similarity, valid.shape)
+
+            node_types = [USER_TYPE, ITEM_TYPE, ITEM_TYPE, ITEM_TYPE]
+
+        else:
+            raise ValueError("MetapathSampler: metapath not recognized, allowed values are {}, provided was '{}'".format(
+                self.METAPATH_LIST, metapath))
+
+        valid = np.logical_and(valid, path_similarity > self.min_similarity)
+
+        return first_node, second_node, path_similarity, valid, node_types
+
+    def sample_user(self, metapath, user_id, item_array=None):
+        """
+        Samples the paths between user_id and all the items in item_array
+        :return: dictionary with item (n_pairs), node_type and node_index (n_pairs, max_paths, 4) and
+                 similarity (n_pairs, max_paths), only for the items having at least one path
+        """
+
+        if item_array is None:
+            item_array = np.arange(1, self.n_items)
+
+        item_array = np.asarray(item_array, dtype=np.int64)
+
+        first_node, second_node, path_similarity, valid, node_types = self._get_candidate_grid(metapath, user_id,
+                                                                                              item_array)
+
+        has_path = valid.any(axis=(1, 2))
+
+        item_array = item_array[has_path]
+        n_pairs = len(item_array)
+
+        if n_pairs == 0:
+            return {"item": item_array,
+                    "node_type": np.zeros((0, self.max_paths, 4), dtype=np.int8),
+                    "node_index": np.zeros((0, self.max_paths, 4), dtype=np.int32),
+                    "similarity": np.zeros((0, self.max_paths), dtype=np.float32)}
+
+        first_node = np.broadcast_to(first_node, valid.shape)[has_path].reshape((n_pairs, -1))
+        second_node = np.broadcast_to(second_node, valid.shape)[has_path].reshape((n_pairs, -1))
+        path_similarity = np.where(valid, path_similarity, -np.inf)[has_path].reshape((n_pairs, -1))
+
+        # Candidates ordered by the first node and then by the second, as in the nested loops
+        top_paths = np.argsort(-path_similarity, axis=1, kind="stable")[:, :self.max_paths]
+
+        top_first_node = np.take_along_axis(first_node, top_paths, axis=1)
+        top_second_node = np.take_along_axis(second_node, top_paths, axis=1)
+        top_similarity = np.take_along_axis(path_similarity, top_paths, axis=1)
+
+        top_valid = top_similarity > -np.inf
+
+        node_index = np.zeros((n_pairs, self.max_paths, 4), dtype=np.int32)
+        node_index[:, :top_paths.shape[1], 0] = user_id
+        node_index[:, :top_paths.shape[1], 1] = top_first_node
+        node_index[:, :top_paths.shape[1], 2] = top_second_node
+        node_index[:, :top_paths.shape[1], 3] = item_array[:, None]
+
+        node_type = np.zeros((n_pairs, self.max_paths, 4), dtype=np.int8)
+        node_type[:, :top_paths.shape[1], :] = node_types
+
+        similarity = np.zeros((n_pairs, self.max_paths), dtype=np.float32)
+        similarity[:, :top_paths.shape[1]] = np.where(top_valid, top_similarity, 0.0)
+
+        # Remove the paths beyond those found
+        missing_path = np.ones((n_pairs, self.max_paths), dtype=bool)
+        missing_path[:, :top_paths.shape[1]] = np.logical_not(top_valid)
+
+        node_index[missing_path] = 0
+        node_type[missing_path] = 0
+
+        return {"item": item_array,
+                "node_type": node_type,
+                "node_index": node_index,
+                "similarity": similarity}
+
+    def sample_users_block(self, metapath, user_array):
+        """
+        Samples the paths of all the users in user_array
+        :return: dictionary with user, item, node_type, node_index, similarity
+        """
+
+        user_list = []
+        result_list = []
+
+        for user_id in user_array:
+            result = self.sample_user(metapath, user_id)
+
+            user_list.append(np.full(len(result["item"]), user_id, dtype=np.int64))
+            result_list.append(result)
+
+        path_arrays = {"user": np.concatenate(user_list)}
+
+        for array_name in ["item", "node_type", "node_index", "similarity"]:
+            path_arrays[array_name] = np.concatenate([result[array_name] for result in result_list])
+
+        return path_arrays
+
+    def sample(self, metapath, user_array=None, n_jobs=1, users_per_block=50, verbose=True):
+        """
+        Samples the paths of all (user, item) pairs for the given metapath
+        :param metapath:        one of METAPATH_LIST
+        :param user_array:      users to sample, default all except user 0 which is not used by the dataset
+        :param n_jobs:          if > 1 the blocks of users are processed by a pool of processes
+        :param users_per_block:
+        :param verbose:
+        :return: dictionary with user, item, node_type, node_index, similarity
+        """
+
+        assert metapath in self.METAPATH_LIST, "MetapathSampler: metapath not recognized, allowed values are {}, provided was '{}'".format(
+            self.METAPATH_LIST, metapath)
+
+        if user_array is None:
+            user_array = np.arange(1, self.n_users)
+
+        block_list = [user_array[start_index:start_index + users_per_block]
+                      for start_index in range(0, len(user_array), users_per_block)]
+
+        result_list = []
+
+        processed_users = 0
+        start_time = time.time()
+        start_time_printBatch = start_time
+
+        if n_jobs is None or n_jobs <= 1 or len(block_list) == 1:
+            result_iterator = (self.sample_users_block(metapath, user_block) for user_block in block_list)
+            pool = None
+
+        else:
+            pool = multiprocessing.Pool(processes=n_jobs,
+                                        initializer=init_worker_state,
+                                        initargs=({}, {"sampler": self, "metapath": metapath}))
+
+            result_iterator = pool.imap(_sample_users_block_worker, block_list)
+
+        for user_block, result in zip(block_list, result_iterator):
+
+            result_list.append(result)
+            processed_users += len(user_block)
+
+            if verbose and (time.time() - start_time_printBatch > 30 or processed_users == len(user_array)):
+                print("MetapathSampler: {} processed {} ( {:.2f}% ) users in {:.2f} minutes. Users per second: {:.0f}".format(
+                    metapath,
+                    processed_users,
+                    100.0 * float(processed_users) / max(len(user_array), 1),
+                    (time.time() - start_time) / 60,
+                    float(processed_users) / (time.time() - start_time)))
+
+                sys.stdout.flush()
+                sys.stderr.flush()
+
+                start_time_printBatch = time.time()
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+        path_arrays = {}
+
+        for array_name in ["user", "item", "node_type", "node_index", "similarity"]:
+            path_arrays[array_name] = np.concatenate([result[array_name] for result in result_list])
+
+        return path_arrays
+
+
+def _sample_users_block_worker(user_array):
+
+    worker_state = get_worker_state()
+
+    return worker_state["sampler"].sample_users_block(worker_state["metapath"], user_array)
+
+
+if __name__ == '__main__':
+
+    data_folder = 'Conferences/KDD/MCRec_github/data/'
+
+    umfile = data_folder + 'ml-100k.train.rating'
+    mtfile = data_folder + 'ml-100k.mt'
+    uufile = data_folder + 'ml-100k.uu_knn_50'
+    mmfile = data_folder + 'ml-100k.mm_knn_50'
+
+    # ml 100k
+    usize = 943 + 1
+    msize = 1682 + 1
+    tsize = 18 + 1
+
+    walk_num = 5
+    K = 1
+
+    URM = load_adjacency_file(umfile, shape=(usize, msize))
+    ICM_genre = load_adjacency_file(mtfile, shape=(msize, tsize))
+    UCM_neighbors = load_adjacency_file(uufile, shape=(usize, usize), symmetric=True)
+    ICM_neighbors = load_adjacency_file(mmfile, shape=(msize, msize), symmetric=True)
+
+    user_embedding = load_embedding_file(data_folder + 'ml-100k.bpr.user_embedding', usize)
+    item_embedding = load_embedding_file(data_folder + 'ml-100k.bpr.item_embedding', msize)
+
+    sampler = MetapathSampler(URM, ICM_genre, UCM_neighbors, ICM_neighbors, user_embedding, item_embedding,
+                              max_paths=walk_num)
+
+    for metapath in MetapathSampler.METAPATH_LIST:
+        path_arrays = sampler.sample(metapath, n_jobs=multiprocessing.cpu_count())
+
+        outfile_name = data_folder + 'ml-100k_50.' + metapath + '_' + str(walk_num) + '_' + str(K) + '.npz'
+        print('outfile name = ', outfile_name)
+
+        save_sampled_paths(outfile_name, path_arrays)
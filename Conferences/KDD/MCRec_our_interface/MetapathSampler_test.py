@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+from Conferences.KDD.MCRec_our_interface.MetapathSampler import MetapathSampler
+
+
+def get_binary_random_matrix(n_rows, n_cols, density):
+
+    X = sps.random(n_rows, n_cols, density=density, format="csr")
+    X.data[:] = 1.0
+
+    return X
+
+
+class MyTestCase(unittest.TestCase):
+
+    n_users, n_items, n_genres, n_features = 30, 40, 5, 4
+    user_without_paths = 1
+
+    def setUp(self):
+
+        URM = get_binary_random_matrix(self.n_users, self.n_items, 0.3).tolil()
+        UCM_neighbors = get_binary_random_matrix(self.n_users, self.n_users, 0.2)
+        UCM_neighbors = (UCM_neighbors + UCM_neighbors.T).tolil()
+
+        # A user with interactions but no user neighbors and whose similarity with all items is <= min_similarity
+        URM[self.user_without_paths, :] = 0
+        URM[self.user_without_paths, :5] = 1
+        UCM_neighbors[self.user_without_paths, :] = 0
+        UCM_neighbors[:, self.user_without_paths] = 0
+
+        ICM_genre = get_binary_random_matrix(self.n_items, self.n_genres, 0.4)
+        ICM_neighbors = get_binary_random_matrix(self.n_items, self.n_items, 0.2)
+        ICM_neighbors = ICM_neighbors + ICM_neighbors.T
+
+        # Positive embeddings have a cosine similarity > 0.7 with high probability
+        user_embedding = np.random.rand(self.n_users, self.n_features) + 1.0
+        item_embedding = np.random.rand(self.n_items, self.n_features) + 1.0
+        user_embedding[self.user_without_paths] = -1.0
+
+        self.URM = sps.csr_matrix(URM)
+        self.ICM_genre = ICM_genre
+        self.UCM_neighbors = sps.csr_matrix(UCM_neighbors)
+        self.ICM_neighbors = sps.csr_matrix(ICM_neighbors)
+
+        self.sampler = MetapathSampler(self.URM, self.ICM_genre, self.UCM_neighbors, self.ICM_neighbors,
+                                       user_embedding, item_embedding, max_paths=3)
+
+    def _is_edge(self, metapath, node_index):
+
+        adjacency_list = {"umum": [self.URM, self.URM.T, self.URM],
+                          "umtm": [self.URM, self.ICM_genre, self.ICM_genre.T],
+                          "uuum": [self.UCM_neighbors, self.UCM_neighbors, self.URM],
+                          "ummm": [self.URM, self.ICM_neighbors, self.ICM_neighbors]}[metapath]
+
+        return all(adjacency[node_index[step], node_index[step + 1]] != 0 for step, adjacency in enumerate(adjacency_list))
+
+    def _assert_valid_paths(self, metapath, path_arrays):
+
+        for pair_index in range(len(path_arrays["item"])):
+
+            valid_path = path_arrays["node_type"][pair_index, :, 0] != 0
+            self.assertTrue(valid_path[0], "Only the pairs with at least one path are returned")
+
+            for node_index, similarity in zip(path_arrays["node_index"][pair_index, valid_path],
+                                              path_arrays["similarity"][pair_index, valid_path]):
+
+                self.assertEqual(node_index[3], path_arrays["item"][pair_index])
+                self.assertTrue(self._is_edge(metapath, node_index))
+                self.assertTrue(similarity > self.sampler.min_similarity)
+
+    def test_sample_user(self):
+
+        for metapath in MetapathSampler.METAPATH_LIST:
+            path_arrays = self.sampler.sample_user(metapath, 2)
+
+            self.assertEqual(path_arrays["node_index"].shape, (len(path_arrays["item"]), self.sampler.max_paths, 4))
+            self._assert_valid_paths(metapath, path_arrays)
+
+    def test_sample_user_without_paths(self):
+
+        for metapath in ["umtm", "uuum", "ummm"]:
+            path_arrays = self.sampler.sample_user(metapath, self.user_without_paths)
+
+            self.assertEqual(len(path_arrays["item"]), 0)
+            self.assertEqual(path_arrays["node_index"].shape, (0, self.sampler.max_paths, 4))
+            self.assertEqual(path_arrays["similarity"].shape, (0, self.sampler.max_paths))
+
+    def test_sample_parallel(self):
+
+        for metapath in ["umtm", "uuum", "ummm"]:
+
+            path_arrays = self.sampler.sample(metapath, users_per_block=4, n_jobs=1, verbose=False)
+            path_arrays_parallel = self.sampler.sample(metapath, users_per_block=4, n_jobs=2, verbose=False)
+
+            self.assertFalse(np.any(path_arrays["user"] == self.user_without_paths))
+
+            for array_name in path_arrays.keys():
+                self.assertTrue(np.array_equal(path_arrays[array_name], path_arrays_parallel[array_name]))
+
+            self._assert_valid_paths(metapath, path_arrays)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,14 @@
 import tensorflow as tf
 import numpy as np
+import scipy.sparse as sps
 from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import eigsh
 
 
 class SpectralCF(object):
     def __init__(self, K, graph, n_users, n_items, emb_dim, lr, batch_size, decay):
         self.model_name = 'GraphCF with eigen decomposition'
-        self.graph = graph
+        self.graph = sps.csr_matrix(graph, dtype=np.float32)
         self.n_users = n_users
         self.n_items = n_items
         self.emb_dim = emb_dim
@@ -15,7 +17,14 @@ class SpectralCF(object):
         self.lr = lr
         self.decay = decay
 
-    def compute_eigenvalues(self, lamda=None, U=None):
+    def compute_eigenvalues(self, lamda=None, U=None, n_eigenpairs=None):
+        """
+        :param lamda:
+        :param U:
+        :param n_eigenpairs:    if None all the eigenpairs of the laplacian are computed with a dense decomposition,
+                                otherwise only the n_eigenpairs with the smallest eigenvalues, with a sparse solver
+        :return:
+        """
 
         if lamda is None or U is None:
 
@@ -25,12 +34,22 @@ class SpectralCF(object):
             print("SpectralCF: Computing degree_matrix...")
             self.D = self._degree_matrix()
 
-            print("SpectralCF: Computing laplacian_matrix...")
-            self.L = self._laplacian_matrix(normalized=True)
+            n_nodes = self.n_users + self.n_items
 
-            print("SpectralCF: Computing eigenvalues...")
-            self.lamda, self.U = np.linalg.eig(self.L)
-            self.lamda = np.diag(self.lamda)
+            if n_eigenpairs is None or n_eigenpairs >= n_nodes - 1:
+
+                print("SpectralCF: Computing laplacian_matrix...")
+                self.L = self._laplacian_matrix(normalized=True)
+
+                print("SpectralCF: Computing eigenvalues...")
+                self.lamda, self.U = np.linalg.eig(self.L.toarray())
+                self.lamda = np.diag(self.lamda)
+
+            else:
+
+                print("SpectralCF: Computing {} eigenvalues...".format(n_eigenpairs))
+                self.lamda, self.U = self._laplacian_partial_eigendecomposition(n_eigenpairs)
+                self.lamda = np.diag(self.lamda)
 
         else:
 
@@ -61,14 +80,27 @@ class SpectralCF(object):
 
             )
 
-        A_hat = np.dot(self.U, self.U.T) + np.dot(np.dot(self.U, self.lamda), self.U.T)
-        # A_hat += np.dot(np.dot(self.U, self.lamda_2), self.U.T)
-        A_hat = A_hat.astype(np.float32)
+        if self.U.shape[1] < self.U.shape[0]:
+            # With a partial decomposition A_hat = U (I + lamda) U.T is applied in factorized form,
+            # so that no dense (n_nodes, n_nodes) matrix is built
+            U_left = self.U.astype(np.float32)
+            U_right = np.dot(np.identity(self.U.shape[1]) + self.lamda, self.U.T).astype(np.float32)
+
+            def propagate(embeddings):
+                return tf.matmul(U_left, tf.matmul(U_right, embeddings))
+
+        else:
+            A_hat = np.dot(self.U, self.U.T) + np.dot(np.dot(self.U, self.lamda), self.U.T)
+            # A_hat += np.dot(np.dot(self.U, self.lamda_2), self.U.T)
+            A_hat = A_hat.astype(np.float32)
+
+            def propagate(embeddings):
+                return tf.matmul(A_hat, embeddings)
 
         embeddings = tf.concat([self.user_embeddings, self.item_embeddings], axis=0)
         all_embeddings = [embeddings]
         for k in range(0, self.K):
-            embeddings = tf.matmul(A_hat, embeddings)
+            embeddings = propagate(embeddings)
 
             # filters = self.filters[k]#tf.squeeze(tf.gather(self.filters, k))
             embeddings = tf.nn.sigmoid(tf.matmul(embeddings, self.filters[k]))
@@ -103,22 +135,41 @@ class SpectralCF(object):
         return loss
 
     def _adjacient_matrix(self, self_connection=False):
-        A = np.zeros([self.n_users + self.n_items, self.n_users + self.n_items], dtype=np.float32)
-        A[:self.n_users, self.n_users:] = self.graph
-        A[self.n_users:, :self.n_users] = self.graph.T
+        A = sps.bmat([[None, self.graph], [self.graph.T, None]], format="csr", dtype=np.float32)
         if self_connection == True:
-            return np.identity(self.n_users + self.n_items, dtype=np.float32) + A
+            return sps.identity(self.n_users + self.n_items, dtype=np.float32, format="csr") + A
         return A
 
     def _degree_matrix(self):
-        degree = np.sum(self.A, axis=1, keepdims=False)
+        degree = np.asarray(self.A.sum(axis=1), dtype=np.float32).ravel()
         # degree = np.diag(degree)
         return degree
 
     def _laplacian_matrix(self, normalized=False):
         if normalized == False:
-            return self.D - self.A
+            return sps.diags(self.D, format="csr") - self.A
 
-        temp = np.dot(np.diag(np.power(self.D, -1)), self.A)
+        temp = sps.diags(np.power(self.D, -1), format="csr").dot(self.A)
         # temp = np.dot(temp, np.power(self.D, -0.5))
-        return np.identity(self.n_users + self.n_items, dtype=np.float32) - temp
+        return sps.identity(self.n_users + self.n_items, dtype=np.float32, format="csr") - temp
+
+    def _laplacian_partial_eigendecomposition(self, n_eigenpairs):
+        """
+        The laplacian L = I - D^-1 A is similar to the symmetric I - D^-1/2 A D^-1/2, the eigenvectors of L are
+        D^-1/2 V, with V the eigenvectors of D^-1/2 A D^-1/2 having the largest eigenvalues mu, and its eigenvalues 1 - mu.
+        :param n_eigenpairs:
+        :return: the n_eigenpairs smallest eigenvalues of L and the eigenvectors, normalized as by np.linalg.eig
+        """
+
+        D_inv_sqrt = sps.diags(np.power(self.D.astype(np.float64), -0.5), format="csr")
+        A_sym = D_inv_sqrt.dot(self.A.astype(np.float64)).dot(D_inv_sqrt)
+
+        mu, V = eigsh(A_sym, k=n_eigenpairs, which="LA")
+
+        lamda = 1.0 - mu
+        U = D_inv_sqrt.dot(V)
+        U /= np.linalg.norm(U, axis=0, keepdims=True)
+
+        sort_index = np.argsort(lamda)
+
+        return lamda[sort_index], U[:, sort_index]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+try:
+    from Conferences.RecSys.SpectralCF_our_interface.SpectralCF_RecommenderWrapper import Data
+    tensorflow_available = True
+except ImportError:
+    tensorflow_available = False
+
+
+@unittest.skipUnless(tensorflow_available, "Tensorflow is not installed")
+class MyTestCase(unittest.TestCase):
+
+    def _assert_valid_sample(self, URM_train, users, pos_items, neg_items, batch_size):
+
+        self.assertEqual(len(users), batch_size)
+        self.assertTrue(np.all(URM_train[users, pos_items].A1 != 0))
+        self.assertTrue(np.all(URM_train[users, neg_items].A1 == 0), "Some negative items are positive for the user")
+
+    def test_sample(self):
+
+        # Dense profiles, so that many negative items are drawn again
+        URM_train = sps.random(100, 30, density=0.8, format="csr")
+        URM_train[0, :] = 0.0
+        URM_train.eliminate_zeros()
+
+        batch_size = 50
+        data_generator = Data(URM_train, batch_size=batch_size)
+
+        for _ in range(10):
+            users, pos_items, neg_items = data_generator.sample()
+
+            self._assert_valid_sample(URM_train, users, pos_items, neg_items, batch_size)
+
+            self.assertEqual(len(np.unique(users)), batch_size, "Users are not distinct")
+            self.assertFalse(np.any(users == 0), "Users without interactions are sampled")
+
+    def test_sample_batch_size_greater_than_users(self):
+
+        URM_train = sps.random(20, 30, density=0.3, format="csr")
+
+        batch_size = 64
+        data_generator = Data(URM_train, batch_size=batch_size)
+
+        users, pos_items, neg_items = data_generator.sample()
+
+        self._assert_valid_sample(URM_train, users, pos_items, neg_items, batch_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,66 +8,80 @@ Created on 18/12/18
 
 from Base.BaseRecommender import BaseRecommender
 from Base.Incremental_Training_Early_Stopping import Incremental_Training_Early_Stopping
+from Base.Recommender_utils import is_in_sorted_keys
 
 import numpy as np
 import scipy.sparse as sps
 
 import tensorflow as tf
-import random as rd
 import os, shutil
 
 from Conferences.RecSys.SpectralCF_our_interface.SpectralCF import SpectralCF
 
 
 class Data(object):
+    """
+    Samples BPR triples (user, positive item, negative item) directly from the CSR structure of URM_train.
+    Negative items are drawn at random and the ones the user interacted with are drawn again.
+    """
+
     def __init__(self, URM_train, batch_size):
         self.batch_size = batch_size
 
-        URM_train = sps.csr_matrix(URM_train)
+        URM_train = sps.csr_matrix(URM_train, copy=True)
+        URM_train.sum_duplicates()
+
         self.n_users, self.n_items = URM_train.shape
 
-        self.R = np.zeros((self.n_users, self.n_items), dtype=np.float32)
+        self._indptr = URM_train.indptr
+        self._indices = URM_train.indices
+        self._profile_length = np.ediff1d(URM_train.indptr)
+
+        self._users_with_interactions = np.arange(self.n_users, dtype=np.int64)[self._profile_length >= 1]
+
+        assert np.all(self._profile_length < self.n_items), \
+            "Data: some users interacted with all items, no negative items can be sampled for them"
+
+        # Sorted keys user*n_items + item of the interactions, to check whether a sampled item is positive
+        self._interaction_keys = np.repeat(np.arange(self.n_users, dtype=np.int64), self._profile_length) * self.n_items + \
+                                 self._indices
+
+    def _sample_users(self):
+
+        if self.batch_size > self.n_users:
+            return np.random.choice(self._users_with_interactions, self.batch_size, replace=True)
 
-        self._users_with_interactions = np.ediff1d(URM_train.indptr) >= 1
-        self._users_with_interactions = np.arange(self.n_users, dtype=np.int64)[self._users_with_interactions]
-        self._users_with_interactions = list(self._users_with_interactions)
+        assert self.batch_size <= len(self._users_with_interactions), \
+            "Data: batch_size {} is greater than the number of users with interactions {}".format(
+                self.batch_size, len(self._users_with_interactions))
 
-        self.train_items, self.test_set = {}, {}
+        # Distinct users, the repeated ones are drawn again
+        users = np.unique(np.random.choice(self._users_with_interactions, self.batch_size, replace=True))
 
-        for user_index in range(self.n_users):
-            start_pos = URM_train.indptr[user_index]
-            end_pos = URM_train.indptr[user_index + 1]
+        while len(users) < self.batch_size:
+            new_users = np.random.choice(self._users_with_interactions, self.batch_size - len(users), replace=True)
+            users = np.unique(np.concatenate((users, new_users)))
 
-            train_items = URM_train.indices[start_pos:end_pos]
+        np.random.shuffle(users)
 
-            self.R[user_index][train_items] = 1
-            self.train_items[user_index] = list(train_items)
+        return users
+
+    def _is_positive(self, users, items):
+
+        return is_in_sorted_keys(self._interaction_keys, users * self.n_items + items)
 
     def sample(self):
-        if self.batch_size <= self.n_users:
-            # users = rd.sample(range(self.n_users), self.batch_size)
-            users = rd.sample(self._users_with_interactions, self.batch_size)
 
-        else:
-            # users = [rd.choice(range(self.n_users)) for _ in range(self.batch_size)]
-            users = [rd.choice(self._users_with_interactions) for _ in range(self.batch_size)]
-
-        def sample_pos_items_for_u(u, num):
-            pos_items = self.train_items[u]  # np.nonzero(self.graph[u,:])[0].tolist()
-            if len(pos_items) >= num:
-                return rd.sample(pos_items, num)
-            else:
-                return [rd.choice(pos_items) for _ in range(num)]
-
-        def sample_neg_items_for_u(u, num):
-            neg_items = list(
-                set(range(self.n_items)) - set(self.train_items[u]))  # np.nonzero(self.graph[u,:] == 0)[0].tolist()
-            return rd.sample(neg_items, num)
-
-        pos_items, neg_items = [], []
-        for u in users:
-            pos_items += sample_pos_items_for_u(u, 1)
-            neg_items += sample_neg_items_for_u(u, 1)
+        users = self._sample_users()
+
+        pos_items = self._indices[self._indptr[users] + np.random.randint(0, self._profile_length[users])]
+
+        neg_items = np.random.randint(0, self.n_items, size=len(users))
+        resample = self._is_positive(users, neg_items)
+
+        while resample.any():
+            neg_items[resample] = np.random.randint(0, self.n_items, size=resample.sum())
+            resample[resample] = self._is_positive(users[resample], neg_items[resample])
 
         return users, pos_items, neg_items
 
@@ -115,6 +129,7 @@ class SpectralCF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_
             decay=0.001,
             k=3,
             learning_rate=1e-3,
+            n_eigenpairs=None,
             temp_file_folder=None,
             **earlystopping_kwargs
             ):
@@ -134,6 +149,7 @@ class SpectralCF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_
         self.learning_rate = learning_rate
         self.decay = decay
         self.batch_size = batch_size
+        self.n_eigenpairs = n_eigenpairs
 
         print("SpectralCF_RecommenderWrapper: Instantiating model...")
 
@@ -142,7 +158,7 @@ class SpectralCF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_
         self.data_generator = Data(self.URM_train, batch_size=self.batch_size)
 
         self.model = SpectralCF(K=self.k,
-                                graph=self.URM_train.toarray(),
+                                graph=self.URM_train,
                                 n_users=self.n_users,
                                 n_items=self.n_items,
                                 emb_dim=self.embedding_size,
@@ -150,7 +166,7 @@ class SpectralCF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_
                                 decay=self.decay,
                                 batch_size=self.batch_size)
 
-        self.model.compute_eigenvalues()
+        self.model.compute_eigenvalues(n_eigenpairs=self.n_eigenpairs)
 
         # Keep it to avoid recomputing every time the model is loaded
         self.model_lamda = self.model.lamda.copy()
@@ -217,6 +233,7 @@ class SpectralCF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_
                               "learning_rate": self.learning_rate,
                               "decay": self.decay,
                               "batch_size": self.batch_size,
+                              "n_eigenpairs": self.n_eigenpairs,
                               "model_lamda": self.model_lamda,
                               "model_U": self.model_U,
                               }
@@ -250,7 +267,7 @@ class SpectralCF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_
         self.data_generator = Data(self.URM_train, batch_size=self.batch_size)
 
         self.model = SpectralCF(K=self.k,
-                                graph=self.URM_train.toarray(),
+                                graph=self.URM_train,
                                 n_users=self.n_users,
                                 n_items=self.n_items,
                                 emb_dim=self.embedding_size,
@@ -8,10 +8,10 @@ Created on 18/12/18
 
 from Base.BaseRecommender import BaseRecommender
 from Base.Incremental_Training_Early_Stopping import Incremental_Training_Early_Stopping
+from Base.Recommender_utils import is_in_sorted_keys
 
 import numpy as np
 import scipy.sparse as sps
-from collections import defaultdict
 from tqdm import tqdm
 import tensorflow as tf
 import os, copy
@@ -111,23 +111,24 @@ class CMN_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_Stoppin
         self._item_indices = np.arange(0, self.n_items, dtype=np.int32)
         self._user_ones_vector = np.ones_like(self._item_indices)
 
-        # Neighborhoods
-        self.user_items = defaultdict(set)
-        self.item_users = defaultdict(set)
-        self.item_users_list = defaultdict(list)
+        self.URM_train = sps.csr_matrix(self.URM_train)
+        self.URM_train.sort_indices()
 
-        self.URM_train = sps.coo_matrix(self.URM_train)
+        # Neighborhoods, stored as a csc structure. The users who interacted with item i are
+        # self._item_users_indices[self._item_users_indptr[i]:self._item_users_indptr[i+1]]
+        URM_train_csc = sps.csc_matrix(self.URM_train)
+        URM_train_csc.sort_indices()
 
-        for interaction_index in range(self.URM_train.nnz):
-            user_idx = self.URM_train.row[interaction_index]
-            item_idx = self.URM_train.col[interaction_index]
+        self._item_users_indptr = URM_train_csc.indptr.astype(np.int64)
+        self._item_users_indices = URM_train_csc.indices.astype(np.int32)
+        self._item_users_length = np.ediff1d(self._item_users_indptr)
 
-            self.user_items[user_idx].add(item_idx)
-            self.item_users[item_idx].add(user_idx)
-            # Get a list version so we do not need to perform type casting
-            self.item_users_list[item_idx].append(user_idx)
+        # Negative items are sampled among those having at least one interaction
+        self._items_with_interactions = np.arange(self.n_items, dtype=np.int32)[self._item_users_length > 0]
 
-        self.URM_train = sps.csr_matrix(self.URM_train)
+        # Sorted keys user*n_items + item of the interactions, used to check whether a sampled item is a positive
+        user_index = np.repeat(np.arange(self.n_users, dtype=np.int64), np.ediff1d(self.URM_train.indptr))
+        self._interaction_keys = user_index * self.n_items + self.URM_train.indices
 
     def _compute_item_score(self, user_id_array, items_to_compute=None):
 
@@ -140,11 +141,17 @@ class CMN_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_Stoppin
 
         input_user_handle = self.model.input_users
         input_item_handle = self.model.input_items
-        neighborhood = self.item_users_list
         input_neighborhood_handle = self.model.input_neighborhoods
         input_neighborhood_length_handle = self.model.input_neighborhood_lengths
         score_op = self.model.score
 
+        # The neighborhoods do not depend on the user, except for the items without interactions
+        # whose neighborhood is the user itself
+        neighborhoods, neighborhood_length = self._get_neighborhoods(item_indices, self.cmn_config.max_neighbors,
+                                                                     np.zeros(len(item_indices), dtype=np.int32))
+
+        items_without_neighbors = self._item_users_length[item_indices] == 0
+
         for user_index in range(len(user_id_array)):
 
             user_id = user_id_array[user_index]
@@ -159,24 +166,12 @@ class CMN_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_Stoppin
                 input_item_handle: item_indices,
             }
 
-            if neighborhood is not None:
-                # neighborhoods, neighborhood_length = np.zeros((self.n_items, self.cmn_config.max_neighbors),
-                #                                               dtype=np.int32), np.ones(self.n_items, dtype=np.int32)
-                neighborhoods, neighborhood_length = np.zeros((len(item_indices), self.cmn_config.max_neighbors),
-                                                              dtype=np.int32), np.ones(len(item_indices),
-                                                                                       dtype=np.int32)
-
-                for _idx, item in enumerate(item_indices):
-                    _len = min(len(neighborhood[item]), self.cmn_config.max_neighbors)
-                    if _len > 0:
-                        neighborhoods[_idx, :_len] = neighborhood[item][:_len]
-                        neighborhood_length[_idx] = _len
-                    else:
-                        neighborhoods[_idx, :1] = user_id
-                feed.update({
-                    input_neighborhood_handle: neighborhoods,
-                    input_neighborhood_length_handle: neighborhood_length
-                })
+            neighborhoods[items_without_neighbors, 0] = user_id
+
+            feed.update({
+                input_neighborhood_handle: neighborhoods,
+                input_neighborhood_length_handle: neighborhood_length
+            })
 
             item_score_user = self.sess.run(score_op, feed)
 
@@ -187,6 +182,47 @@ class CMN_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_Stoppin
 
         return item_scores
 
+    def _compute_item_score_on_user_items(self, user_id_array, user_items_to_compute):
+
+        item_scores = - np.ones((len(user_id_array), self.n_items)) * np.inf
+
+        input_user_handle = self.model.input_users
+        input_item_handle = self.model.input_items
+        input_neighborhood_handle = self.model.input_neighborhoods
+        input_neighborhood_length_handle = self.model.input_neighborhood_lengths
+        score_op = self.model.score
+
+        # Each user is scored only on its own items, e.g., the negative items sampled for it.
+        # The neighborhood of the items without interactions is the user itself
+        user_items_indptr = user_items_to_compute.indptr
+        item_input = user_items_to_compute.indices.astype(np.int32)
+
+        user_index = np.repeat(np.arange(len(user_id_array)), np.ediff1d(user_items_indptr))
+        user_input = np.asarray(user_id_array, dtype=np.int32)[user_index]
+
+        neighborhoods, neighborhood_length = self._get_neighborhoods(item_input, self.cmn_config.max_neighbors,
+                                                                     user_input)
+
+        for user_index in range(len(user_id_array)):
+
+            start_pair, end_pair = user_items_indptr[user_index], user_items_indptr[user_index + 1]
+
+            if start_pair == end_pair:
+                continue
+
+            feed = {
+                input_user_handle: user_input[start_pair:end_pair],
+                input_item_handle: item_input[start_pair:end_pair],
+                input_neighborhood_handle: neighborhoods[start_pair:end_pair],
+                input_neighborhood_length_handle: neighborhood_length[start_pair:end_pair]
+            }
+
+            item_score_user = self.sess.run(score_op, feed)
+
+            item_scores[user_index, item_input[start_pair:end_pair]] = item_score_user.ravel()
+
+        return item_scores
+
     def get_early_stopping_final_epochs_dict(self):
         """
         This function returns a dictionary to be used as optimal parameters in the .fit() function
@@ -417,93 +453,103 @@ class CMN_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_Stoppin
         print("CMN_RecommenderWrapper: Epoch {}: Avg Loss/Batch {:<20,.6f}".format(currentEpoch,
                                                                                    self.model._average_loss_evaluation))
 
+    def _get_neighborhoods(self, item_array, max_length, default_neighbor_array):
+        """
+        Builds the padded neighborhoods of the items, i.e., the users who interacted with them
+        :param item_array:
+        :param max_length:              number of columns of the neighborhoods, longer neighborhoods are truncated
+        :param default_neighbor_array:  neighbor of each item without interactions, whose length will be 1
+        :return: neighborhoods (len(item_array), max_length), neighborhood_length
+        """
+
+        neighborhood_length = np.minimum(self._item_users_length[item_array], max_length)
+
+        # Flat position in the neighborhoods and in self._item_users_indices of each neighbor
+        neighbor_row = np.repeat(np.arange(len(item_array)), neighborhood_length)
+        neighbor_col = np.arange(len(neighbor_row)) - np.repeat(np.cumsum(neighborhood_length) - neighborhood_length,
+                                                                neighborhood_length)
+
+        neighbor_position = np.repeat(self._item_users_indptr[item_array], neighborhood_length) + neighbor_col
+
+        neighborhoods = np.zeros((len(item_array), max_length), dtype=np.int32)
+        neighborhoods[neighbor_row, neighbor_col] = self._item_users_indices[neighbor_position]
+
+        # Length defaults to 1
+        empty_neighborhood = neighborhood_length == 0
+        neighborhoods[empty_neighborhood, 0] = default_neighbor_array[empty_neighborhood]
+        neighborhood_length[empty_neighborhood] = 1
+
+        return neighborhoods, neighborhood_length.astype(np.int32)
+
     def get_train_data_iterator(self, neighborhood=True):
-        # Allocate inputs
-        batch = np.zeros((self.cmn_config.batch_size, 3), dtype=np.uint32)
-        pos_neighbor = np.zeros((self.cmn_config.batch_size, self.cmn_config.max_neighbors), dtype=np.int32)
-        pos_length = np.zeros(self.cmn_config.batch_size, dtype=np.int32)
-        neg_neighbor = np.zeros((self.cmn_config.batch_size, self.cmn_config.max_neighbors), dtype=np.int32)
-        neg_length = np.zeros(self.cmn_config.batch_size, dtype=np.int32)
+
+        batch_size = self.cmn_config.batch_size
 
         # Shuffle index
         self._train_index = np.arange(self.URM_train.nnz, dtype=np.uint)
         np.random.shuffle(self._train_index)
 
-        idx = 0
-        for interaction_index in self._train_index:
-
-            user_idx = self.URM_train_coo.row[interaction_index]
-            item_idx = self.URM_train_coo.col[interaction_index]
-
-            # TODO: set positive values outside of for loop
-            for _ in range(self.cmn_config.neg_count):
-                neg_item_idx = self._sample_negative_item(user_idx)
-                batch[idx, :] = [user_idx, item_idx, neg_item_idx]
-
-                # Get neighborhood information
-                if neighborhood:
-                    if len(self.item_users[item_idx]) > 0:
-                        pos_length[idx] = len(self.item_users[item_idx])
-                        pos_neighbor[idx, :pos_length[idx]] = self.item_users_list[item_idx]
-                    else:
-                        # Length defaults to 1
-                        pos_length[idx] = 1
-                        pos_neighbor[idx, 0] = item_idx
-
-                    if len(self.item_users[neg_item_idx]) > 0:
-                        neg_length[idx] = len(self.item_users[neg_item_idx])
-                        neg_neighbor[idx, :neg_length[idx]] = self.item_users_list[neg_item_idx]
-                    else:
-                        # Length defaults to 1
-                        neg_length[idx] = 1
-                        neg_neighbor[idx, 0] = neg_item_idx
-
-                idx += 1
-                # Yield batch if we filled queue
-                if idx == self.cmn_config.batch_size:
-                    if neighborhood:
-                        max_length = max(neg_length.max(), pos_length.max())
-                        yield batch, pos_neighbor[:, :max_length], pos_length, \
-                              neg_neighbor[:, :max_length], neg_length
-                        pos_length[:] = 1
-                        neg_length[:] = 1
-                    else:
-                        yield batch
-                    # Reset
-                    idx = 0
-
-        # Provide remainder
-        if idx > 0:
+        # Each interaction appears neg_count times, each with a different negative item
+        interaction_index = np.repeat(self._train_index, self.cmn_config.neg_count)
+
+        user_array = self.URM_train_coo.row[interaction_index]
+        item_array = self.URM_train_coo.col[interaction_index]
+        neg_item_array = self._sample_negative_items(user_array)
+
+        train_data = np.column_stack((user_array, item_array, neg_item_array)).astype(np.uint32)
+
+        for start_idx in range(0, len(train_data), batch_size):
+
+            batch = train_data[start_idx:start_idx + batch_size]
+
             if neighborhood:
-                max_length = max(neg_length[:idx].max(), pos_length[:idx].max())
-                yield batch[:idx], pos_neighbor[:idx, :max_length], pos_length[:idx], \
-                      neg_neighbor[:idx, :max_length], neg_length[:idx]
+                # Neighborhoods are truncated to the longest one in the batch
+                max_length = max(self._item_users_length[batch[:, 1]].max(),
+                                 self._item_users_length[batch[:, 2]].max(), 1)
+
+                # As in the original implementation training neighborhoods are not truncated, only the scoring ones
+                if max_length > self.cmn_config.max_neighbors:
+                    raise ValueError("CMN_RecommenderWrapper: an item has {} neighbors, more than max_neighbors {}".format(
+                        max_length, self.cmn_config.max_neighbors))
+
+                pos_neighbor, pos_length = self._get_neighborhoods(batch[:, 1], max_length, batch[:, 1])
+                neg_neighbor, neg_length = self._get_neighborhoods(batch[:, 2], max_length, batch[:, 2])
+
+                yield batch, pos_neighbor, pos_length, neg_neighbor, neg_length
             else:
-                yield batch[:idx]
+                yield batch
 
-    def _sample_negative_item(self, user_id):
+    def _sample_negative_items(self, user_array):
         """
-        Uniformly sample a negative item
+        Uniformly samples for each user an item it did not interact with, among those having at least one interaction
         """
-        if user_id > self.n_users:
+
+        if len(user_array) > 0 and user_array.max() >= self.n_users:
             raise ValueError("Trying to sample user id: {} > user count: {}".format(
-                user_id, self.n_users))
+                user_array.max(), self.n_users))
 
-        n = self._sample_item()
-        positive_items = self.user_items[user_id]
+        user_profile_length = np.ediff1d(self.URM_train.indptr)[user_array]
 
-        if len(positive_items) >= self.n_items:
+        if len(user_array) > 0 and user_profile_length.max() >= len(self._items_with_interactions):
             raise ValueError("The User has rated more items than possible %s / %s" % (
-                len(positive_items), self.n_items))
-        while n in positive_items or n not in self.item_users:
-            n = self._sample_item()
-        return n
+                user_profile_length.max(), len(self._items_with_interactions)))
 
-    def _sample_item(self):
-        """
-        Draw an item uniformly
-        """
-        return np.random.randint(0, self.n_items)
+        user_array = user_array.astype(np.int64)
+        neg_item_array = np.zeros(len(user_array), dtype=np.int64)
+
+        # Sample all items, then sample again only those that are positives for the user
+        to_sample = np.arange(len(user_array))
+
+        while len(to_sample) > 0:
+
+            neg_item_array[to_sample] = self._items_with_interactions[np.random.randint(0, len(self._items_with_interactions),
+                                                                                        size=len(to_sample))]
+
+            sampled_keys = user_array[to_sample] * self.n_items + neg_item_array[to_sample]
+
+            to_sample = to_sample[is_in_sorted_keys(self._interaction_keys, sampled_keys)]
+
+        return neg_item_array
 
     def saveModel(self, folder_path, file_name=None):
 
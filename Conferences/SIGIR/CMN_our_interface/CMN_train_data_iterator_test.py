@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import scipy.sparse as sps
+
+try:
+    from Conferences.SIGIR.CMN_our_interface.CMN_RecommenderWrapper import CMN_RecommenderWrapper, CMN_Config
+    tensorflow_available = True
+except ImportError:
+    tensorflow_available = False
+
+
+def get_recommender(URM_train, batch_size, max_neighbors):
+
+    recommender = CMN_RecommenderWrapper(URM_train)
+
+    # Set by fit
+    recommender.URM_train_coo = sps.coo_matrix(recommender.URM_train)
+
+    recommender.cmn_config = CMN_Config(None, embed_size=8, batch_size=batch_size, hops=1, l2=0.1,
+                                        user_count=URM_train.shape[0], item_count=URM_train.shape[1],
+                                        optimizer="adam", neg_count=3, optimizer_params={}, learning_rate=1e-3,
+                                        pretrain=None, max_neighbors=max_neighbors)
+
+    return recommender
+
+
+class _PairScoreSession(object):
+    """
+    Replaces the tensorflow session, the score of each pair depends on the user, the item and the neighborhood
+    """
+
+    def __init__(self):
+        self.feed_list = []
+
+    def run(self, score_op, feed):
+        self.feed_list.append(feed)
+
+        return (feed["users"] * 1000.0 + feed["items"] + feed["neighborhoods"][:, 0] * 1e-3 +
+                feed["neighborhood_lengths"] * 1e-6)[:, None]
+
+
+@unittest.skipUnless(tensorflow_available, "Tensorflow is not installed")
+class MyTestCase(unittest.TestCase):
+
+    def test_train_data_iterator(self):
+
+        URM_train = sps.random(80, 50, density=0.1, format="csr")
+        URM_train.data[:] = 1.0
+
+        URM_train_csc = sps.csc_matrix(URM_train)
+        item_popularity = np.ediff1d(URM_train_csc.indptr)
+
+        recommender = get_recommender(URM_train, batch_size=64, max_neighbors=item_popularity.max())
+
+        n_samples = 0
+
+        for batch, pos_neighbor, pos_length, neg_neighbor, neg_length in recommender.get_train_data_iterator():
+
+            n_samples += len(batch)
+
+            user_array = batch[:, 0]
+
+            self.assertTrue(np.all(URM_train[user_array, batch[:, 1]].A1 == 1.0))
+            self.assertTrue(np.all(URM_train[user_array, batch[:, 2]].A1 == 0.0), "Some negative items are positive for the user")
+
+            # The neighbors of an item are the users who interacted with it
+            for neighbor, length, item_array in [(pos_neighbor, pos_length, batch[:, 1]), (neg_neighbor, neg_length, batch[:, 2])]:
+                for row_index, item in enumerate(item_array):
+                    item_users = URM_train_csc[:, item].indices
+
+                    self.assertEqual(length[row_index], max(len(item_users), 1))
+
+                    if len(item_users) > 0:
+                        self.assertEqual(set(neighbor[row_index, :length[row_index]]), set(item_users))
+
+        self.assertEqual(n_samples, URM_train.nnz * 3)
+
+    def test_train_data_iterator_max_neighbors(self):
+
+        URM_train = sps.random(80, 50, density=0.1, format="csr")
+        URM_train.data[:] = 1.0
+
+        recommender = get_recommender(URM_train, batch_size=URM_train.nnz * 3, max_neighbors=1)
+
+        with self.assertRaises(ValueError):
+            next(recommender.get_train_data_iterator())
+
+    def test_compute_item_score_on_user_items(self):
+
+        URM_train = sps.random(80, 50, density=0.1, format="csr")
+        URM_train.data[:] = 1.0
+
+        recommender = get_recommender(URM_train, batch_size=64, max_neighbors=80)
+        recommender.model = SimpleNamespace(input_users="users", input_items="items", input_neighborhoods="neighborhoods",
+                                            input_neighborhood_lengths="neighborhood_lengths", score="score")
+
+        user_id_array = np.array([3, 10, 11, 40, 79])
+        user_items_to_compute = sps.random(len(user_id_array), 50, density=0.2, format="csr")
+        user_items_to_compute[2, :] = 0.0
+        user_items_to_compute.eliminate_zeros()
+
+        recommender.sess = _PairScoreSession()
+        scores = recommender._compute_item_score_on_user_items(user_id_array, user_items_to_compute)
+
+        # One run for each user with items to compute, on its own items only
+        self.assertEqual([len(feed["items"]) for feed in recommender.sess.feed_list],
+                         [row_nnz for row_nnz in np.ediff1d(user_items_to_compute.indptr) if row_nnz > 0])
+
+        for user_index, user_id in enumerate(user_id_array):
+            user_items = user_items_to_compute[user_index].indices
+
+            user_scores = recommender._compute_item_score(np.array([user_id]), items_to_compute=user_items)[0]
+
+            self.assertTrue(np.array_equal(scores[user_index], user_scores))
+
+
+if __name__ == '__main__':
+    unittest.main()
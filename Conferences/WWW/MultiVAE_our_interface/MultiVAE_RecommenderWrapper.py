@@ -11,7 +11,6 @@ import shutil
 import sys
 
 import numpy as np
-from scipy import sparse
 
 import seaborn as sn
 
@@ -21,6 +20,8 @@ import tensorflow as tf
 
 from Conferences.WWW.MultiVAE_our_interface.MultiVae_Dae import MultiDAE, MultiVAE
 
+from Utils.SparseBatchPrefetcher import SparseBatchPrefetcher
+
 from Base.BaseRecommender import BaseRecommender
 from Base.Incremental_Training_Early_Stopping import Incremental_Training_Early_Stopping
 
@@ -34,23 +35,40 @@ class MultiVAE_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_St
 
     def _compute_item_score(self, user_id_array, items_to_compute=None):
 
-        URM_train_user_slice = self.URM_train[user_id_array]
+        if items_to_compute is not None:
+            item_scores = - np.ones((len(user_id_array), self.n_items), dtype=np.float32) * np.inf
+        else:
+            item_scores = np.zeros((len(user_id_array), self.n_items), dtype=np.float32)
 
-        if sparse.isspmatrix(URM_train_user_slice):
-            URM_train_user_slice = URM_train_user_slice.toarray()
+        batch_prefetcher = self._get_batch_prefetcher()
 
-        URM_train_user_slice = URM_train_user_slice.astype('float32')
+        # The users are densified in the reusable buffer of the prefetcher, in blocks of its batch size
+        for start_idx in range(0, len(user_id_array), batch_prefetcher.batch_size):
+            end_idx = min(start_idx + batch_prefetcher.batch_size, len(user_id_array))
 
-        item_scores_to_compute = self.sess.run(self.logits_var, feed_dict={self.vae.input_ph: URM_train_user_slice})
+            URM_train_user_slice = batch_prefetcher.get_rows(user_id_array[start_idx:end_idx])
 
-        if items_to_compute is not None:
-            item_scores = - np.ones((len(user_id_array), self.n_items)) * np.inf
-            item_scores[:, items_to_compute] = item_scores_to_compute[:, items_to_compute]
-        else:
-            item_scores = item_scores_to_compute
+            item_scores_to_compute = self.sess.run(self.logits_var, feed_dict={self.vae.input_ph: URM_train_user_slice})
+
+            if items_to_compute is not None:
+                item_scores[start_idx:end_idx, items_to_compute] = item_scores_to_compute[:, items_to_compute]
+            else:
+                item_scores[start_idx:end_idx, :] = item_scores_to_compute
 
         return item_scores
 
+    def _get_batch_prefetcher(self):
+
+        # The prefetcher is built again if the URM_train or the batch size have changed
+        if getattr(self, "_batch_prefetcher", None) is None or \
+                self._batch_prefetcher_URM_train is not self.URM_train or \
+                self._batch_prefetcher.batch_size != self.batch_size:
+
+            self._batch_prefetcher = SparseBatchPrefetcher(self.URM_train, self.batch_size, n_buffers=2)
+            self._batch_prefetcher_URM_train = self.URM_train
+
+        return self._batch_prefetcher
+
     def fit(self,
             epochs=100,
             batch_size=500,
@@ -140,19 +158,12 @@ class MultiVAE_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_St
 
         update_count = 0.0
 
-        user_index_list_train = list(range(self.n_users))
+        user_index_list_train = np.arange(self.n_users)
 
         np.random.shuffle(user_index_list_train)
 
-        # train for one epoch
-        for bnum, st_idx in enumerate(range(0, self.n_users, self.batch_size)):
-
-            end_idx = min(st_idx + self.batch_size, self.n_users)
-            X = self.URM_train[user_index_list_train[st_idx:end_idx]]
-
-            if sparse.isspmatrix(X):
-                X = X.toarray()
-            X = X.astype('float32')
+        # train for one epoch, the next batches are densified by a background thread
+        for bnum, X in enumerate(self._get_batch_prefetcher().iterate_batches(user_index_list_train)):
 
             if self.total_anneal_steps > 0:
                 anneal = min(self.anneal_cap, 1. * update_count / self.total_anneal_steps)
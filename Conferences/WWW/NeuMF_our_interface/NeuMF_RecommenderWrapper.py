@@ -8,6 +8,7 @@ Created on 18/12/18
 
 from Base.BaseRecommender import BaseRecommender
 from Base.Incremental_Training_Early_Stopping import Incremental_Training_Early_Stopping
+from Base.Recommender_utils import is_in_sorted_keys
 
 import numpy as np
 import scipy.sparse as sps
@@ -157,22 +158,56 @@ def load_pretrain_model(model, gmf_model, mlp_model, num_layers):
 
 
 def get_train_instances(train, num_negatives, num_items):
-    user_input, item_input, labels = [], [], []
+    """
+    Samples num_negatives negative items for each positive interaction.
+    All negatives are drawn at once, those colliding with a positive interaction of the same user are drawn again
+    until no collision is left. Each positive instance is followed by its negative instances
+    :param train:           csr matrix of the positive interactions with sorted indices and no explicit zeros
+    :param num_negatives:
+    :param num_items:
+    :return: user_input, item_input, labels as int32 arrays
+    """
+
+    train = sps.csr_matrix(train)
+
+    assert train.has_sorted_indices, "get_train_instances: train must have sorted indices"
+
     num_users = train.shape[0]
-    for (u, i) in train.keys():
-        # positive instance
-        user_input.append(u)
-        item_input.append(i)
-        labels.append(1)
-        # negative instances
-        for t in range(num_negatives):
-            j = np.random.randint(num_items)
-            while (u, j) in train.keys():  # train.has_key((u, j)):
-                j = np.random.randint(num_items)
-            user_input.append(u)
-            item_input.append(j)
-            labels.append(0)
-    return user_input, item_input, labels
+    num_positives = train.nnz
+
+    positive_user = np.repeat(np.arange(num_users, dtype=np.int32), np.ediff1d(train.indptr))
+    positive_item = train.indices
+
+    # Key of each interaction, sorted because the csr rows are in order and the indices are sorted
+    positive_key = positive_user.astype(np.int64) * num_items + positive_item
+
+    negative_user = np.repeat(positive_user, num_negatives)
+    negative_item = np.random.randint(num_items, size=len(negative_user)).astype(np.int32)
+
+    to_check = np.arange(len(negative_user))
+
+    while len(to_check) > 0 and num_positives > 0:
+
+        negative_key = negative_user[to_check].astype(np.int64) * num_items + negative_item[to_check]
+
+        # Resample only the colliding entries
+        to_check = to_check[is_in_sorted_keys(positive_key, negative_key)]
+        negative_item[to_check] = np.random.randint(num_items, size=len(to_check))
+
+    # Each row contains a positive instance followed by its negatives
+    user_input = np.empty((num_positives, 1 + num_negatives), dtype=np.int32)
+    item_input = np.empty((num_positives, 1 + num_negatives), dtype=np.int32)
+    labels = np.zeros((num_positives, 1 + num_negatives), dtype=np.int32)
+
+    user_input[:, 0] = positive_user
+    user_input[:, 1:] = negative_user.reshape((num_positives, num_negatives))
+
+    item_input[:, 0] = positive_item
+    item_input[:, 1:] = negative_item.reshape((num_positives, num_negatives))
+
+    labels[:, 0] = 1
+
+    return user_input.ravel(), item_input.ravel(), labels.ravel()
 
 
 def set_learner(model, learning_rate, learner):
@@ -201,30 +236,70 @@ class NeuMF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_Stopp
     def __init__(self, URM_train):
         super(NeuMF_RecommenderWrapper, self).__init__(URM_train)
 
-        self._train = sps.dok_matrix(self.URM_train)
+        self._train = sps.csr_matrix(self.URM_train, copy=True)
+        self._train.eliminate_zeros()
+        self._train.sort_indices()
         self.n_users, self.n_items = self.URM_train.shape
 
-        self._item_indices = np.arange(0, self.n_items, dtype=np.int)
-        self._user_ones_vector = np.ones_like(self._item_indices)
+        self._item_indices = np.arange(0, self.n_items, dtype=np.int32)
+
+        # Batch size used by keras when computing the predictions
+        self._predict_batch_size = 10000
+
+    def _predict_user_item_pairs(self, user_input, item_input):
+        """
+        Computes the prediction for each (user_input[i], item_input[i]) pair with a few large predict calls
+        :return: array of predictions with the same length as user_input
+        """
+
+        # Pairs given to each predict call, to bound the memory required by keras
+        max_pairs_per_predict = 5000000
+
+        predictions = np.zeros(len(user_input), dtype=np.float32)
+
+        for start_pair in range(0, len(user_input), max_pairs_per_predict):
+            end_pair = min(start_pair + max_pairs_per_predict, len(user_input))
+
+            predictions[start_pair:end_pair] = self.model.predict([user_input[start_pair:end_pair],
+                                                                   item_input[start_pair:end_pair]],
+                                                                  batch_size=self._predict_batch_size,
+                                                                  verbose=0).ravel()
+
+        return predictions
 
     def _compute_item_score(self, user_id_array, items_to_compute=None):
 
         item_scores = - np.ones((len(user_id_array), self.n_items)) * np.inf
 
-        for user_index in range(len(user_id_array)):
+        if items_to_compute is not None:
+            item_indices = np.asarray(items_to_compute, dtype=np.int32)
+        else:
+            item_indices = self._item_indices
+
+        # The prediction requires a list of two arrays user_id, item_id of equal length
+        # All users in the block are scored at once, each user id is repeated as many times as the number of items
+        user_input = np.repeat(np.asarray(user_id_array, dtype=np.int32), len(item_indices))
+        item_input = np.tile(item_indices, len(user_id_array))
+
+        predictions = self._predict_user_item_pairs(user_input, item_input)
+
+        item_scores[:, item_indices] = predictions.reshape((len(user_id_array), len(item_indices)))
+
+        return item_scores
+
+    def _compute_item_score_on_user_items(self, user_id_array, user_items_to_compute):
+
+        item_scores = - np.ones((len(user_id_array), self.n_items)) * np.inf
+
+        # Only the requested user-item pairs are scored, e.g., the negative items sampled for each user
+        user_index = np.repeat(np.arange(len(user_id_array)), np.ediff1d(user_items_to_compute.indptr))
 
-            user_id = user_id_array[user_index]
+        user_input = np.asarray(user_id_array, dtype=np.int32)[user_index]
+        item_input = user_items_to_compute.indices.astype(np.int32)
 
-            # The prediction requires a list of two arrays user_id, item_id of equal length
-            # To compute the recommendations for a single user, we must provide its index as many times as the
-            # number of items
-            item_score_user = self.model.predict([self._user_ones_vector * user_id, self._item_indices],
-                                                 batch_size=100, verbose=0)
+        predictions = self._predict_user_item_pairs(user_input, item_input)
 
-            if items_to_compute is not None:
-                item_scores[user_index, items_to_compute] = item_score_user.ravel()[items_to_compute]
-            else:
-                item_scores[user_index, :] = item_score_user.ravel()
+        item_scores[user_index, item_input] = predictions
 
         return item_scores
 
@@ -370,8 +445,8 @@ class NeuMF_RecommenderWrapper(BaseRecommender, Incremental_Training_Early_Stopp
         user_input, item_input, labels = get_train_instances(self._train, self.num_negatives, self.n_items)
 
         # Training
-        hist = self.model.fit([np.array(user_input), np.array(item_input)],  # input
-                              np.array(labels),  # labels
+        hist = self.model.fit([user_input, item_input],  # input
+                              labels,  # labels
                               batch_size=self.batch_size, epochs=1, verbose=0, shuffle=True)
 
         print("NeuMF_RecommenderWrapper: Epoch {}, loss {:.2E}".format(currentEpoch + 1, hist.history['loss'][0]))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+try:
+    from Conferences.WWW.NeuMF_our_interface.NeuMF_RecommenderWrapper import get_train_instances
+    keras_available = True
+except ImportError:
+    keras_available = False
+
+
+@unittest.skipUnless(keras_available, "Keras is not installed")
+class MyTestCase(unittest.TestCase):
+
+    def test_get_train_instances(self):
+
+        num_users = 60
+        num_items = 40
+        num_negatives = 4
+
+        train = sps.random(num_users, num_items, density=0.3, format="csr")
+        train.data[:] = 1.0
+        train.sort_indices()
+
+        user_input, item_input, labels = get_train_instances(train, num_negatives, num_items)
+
+        self.assertEqual(len(user_input), train.nnz * (1 + num_negatives))
+
+        user_input = user_input.reshape((train.nnz, 1 + num_negatives))
+        item_input = item_input.reshape((train.nnz, 1 + num_negatives))
+        labels = labels.reshape((train.nnz, 1 + num_negatives))
+
+        # Each positive is followed by negatives of the same user
+        self.assertTrue(np.all(labels[:, 0] == 1) and np.all(labels[:, 1:] == 0))
+        self.assertTrue(np.all(user_input == user_input[:, 0:1]))
+        self.assertTrue(np.all(train[user_input[:, 0], item_input[:, 0]].A1 == 1.0))
+
+        negative_value = train[user_input[:, 1:].ravel(), item_input[:, 1:].ravel()].A1
+        self.assertTrue(np.all(negative_value == 0.0), "Some negative items are positive for the user")
+
+
+if __name__ == '__main__':
+    unittest.main()
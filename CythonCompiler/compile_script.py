@@ -33,9 +33,60 @@ del sys.argv[1]
 
 extensionName = re.sub("\.pyx", "", fileToCompile)
 
+
+def openmp_is_supported(openmp_flag):
+    """
+    Checks whether the C compiler used by setup accepts the OpenMP flag, e.g., Apple clang does not
+    :param openmp_flag:
+    :return:
+    """
+
+    import os, tempfile, shutil
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+    from distutils.errors import CompileError, LinkError
+
+    compiler = new_compiler()
+    customize_compiler(compiler)
+
+    temp_folder = tempfile.mkdtemp()
+
+    try:
+        test_file = os.path.join(temp_folder, "openmp_test.c")
+
+        with open(test_file, "w") as file:
+            file.write("#include <omp.h>\nint main(void) { return omp_get_num_threads(); }\n")
+
+        objects = compiler.compile([test_file], output_dir=temp_folder, extra_postargs=[openmp_flag])
+        compiler.link_executable(objects, os.path.join(temp_folder, "openmp_test"), extra_postargs=[openmp_flag])
+
+    except (CompileError, LinkError):
+        return False
+
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+    return True
+
+
+# OpenMP is required by the parallel (prange) sections, MSVC uses a different flag
+# If the compiler does not support it the prange loops are executed by a single thread
+# Modules not using prange are not affected
+if sys.platform == "win32":
+    openmp_compile_args = ['/openmp']
+    openmp_link_args = []
+elif openmp_is_supported('-fopenmp'):
+    openmp_compile_args = ['-fopenmp']
+    openmp_link_args = ['-fopenmp']
+else:
+    print("compile_script: the compiler does not support OpenMP, the parallel sections will use a single thread")
+    openmp_compile_args = []
+    openmp_link_args = []
+
 ext_modules = Extension(extensionName,
                         [fileToCompile],
-                        extra_compile_args=['-O2'],
+                        extra_compile_args=['-O2'] + openmp_compile_args,
+                        extra_link_args=openmp_link_args,
                         include_dirs=[numpy.get_include(), ],
                         )
 
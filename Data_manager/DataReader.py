@@ -10,6 +10,14 @@ import scipy.sparse as sps
 import numpy as np
 import pickle, os
 
+from Data_manager.load_and_save_data import save_sparse_matrix_binary, load_sparse_matrix_binary, \
+    save_mapper_binary, load_mapper_binary
+
+
+# Errors raised when previously saved data is missing, incomplete, corrupted or does not pass the consistency check,
+# in which case it is loaded again from the next source
+CACHE_LOADING_EXCEPTIONS = (OSError, EOFError, KeyError, ValueError, AssertionError, pickle.UnpicklingError)
+
 
 #################################################################################################################
 #############################
@@ -25,14 +33,18 @@ class DataReader(object):
      - It loads the data of the original dataset and saves it into sparse matrices
      - It exposes the following functions
         - load_data(save_folder_path = None)        loads the data and saves into the specified folder, if None uses default, if False des not save
-        - get_URM_all()                             returns a copy of the whole URM
-        - get_ICM_from_name(ICM_name)               returns a copy of the specified ICM
+        - get_URM_all(copy = True)                  returns a copy of the whole URM
+        - get_ICM_from_name(ICM_name, copy = True)  returns a copy of the specified ICM
         - get_loaded_ICM_names()                    returns a copy of the loaded ICM names, which can be used in get_ICM_from_name
-        - get_loaded_ICM_dict()                     returns a copy of the loaded ICM in a dictionary [ICM_name]->ICM_sparse
+        - get_loaded_ICM_dict(copy = True)          returns a copy of the loaded ICM in a dictionary [ICM_name]->ICM_sparse
         - DATASET_SUBFOLDER_DEFAULT                 path of the data folder
         - item_original_ID_to_index
         - user_original_ID_to_index
 
+    The matrices loaded from the binary cache are read-only memory maps shared among processes. With copy = False
+    the getters return a read-only view of the loaded matrices instead of a copy, whether they have been loaded
+    from the binary cache or from the original files.
+
     """
     DATASET_SPLIT_ROOT_FOLDER = "Data_manager_split_datasets/"
     DATASET_OFFLINE_ROOT_FOLDER = "Data_manager_offline_datasets/"
@@ -55,6 +67,10 @@ class DataReader(object):
     # This flag specifies if the given dataset contains implicit preferences or explicit ratings
     IS_IMPLICIT = False
 
+    # Version of the binary cache format, caches with a different version are ignored and built again
+    BINARY_CACHE_VERSION = 1
+    BINARY_CACHE_METADATA_FILE_NAME = "binary_cache_metadata"
+
     def __init__(self, reload_from_original_data=False, ICM_to_load_list=None):
 
         super(DataReader, self).__init__()
@@ -79,11 +95,26 @@ class DataReader(object):
     def _get_dataset_name(self):
         return self._get_dataset_name_root()[:-1]
 
-    def get_ICM_from_name(self, ICM_name):
-        return getattr(self, ICM_name).copy()
+    def get_ICM_from_name(self, ICM_name, copy=True):
+        return self._get_matrix(ICM_name, copy)
+
+    def get_URM_from_name(self, URM_name, copy=True):
+        return self._get_matrix(URM_name, copy)
+
+    def _get_matrix(self, matrix_name, copy):
 
-    def get_URM_from_name(self, URM_name):
-        return getattr(self, URM_name).copy()
+        X = getattr(self, matrix_name)
+
+        if copy or X.getformat() not in ["csr", "csc"]:
+            return X.copy()
+
+        # The view shares the arrays of the loaded matrix, which is not modified
+        X_view = X.__class__((X.data.view(), X.indices.view(), X.indptr.view()), shape=X.shape, copy=False)
+
+        for array in [X_view.data, X_view.indices, X_view.indptr]:
+            array.flags.writeable = False
+
+        return X_view
 
     def get_ICM_feature_to_index_mapper_from_name(self, ICM_name):
         return getattr(self, "tokenToFeatureMapper_" + ICM_name).copy()
@@ -97,17 +128,17 @@ class DataReader(object):
     def get_loaded_URM_names(self):
         return self.AVAILABLE_URM.copy()
 
-    def get_loaded_ICM_dict(self):
+    def get_loaded_ICM_dict(self, copy=True):
 
         ICM_dict = {}
 
         for ICM_name in self.get_loaded_ICM_names():
-            ICM_dict[ICM_name] = self.get_ICM_from_name(ICM_name)
+            ICM_dict[ICM_name] = self.get_ICM_from_name(ICM_name, copy=copy)
 
         return ICM_dict
 
-    def get_URM_all(self):
-        return self.URM_all.copy()
+    def get_URM_all(self, copy=True):
+        return self.get_URM_from_name("URM_all", copy=copy)
 
     def print_statistics(self):
 
@@ -190,6 +221,22 @@ class DataReader(object):
         # If save_folder_path contains any path try to load a previously built split from it
         if save_folder_path is not False and not self.reload_from_original_data:
 
+            try:
+
+                self._load_from_binary_cache(save_folder_path)
+
+                print("DataReader: verifying data consistency...")
+                self._verify_data_consistency()
+                print("DataReader: verifying data consistency... Passed!")
+
+                self.print_statistics()
+                return
+
+            except CACHE_LOADING_EXCEPTIONS as exception:
+
+                print("DataReader: Binary cache not found or not valid ({}), looking for compressed preloaded data...".format(
+                    repr(exception)))
+
             try:
 
                 self._load_from_saved_sparse_matrix(save_folder_path)
@@ -198,13 +245,16 @@ class DataReader(object):
                 self._verify_data_consistency()
                 print("DataReader: verifying data consistency... Passed!")
 
+                # Data saved by older versions, save it in the binary cache so that it is used from now on
+                self._save_binary_cache(save_folder_path)
+
                 self.print_statistics()
                 return
 
-            except:
+            except CACHE_LOADING_EXCEPTIONS as exception:
 
-                print("DataReader: Preloaded data not found, reading from original files...")
-                pass
+                print("DataReader: Preloaded data not found or not valid ({}), reading from original files...".format(
+                    repr(exception)))
 
         self._load_from_original_file()
 
@@ -222,23 +272,16 @@ class DataReader(object):
             else:
                 print("DataReader: Found already existing folder '{}'".format(save_folder_path))
 
-            for URM_name in self.get_loaded_URM_names():
-                print("DataReader: Saving {}...".format(URM_name))
-                sps.save_npz(save_folder_path + "{}.npz".format(URM_name), self.get_URM_from_name(URM_name))
-
-            for ICM_name in self.get_loaded_ICM_names():
-                print("DataReader: Saving {}...".format(ICM_name))
-                sps.save_npz(save_folder_path + "{}.npz".format(ICM_name), self.get_ICM_from_name(ICM_name))
+            self._save_binary_cache(save_folder_path)
 
-        self._save_mappers(save_folder_path)
-
-        print("DataReader: Saving complete!")
+            print("DataReader: Saving complete!")
 
         self.print_statistics()
 
     def _verify_data_consistency(self):
 
-        URM_all = self.get_URM_all()
+        # The checks only read the matrices
+        URM_all = self.get_URM_all(copy=False)
         n_users, n_items_URM = URM_all.shape
         n_interactions = URM_all.nnz
 
@@ -271,8 +314,8 @@ class DataReader(object):
             self.user_original_ID_to_index.values()))).all(), "DataReader consistency check: there exist users with interactions that do not have a mapper entry"
 
         for ICM_name in self.get_loaded_ICM_names():
-            ICM_object = self.get_ICM_from_name(ICM_name)
-            feature_original_id_to_index = self.get_ICM_feature_to_index_mapper_from_name(ICM_name)
+            ICM_object = self.get_ICM_from_name(ICM_name, copy=False)
+            feature_original_id_to_index = getattr(self, "tokenToFeatureMapper_" + ICM_name)
 
             n_items_ICM, n_features = ICM_object.shape
             n_feature_occurrences = ICM_object.nnz
@@ -324,13 +367,7 @@ class DataReader(object):
 
         print("DataReader: Loading complete!")
 
-    def _save_mappers(self, save_folder_path):
-        """
-        Saves the mappers for the given dataset. Mappers associate the original ID of user, item, feature, to the
-        index in the sparse matrix
-        :param dataset_specific_mappers_list:
-        :return:
-        """
+    def _get_mapper_names(self):
 
         mappers_list = list(self.GLOBAL_MAPPER)
         mappers_list.extend(self.DATASET_SPECIFIC_MAPPER)
@@ -338,23 +375,58 @@ class DataReader(object):
         for ICM_name in self.get_loaded_ICM_names():
             mappers_list.append("tokenToFeatureMapper_{}".format(ICM_name))
 
-        for mapper_name in mappers_list:
-            mapper_data = self.__getattribute__(mapper_name)
-            pickle.dump(mapper_data, open(save_folder_path + mapper_name, "wb"), protocol=pickle.HIGHEST_PROTOCOL)
+        return mappers_list
 
-    def _load_mappers(self, save_folder_path):
+    def _save_binary_cache(self, save_folder_path):
         """
-        Loads all saved mappers for the given dataset. Mappers are the union of GLOBAL mappers and dataset specific ones
+        Saves the URMs, ICMs and mappers as uncompressed arrays, which are loaded memory-mapped by _load_from_binary_cache
+        so that processes loading the same dataset share the page-cached copy.
+        The metadata file is written last, so that an interrupted save is never loaded
+        :param save_folder_path:
         :return:
         """
 
-        mappers_list = list(self.GLOBAL_MAPPER)
-        mappers_list.extend(self.DATASET_SPECIFIC_MAPPER)
+        metadata = {"version": self.BINARY_CACHE_VERSION,
+                    "matrices": {},
+                    "mappers": {}}
 
-        for ICM_name in self.get_loaded_ICM_names():
-            mappers_list.append("tokenToFeatureMapper_{}".format(ICM_name))
+        for matrix_name in self.get_loaded_URM_names() + self.get_loaded_ICM_names():
+            print("DataReader: Saving {}...".format(matrix_name))
+            metadata["matrices"][matrix_name] = save_sparse_matrix_binary(save_folder_path, matrix_name,
+                                                                          getattr(self, matrix_name))
+
+        for mapper_name in self._get_mapper_names():
+            metadata["mappers"][mapper_name] = save_mapper_binary(save_folder_path, mapper_name,
+                                                                  getattr(self, mapper_name))
+
+        pickle.dump(metadata, open(save_folder_path + self.BINARY_CACHE_METADATA_FILE_NAME, "wb"),
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _load_from_binary_cache(self, save_folder_path):
+
+        metadata = pickle.load(open(save_folder_path + self.BINARY_CACHE_METADATA_FILE_NAME, "rb"))
+
+        assert metadata["version"] == self.BINARY_CACHE_VERSION, \
+            "DataReader: binary cache version is {}, required is {}".format(metadata["version"], self.BINARY_CACHE_VERSION)
+
+        for matrix_name in self.get_loaded_URM_names() + self.get_loaded_ICM_names():
+            print("DataReader: Loading {}...".format(save_folder_path + matrix_name))
+            self.__setattr__(matrix_name, load_sparse_matrix_binary(save_folder_path, matrix_name,
+                                                                    metadata["matrices"][matrix_name]))
+
+        for mapper_name in self._get_mapper_names():
+            self.__setattr__(mapper_name, load_mapper_binary(save_folder_path, mapper_name,
+                                                             metadata["mappers"][mapper_name]))
+
+        print("DataReader: Loading complete!")
+
+    def _load_mappers(self, save_folder_path):
+        """
+        Loads all saved mappers for the given dataset. Mappers are the union of GLOBAL mappers and dataset specific ones
+        :return:
+        """
 
-        for mapper_name in mappers_list:
+        for mapper_name in self._get_mapper_names():
             self.__setattr__(mapper_name, pickle.load(open(save_folder_path + mapper_name, "rb")))
 
     def _merge_ICM(self, ICM1, ICM2, mapper_ICM1, mapper_ICM2):
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest, tempfile, shutil, os
+
+import numpy as np
+import scipy.sparse as sps
+
+from Data_manager.DataReader import DataReader
+
+
+class _SyntheticReader(DataReader):
+
+    AVAILABLE_ICM = ["ICM_all"]
+
+    def __init__(self, **key_args):
+        super(_SyntheticReader, self).__init__(**key_args)
+        self.n_loads_from_original_file = 0
+
+    def _get_dataset_name_root(self):
+        return "Synthetic/"
+
+    def _load_from_original_file(self):
+
+        self.n_loads_from_original_file += 1
+
+        self.URM_all = sps.random(40, 30, density=0.2, format="csr", random_state=42)
+        self.ICM_all = sps.random(30, 10, density=0.3, format="csr", random_state=42)
+
+        self.user_original_ID_to_index = {"user_{}".format(index): index for index in range(40)}
+        self.item_original_ID_to_index = {index * 10: index for index in range(30)}
+        self.tokenToFeatureMapper_ICM_all = {"feature_{}".format(index): index for index in range(10)}
+
+
+class MyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.save_folder_path = tempfile.mkdtemp() + "/"
+
+    def tearDown(self):
+        shutil.rmtree(self.save_folder_path, ignore_errors=True)
+
+    def test_binary_cache(self):
+
+        data_reader = _SyntheticReader()
+        data_reader.load_data(save_folder_path=self.save_folder_path)
+
+        data_reader_cached = _SyntheticReader()
+        data_reader_cached.load_data(save_folder_path=self.save_folder_path)
+
+        self.assertEqual(data_reader_cached.n_loads_from_original_file, 0)
+
+        self.assertTrue(np.array_equal(data_reader_cached.get_URM_all().toarray(), data_reader.get_URM_all().toarray()))
+        self.assertTrue(np.array_equal(data_reader_cached.get_ICM_from_name("ICM_all").toarray(),
+                                       data_reader.get_ICM_from_name("ICM_all").toarray()))
+
+        self.assertEqual(data_reader_cached.item_original_ID_to_index, data_reader.item_original_ID_to_index)
+        self.assertEqual(data_reader_cached.user_original_ID_to_index, data_reader.user_original_ID_to_index)
+
+        # Data loaded from the binary cache or from the original files behave the same
+        for loaded_data_reader in [data_reader_cached, data_reader]:
+
+            # By default a copy, which can be modified
+            URM_all = loaded_data_reader.get_URM_all()
+            URM_all.data[:] = 0.0
+            URM_all.eliminate_zeros()
+
+            self.assertTrue(URM_all.data.flags.writeable)
+            self.assertEqual(loaded_data_reader.URM_all.nnz, data_reader.URM_all.nnz)
+
+            # Otherwise a read-only view of the loaded data, not a copy
+            for X_view, X in [(loaded_data_reader.get_URM_all(copy=False), loaded_data_reader.URM_all),
+                              (loaded_data_reader.get_loaded_ICM_dict(copy=False)["ICM_all"], loaded_data_reader.ICM_all)]:
+
+                self.assertTrue(np.shares_memory(X_view.data, X.data))
+
+                with self.assertRaises(ValueError):
+                    X_view.data[0] = 0.0
+
+            self.assertTrue(np.array_equal(loaded_data_reader.URM_all.toarray(), data_reader.URM_all.toarray()))
+
+        # The arrays of the data loaded from the original files are still writeable
+        self.assertTrue(data_reader.URM_all.data.flags.writeable)
+
+    def test_corrupted_binary_cache(self):
+
+        data_reader = _SyntheticReader()
+        data_reader.load_data(save_folder_path=self.save_folder_path)
+
+        os.remove(self.save_folder_path + "URM_all_indices.npy")
+
+        data_reader = _SyntheticReader()
+        data_reader.load_data(save_folder_path=self.save_folder_path)
+
+        self.assertEqual(data_reader.n_loads_from_original_file, 1)
+
+        # The binary cache has been saved again
+        data_reader = _SyntheticReader()
+        data_reader.load_data(save_folder_path=self.save_folder_path)
+
+        self.assertEqual(data_reader.n_loads_from_original_file, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
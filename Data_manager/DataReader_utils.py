@@ -7,47 +7,106 @@ Created on 22/11/18
 """
 
 import numpy as np
+import pandas as pd
+import csv, io, itertools
 
 from Data_manager.IncrementalSparseMatrix import IncrementalSparseMatrix
 
 
-def load_CSV_into_SparseBuilder(filePath, header=False, separator="::"):
-    matrixBuilder = IncrementalSparseMatrix(auto_create_col_mapper=True, auto_create_row_mapper=True)
+def read_CSV_in_chunks(filePath, separator, header=False, n_columns=3, chunk_size=1000000, encoding=None):
+    """
+    Reads the first n_columns fields of a CSV file in chunks of rows with the vectorized pandas C parser.
+    All fields are read as strings without any quoting or NaN conversion, missing fields are empty strings
+    and empty lines are skipped.
+    Separators longer than one character, e.g., "::", are not supported by the C parser,
+    so they are replaced by a single character in each chunk of lines before parsing
+    :param filePath:
+    :param separator:
+    :param header:      if True the first line is skipped
+    :param n_columns:
+    :param chunk_size:  number of lines in each chunk
+    :param encoding:
+    :return: generator of DataFrames with columns 0, ..., n_columns-1
+    """
 
-    fileHandle = open(filePath, "r")
-    numCells = 0
+    read_csv_kwargs = {"header": None,
+                       "names": list(range(n_columns)),
+                       "usecols": list(range(n_columns)),
+                       "index_col": False,
+                       "dtype": str,
+                       "na_filter": False,
+                       "quoting": csv.QUOTE_NONE,
+                       "skip_blank_lines": True}
+
+    if len(separator) == 1:
+
+        chunk_iterator = pd.read_csv(filePath, sep=separator, skiprows=1 if header else 0, chunksize=chunk_size,
+                                     encoding=encoding, **read_csv_kwargs)
+
+        for chunk in chunk_iterator:
+            yield chunk
+
+        return
+
+    # ASCII unit separator, used in place of the multi-character separator
+    replacement_separator = "\x1f"
+
+    with open(filePath, "r", encoding=encoding) as fileHandle:
+
+        if header:
+            fileHandle.readline()
 
-    if header:
-        fileHandle.readline()
+        while True:
+            line_list = list(itertools.islice(fileHandle, chunk_size))
 
-    for line in fileHandle:
-        numCells += 1
-        if (numCells % 1000000 == 0):
-            print("Processed {} cells".format(numCells))
+            if len(line_list) == 0:
+                break
 
-        if (len(line)) > 1:
-            line = line.split(separator)
+            chunk_text = "".join(line_list).replace(separator, replacement_separator)
 
-            line[-1] = line[-1].replace("\n", "")
+            yield pd.read_csv(io.StringIO(chunk_text), sep=replacement_separator, **read_csv_kwargs)
 
-            try:
-                user_id = line[0]
-                item_id = line[1]
 
-                try:
-                    value = float(line[2])
+def parse_URM_chunk(chunk, caller_name, remove_zeros=True):
+    """
+    Parses a chunk of 'user_id, item_id, value' rows read by read_CSV_in_chunks
+    :param chunk:
+    :param caller_name:     used in the messages about the rows that cannot be parsed
+    :param remove_zeros:    if True the rows with value 0.0 are removed
+    :return: user_id, item_id and value arrays of the valid rows
+    """
+
+    value_array = pd.to_numeric(chunk[2].str.strip(), errors="coerce").values
+
+    # Missing values are empty strings, as the rows with less than 3 fields
+    valid_rows = np.logical_not(np.isnan(value_array))
+
+    n_invalid_rows = len(valid_rows) - valid_rows.sum()
+
+    if n_invalid_rows > 0:
+        print("{}: Cannot parse as float value or missing fields in {} rows, first is '{}'".format(
+            caller_name, n_invalid_rows, chunk.values[np.logical_not(valid_rows)][0].tolist()))
+
+    if remove_zeros:
+        valid_rows = np.logical_and(valid_rows, value_array != 0.0)
 
-                    if value != 0.0:
-                        matrixBuilder.add_data_lists([user_id], [item_id], [value])
+    return chunk[0].values[valid_rows], chunk[1].values[valid_rows], value_array[valid_rows]
+
+
+def load_CSV_into_SparseBuilder(filePath, header=False, separator="::"):
+    matrixBuilder = IncrementalSparseMatrix(auto_create_col_mapper=True, auto_create_row_mapper=True)
+
+    numCells = 0
 
-                except ValueError:
-                    print("load_CSV_into_SparseBuilder: Cannot parse as float value '{}'".format(line[2]))
+    # The file is parsed and added to the builder in chunks of rows
+    for chunk in read_CSV_in_chunks(filePath, separator, header=header, n_columns=3):
 
+        user_id_array, item_id_array, value_array = parse_URM_chunk(chunk, "load_CSV_into_SparseBuilder")
 
-            except IndexError:
-                print("load_CSV_into_SparseBuilder: Index out of bound in line '{}'".format(line))
+        matrixBuilder.add_data_lists(user_id_array, item_id_array, value_array)
 
-    fileHandle.close()
+        numCells += len(chunk)
+        print("Processed {} cells".format(numCells))
 
     return matrixBuilder.get_SparseMatrix(), matrixBuilder.get_column_token_to_id_mapper(), matrixBuilder.get_row_token_to_id_mapper()
 
@@ -129,6 +129,7 @@ class IncrementalSparseMatrix_ListBased(object):
 
 
 import numpy as np
+import pandas as pd
 
 
 class IncrementalSparseMatrix(IncrementalSparseMatrix_ListBased):
@@ -141,7 +142,8 @@ class IncrementalSparseMatrix(IncrementalSparseMatrix_ListBased):
                                                       n_rows=n_rows,
                                                       n_cols=n_cols)
 
-        self._dataBlock = 10000000
+        # Initial capacity, the arrays grow geometrically when needed
+        self._dataBlock = 1000000
         self._next_cell_pointer = 0
 
         self._dtype_data = dtype
@@ -155,28 +157,114 @@ class IncrementalSparseMatrix(IncrementalSparseMatrix_ListBased):
     def get_nnz(self):
         return self._next_cell_pointer
 
+    def _ensure_capacity(self, n_new_cells):
+        """
+        Grows the arrays geometrically to make room for n_new_cells more cells
+        :param n_new_cells:
+        :return:
+        """
+
+        required_capacity = self._next_cell_pointer + n_new_cells
+
+        if required_capacity <= len(self._row_array):
+            return
+
+        new_capacity = max(required_capacity, 2 * len(self._row_array))
+
+        for array_name in ["_row_array", "_col_array", "_data_array"]:
+            old_array = getattr(self, array_name)
+            new_array = np.zeros(new_capacity, dtype=old_array.dtype)
+            new_array[:self._next_cell_pointer] = old_array[:self._next_cell_pointer]
+            setattr(self, array_name, new_array)
+
+    def _get_index_array(self, token_list, original_ID_to_index, add_new_tokens):
+        """
+        Vectorized equivalent of _get_row_index and _get_column_index.
+        The mapper is accessed once for each unique token instead of once for each data point.
+        New tokens receive consecutive indices in order of first appearance, as in the element-wise version
+        :param token_list:              list or array of original IDs
+        :param original_ID_to_index:    mapper dictionary, modified in place if new tokens are added
+        :param add_new_tokens:          if False the tokens not in the mapper are not added
+        :return: array of indices, -1 for the tokens which are not in the mapper and have not been added
+        """
+
+        if len(token_list) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Lists are wrapped as object arrays, converting strings to a numpy string dtype is much slower
+        if isinstance(token_list, np.ndarray):
+            token_array = token_list
+        else:
+            token_array = np.array(token_list, dtype=object)
+
+        # Hash based, the unique tokens are in order of first appearance
+        token_to_unique, unique_token_array = pd.factorize(token_array)
+
+        # NaN and None have no unique token, their code is -1 which would select another token
+        if np.any(token_to_unique == -1):
+            raise ValueError("IncrementalSparseMatrix: {} IDs are NaN or None, they cannot be mapped to an index".format(
+                np.sum(token_to_unique == -1)))
+
+        # Convert to python objects to look up and store the same keys as the element-wise version
+        unique_token_list = unique_token_array.tolist()
+
+        unique_index_array = np.array([original_ID_to_index.get(token, -1) for token in unique_token_list],
+                                      dtype=np.int64)
+
+        if add_new_tokens:
+            new_token_position = np.nonzero(unique_index_array == -1)[0]
+
+            unique_index_array[new_token_position] = len(original_ID_to_index) + np.arange(len(new_token_position))
+
+            for position in new_token_position:
+                original_ID_to_index[unique_token_list[position]] = int(unique_index_array[position])
+
+        return unique_index_array[token_to_unique]
+
+    def _get_row_index_array(self, row_list):
+
+        if not self._auto_create_row_mapper:
+            return np.asarray(row_list)
+
+        return self._get_index_array(row_list, self._row_original_ID_to_index, True)
+
+    def _get_column_index_array(self, col_list):
+
+        if not self._auto_create_column_mapper:
+            return np.asarray(col_list)
+
+        return self._get_index_array(col_list, self._column_original_ID_to_index, True)
+
     def add_data_lists(self, row_list_to_add, col_list_to_add, data_list_to_add):
+        """
+        Adds the data points in bulk, the arguments can be either lists or numpy arrays.
+        Feeding large chunks is much faster than adding few data points at a time
+        :param row_list_to_add:     row IDs, or row indices if the row mapper is not used
+        :param col_list_to_add:     column IDs, or column indices if the column mapper is not used
+        :param data_list_to_add:
+        :return:
+        """
 
         assert len(row_list_to_add) == len(col_list_to_add) and len(row_list_to_add) == len(data_list_to_add), \
             "IncrementalSparseMatrix: element lists must have the same length"
 
-        for data_point_index in range(len(row_list_to_add)):
+        row_index_array = self._get_row_index_array(row_list_to_add)
+        col_index_array = self._get_column_index_array(col_list_to_add)
+        data_array = np.asarray(data_list_to_add)
+
+        self._append_index_arrays(row_index_array, col_index_array, data_array)
+
+    def _append_index_arrays(self, row_index_array, col_index_array, data_array):
 
-            if self._next_cell_pointer == len(self._row_array):
-                self._row_array = np.concatenate(
-                    (self._row_array, np.zeros(self._dataBlock, dtype=self._dtype_coordinates)))
-                self._col_array = np.concatenate(
-                    (self._col_array, np.zeros(self._dataBlock, dtype=self._dtype_coordinates)))
-                self._data_array = np.concatenate((self._data_array, np.zeros(self._dataBlock, dtype=self._dtype_data)))
+        n_new_cells = len(row_index_array)
 
-            row_index = self._get_row_index(row_list_to_add[data_point_index])
-            col_index = self._get_column_index(col_list_to_add[data_point_index])
+        self._ensure_capacity(n_new_cells)
 
-            self._row_array[self._next_cell_pointer] = row_index
-            self._col_array[self._next_cell_pointer] = col_index
-            self._data_array[self._next_cell_pointer] = data_list_to_add[data_point_index]
+        self._row_array[self._next_cell_pointer:self._next_cell_pointer + n_new_cells] = row_index_array
+        self._col_array[self._next_cell_pointer:self._next_cell_pointer + n_new_cells] = col_index_array
+        self._data_array[self._next_cell_pointer:self._next_cell_pointer + n_new_cells] = data_array
 
-            self._next_cell_pointer += 1
+        self._next_cell_pointer += n_new_cells
 
     def add_single_row(self, row_index, col_list, data=1.0):
 
@@ -300,29 +388,25 @@ class IncrementalSparseMatrix_FilterIDs(IncrementalSparseMatrix):
 
         return row_index
 
+    def _get_row_index_array(self, row_list):
+        return self._get_index_array(row_list, self._row_original_ID_to_index, self._on_new_row_add_flag)
+
+    def _get_column_index_array(self, col_list):
+        return self._get_index_array(col_list, self._column_original_ID_to_index, self._on_new_col_add_flag)
+
     def add_data_lists(self, row_list_to_add, col_list_to_add, data_list_to_add):
 
         assert len(row_list_to_add) == len(col_list_to_add) and len(row_list_to_add) == len(data_list_to_add), \
             "IncrementalSparseMatrix: element lists must have different length"
 
-        for data_point_index in range(len(row_list_to_add)):
-
-            if self._next_cell_pointer == len(self._row_array):
-                self._row_array = np.concatenate(
-                    (self._row_array, np.zeros(self._dataBlock, dtype=self._dtype_coordinates)))
-                self._col_array = np.concatenate(
-                    (self._col_array, np.zeros(self._dataBlock, dtype=self._dtype_coordinates)))
-                self._data_array = np.concatenate((self._data_array, np.zeros(self._dataBlock, dtype=self._dtype_data)))
-
-            row_index = self._get_row_index(row_list_to_add[data_point_index])
-            col_index = self._get_column_index(col_list_to_add[data_point_index])
+        row_index_array = self._get_row_index_array(row_list_to_add)
+        col_index_array = self._get_column_index_array(col_list_to_add)
+        data_array = np.asarray(data_list_to_add)
 
-            if row_index is not None and col_index is not None:
-                self._row_array[self._next_cell_pointer] = row_index
-                self._col_array[self._next_cell_pointer] = col_index
-                self._data_array[self._next_cell_pointer] = data_list_to_add[data_point_index]
+        # Remove the data points whose IDs have been ignored
+        valid_mask = np.logical_and(row_index_array != -1, col_index_array != -1)
 
-                self._next_cell_pointer += 1
+        self._append_index_arrays(row_index_array[valid_mask], col_index_array[valid_mask], data_array[valid_mask])
 
     def get_SparseMatrix(self):
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+
+from Data_manager.IncrementalSparseMatrix import IncrementalSparseMatrix, IncrementalSparseMatrix_ListBased
+
+
+class MyTestCase(unittest.TestCase):
+
+    def test_add_data_lists_same_as_element_wise(self):
+
+        n_points = 1000
+
+        row_list = ["user_{}".format(token) for token in np.random.randint(0, 50, n_points)]
+        col_list = ["item_{}".format(token) for token in np.random.randint(0, 80, n_points)]
+        data_list = np.random.rand(n_points).tolist()
+
+        matrix_builder = IncrementalSparseMatrix(auto_create_row_mapper=True, auto_create_col_mapper=True)
+        matrix_builder.add_data_lists(row_list[:500], col_list[:500], data_list[:500])
+        matrix_builder.add_data_lists(row_list[500:], col_list[500:], data_list[500:])
+
+        matrix_builder_list_based = IncrementalSparseMatrix_ListBased(auto_create_row_mapper=True, auto_create_col_mapper=True)
+        matrix_builder_list_based.add_data_lists(row_list, col_list, data_list)
+
+        self.assertEqual(matrix_builder.get_row_token_to_id_mapper(), matrix_builder_list_based.get_row_token_to_id_mapper())
+        self.assertEqual(matrix_builder.get_column_token_to_id_mapper(), matrix_builder_list_based.get_column_token_to_id_mapper())
+
+        difference = matrix_builder.get_SparseMatrix() - matrix_builder_list_based.get_SparseMatrix()
+        self.assertTrue(np.allclose(difference.data, 0.0))
+
+    def test_add_data_lists_NaN_IDs(self):
+
+        matrix_builder = IncrementalSparseMatrix(auto_create_row_mapper=True, auto_create_col_mapper=True)
+
+        with self.assertRaises(ValueError):
+            matrix_builder.add_data_lists(["user_0", np.nan, "user_1"], ["item_0", "item_1", "item_2"], [1.0, 1.0, 1.0])
+
+        with self.assertRaises(ValueError):
+            matrix_builder.add_data_lists(["user_0", None, "user_2"], ["item_0", "item_1", "item_2"], [1.0, 1.0, 1.0])
+
+        with self.assertRaises(ValueError):
+            matrix_builder.add_data_lists(np.array([1.0, 2.0, np.nan]), np.array([0.0, 1.0, 2.0]), [1.0, 1.0, 1.0])
+
+        # Nothing has been added
+        self.assertEqual(matrix_builder.get_nnz(), 0)
+        self.assertEqual(len(matrix_builder.get_row_token_to_id_mapper()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
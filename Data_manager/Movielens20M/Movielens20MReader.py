@@ -9,7 +9,7 @@ Created on 14/09/17
 import zipfile
 
 from Data_manager.DataReader import DataReader
-from Data_manager.DataReader_utils import downloadFromURL
+from Data_manager.DataReader_utils import downloadFromURL, read_CSV_in_chunks, parse_URM_chunk
 
 
 def _loadURM_preinitialized_item_id(filePath, header=False, separator="::",
@@ -23,35 +23,17 @@ def _loadURM_preinitialized_item_id(filePath, header=False, separator="::",
                                                     preinitialized_row_mapper=user_original_ID_to_index,
                                                     on_new_row=if_new_user)
 
-    fileHandle = open(filePath, "r")
     numCells = 0
 
-    if header:
-        fileHandle.readline()
-
-    for line in fileHandle:
-        numCells += 1
-        if (numCells % 1000000 == 0):
-            print("Processed {} cells".format(numCells))
-
-        if (len(line)) > 1:
-            line = line.split(separator)
-
-            line[-1] = line[-1].replace("\n", "")
+    # The data points are parsed and added to the builder in chunks
+    for chunk in read_CSV_in_chunks(filePath, separator, header=header, n_columns=3):
 
-        user_id = line[0]
-        item_id = line[1]
+        user_id_array, item_id_array, value_array = parse_URM_chunk(chunk, "_loadURM_preinitialized_item_id")
 
-        try:
-            value = float(line[2])
-
-            if value != 0.0:
-                URM_builder.add_data_lists([user_id], [item_id], [value])
+        URM_builder.add_data_lists(user_id_array, item_id_array, value_array)
 
-        except:
-            pass
-
-    fileHandle.close()
+        numCells += len(chunk)
+        print("Processed {} cells".format(numCells))
 
     return URM_builder.get_SparseMatrix(), URM_builder.get_column_token_to_id_mapper(), URM_builder.get_row_token_to_id_mapper()
 
@@ -57,6 +57,10 @@ class NetflixPrizeReader(DataReader):
         numCells = 0
         URM_builder = IncrementalSparseMatrix(auto_create_col_mapper=True, auto_create_row_mapper=True)
 
+        # The data points are added to the builder in chunks
+        chunk_size = 1000000
+        user_id_list, movie_id_list, rating_list = [], [], []
+
         for current_split in [1, 2, 3, 4]:
 
             current_split_path = self.dataFile.extract("combined_data_{}.txt".format(current_split),
@@ -82,7 +86,13 @@ class NetflixPrizeReader(DataReader):
 
                         user_id = line_split[0]
 
-                        URM_builder.add_data_lists([user_id], [currentMovie_id], [float(line_split[1])])
+                        user_id_list.append(user_id)
+                        movie_id_list.append(currentMovie_id)
+                        rating_list.append(float(line_split[1]))
+
+                        if len(user_id_list) == chunk_size:
+                            URM_builder.add_data_lists(user_id_list, movie_id_list, rating_list)
+                            user_id_list, movie_id_list, rating_list = [], [], []
 
                         numCells += 1
 
@@ -102,6 +112,9 @@ class NetflixPrizeReader(DataReader):
 
             fileHandle.close()
 
+            URM_builder.add_data_lists(user_id_list, movie_id_list, rating_list)
+            user_id_list, movie_id_list, rating_list = [], [], []
+
             print("NetflixPrizeReader: cleaning temporary files")
 
             import shutil
@@ -7,6 +7,7 @@ Created on 20/02/19
 """
 
 import pickle
+import numpy as np
 import scipy.sparse as sps
 from pandas import DataFrame
 import pandas as pd
@@ -108,3 +109,94 @@ def load_data_dict(splitted_data_path, file_name_prefix):
         loaded_data_dict["ICM_dict"] = ICM_dict
 
     return loaded_data_dict
+
+
+
+def save_sparse_matrix_binary(folder_path, file_name, X):
+    """
+    Saves the data structures of a sparse matrix as uncompressed .npy arrays, which can be loaded memory-mapped
+    :param folder_path:
+    :param file_name:
+    :param X:
+    :return: dictionary with the metadata required by load_sparse_matrix_binary
+    """
+
+    if X.getformat() not in ["csr", "csc"]:
+        X = sps.csr_matrix(X)
+
+    for array_name in ["data", "indices", "indptr"]:
+        np.save(folder_path + "{}_{}.npy".format(file_name, array_name), getattr(X, array_name), allow_pickle=False)
+
+    return {"format": X.getformat(), "shape": X.shape}
+
+
+def load_sparse_matrix_binary(folder_path, file_name, metadata, mmap_mode="r"):
+    """
+    Loads a sparse matrix saved with save_sparse_matrix_binary
+    :param folder_path:
+    :param file_name:
+    :param metadata:    as returned by save_sparse_matrix_binary
+    :param mmap_mode:   if "r" the arrays are memory-mapped read-only, hence shared among processes, if None they are
+                        loaded in memory
+    :return:
+    """
+
+    array_dict = {}
+
+    for array_name in ["data", "indices", "indptr"]:
+        array_dict[array_name] = np.load(folder_path + "{}_{}.npy".format(file_name, array_name),
+                                         mmap_mode=mmap_mode, allow_pickle=False)
+
+    if metadata["format"] == "csr":
+        constructor = sps.csr_matrix
+    else:
+        constructor = sps.csc_matrix
+
+    return constructor((array_dict["data"], array_dict["indices"], array_dict["indptr"]),
+                       shape=metadata["shape"], copy=False)
+
+
+def save_mapper_binary(folder_path, file_name, mapper):
+    """
+    Saves a dictionary original_ID -> index in columnar form, as an array of keys and one of values.
+    If the keys cannot be stored in a numpy array without pickle, e.g., because they have mixed types,
+    the dictionary is pickled
+    :param folder_path:
+    :param file_name:
+    :param mapper:
+    :return: dictionary with the metadata required by load_mapper_binary
+    """
+
+    key_array = np.array(list(mapper.keys()))
+    value_array = np.array(list(mapper.values()))
+
+    # Numpy silently converts mixed types, e.g., int and str keys, the conversion is checked to be lossless
+    is_columnar = len(mapper) > 0 and key_array.dtype.kind in "biufU" and value_array.dtype.kind in "biu" and \
+                  key_array.tolist() == list(mapper.keys())
+
+    if not is_columnar:
+        pickle.dump(mapper, open(folder_path + file_name, "wb"), protocol=pickle.HIGHEST_PROTOCOL)
+        return {"format": "pickle"}
+
+    np.save(folder_path + "{}_keys.npy".format(file_name), key_array, allow_pickle=False)
+    np.save(folder_path + "{}_values.npy".format(file_name), value_array, allow_pickle=False)
+
+    return {"format": "columnar"}
+
+
+def load_mapper_binary(folder_path, file_name, metadata):
+    """
+    Loads a dictionary saved with save_mapper_binary
+    :param folder_path:
+    :param file_name:
+    :param metadata:    as returned by save_mapper_binary
+    :return:
+    """
+
+    if metadata["format"] == "pickle":
+        return pickle.load(open(folder_path + file_name, "rb"))
+
+    key_array = np.load(folder_path + "{}_keys.npy".format(file_name), allow_pickle=False)
+    value_array = np.load(folder_path + "{}_values.npy".format(file_name), allow_pickle=False)
+
+    return dict(zip(key_array.tolist(), value_array.tolist()))
@@ -9,70 +9,61 @@ Created on 28/10/2018
 import numpy as np
 import scipy.sparse as sps
 
-from Data_manager.IncrementalSparseMatrix import IncrementalSparseMatrix
+from Data_manager.split_functions.split_train_validation import get_random_generator, sample_negative_items_user_wise
 
 
-def split_data_on_timestamp(URM_all, URM_timestamp):
+def split_data_on_timestamp(URM_all, URM_timestamp, negative_items_per_user=100, random_seed=None):
+    """
+    For each user with at least 3 interactions, the most recent one is test, the second most recent is validation and
+    the others are train. Users with less interactions are not included in any split.
+    Interactions with the same timestamp are considered in the order they appear in the user profile.
+    :param URM_all:
+    :param URM_timestamp:           timestamp of each interaction, with the same structure as URM_all
+    :param negative_items_per_user: number of random items each user did not interact with, sampled in URM_negative
+    :param random_seed:             if not None the negative items are reproducible, otherwise the global numpy generator is used
+    :return: URM_train, URM_validation, URM_test, URM_negative
+    """
+
     URM_all = sps.csr_matrix(URM_all)
     URM_timestamp = sps.csr_matrix(URM_timestamp)
 
-    n_rows, n_cols = URM_all.shape
-
-    URM_train_builder = IncrementalSparseMatrix(n_rows=n_rows, n_cols=n_cols)
-    URM_test_builder = IncrementalSparseMatrix(n_rows=n_rows, n_cols=n_cols)
-    URM_validation_builder = IncrementalSparseMatrix(n_rows=n_rows, n_cols=n_cols)
-    URM_negative_builder = IncrementalSparseMatrix(n_rows=n_rows, n_cols=n_cols)
-
-    all_items = np.arange(0, n_cols, dtype=np.int)
+    assert np.array_equal(URM_all.indptr, URM_timestamp.indptr) and np.array_equal(URM_all.indices, URM_timestamp.indices), \
+        "split_data_on_timestamp: URM_all and URM_timestamp must have the same structure"
 
-    for user_index in range(URM_all.shape[0]):
-
-        if user_index % 10000 == 0:
-            print("split_data_on_sequence: user {} of {}".format(user_index, URM_all.shape[0]))
-
-        start_pos = URM_all.indptr[user_index]
-        end_pos = URM_all.indptr[user_index + 1]
-
-        user_profile = URM_all.indices[start_pos:end_pos]
-        user_data = URM_all.data[start_pos:end_pos]
-        user_sequence = URM_timestamp.data[start_pos:end_pos]
+    n_rows, n_cols = URM_all.shape
 
-        unobserved_index = np.in1d(all_items, user_profile, assume_unique=True, invert=True)
+    user_profile_length = np.ediff1d(URM_all.indptr)
+    interaction_user = np.repeat(np.arange(n_rows), user_profile_length)
 
-        unobserved_items = all_items[unobserved_index]
-        np.random.shuffle(unobserved_items)
+    # Interactions grouped by user, from the most recent, ties in profile order
+    sorted_position = np.lexsort((np.arange(URM_all.nnz), -URM_timestamp.data, interaction_user))
+    sorted_user = interaction_user[sorted_position]
 
-        URM_negative_builder.add_single_row(user_index, unobserved_items[:100], 1.0)
+    rank_in_profile = np.arange(URM_all.nnz) - URM_all.indptr[sorted_user]
 
-        if len(user_profile) >= 3:
-            # Test contain the first one, validation the second
-            min_pos = np.argmax(user_sequence)
+    enough_items = user_profile_length[sorted_user] >= 3
 
-            venue_index = user_profile[min_pos]
-            venue_data = user_data[min_pos]
+    URM_split_list = []
 
-            URM_test_builder.add_data_lists([user_index], [venue_index], [venue_data])
+    for split_mask in [rank_in_profile >= 2, rank_in_profile == 1, rank_in_profile == 0]:
 
-            user_profile = np.delete(user_profile, min_pos)
-            user_data = np.delete(user_data, min_pos)
-            user_sequence = np.delete(user_sequence, min_pos)
+        split_position = sorted_position[np.logical_and(split_mask, enough_items)]
 
-            min_pos = np.argmax(user_sequence)
+        URM_split = sps.csr_matrix((URM_all.data[split_position],
+                                    (interaction_user[split_position], URM_all.indices[split_position])),
+                                   shape=(n_rows, n_cols), dtype=np.float64)
+        URM_split.eliminate_zeros()
 
-            venue_index = user_profile[min_pos]
-            venue_data = user_data[min_pos]
+        URM_split_list.append(URM_split)
 
-            URM_validation_builder.add_data_lists([user_index], [venue_index], [venue_data])
+    URM_train, URM_validation, URM_test = URM_split_list
 
-            user_profile = np.delete(user_profile, min_pos)
-            user_data = np.delete(user_data, min_pos)
-            # user_sequence = np.delete(user_sequence, min_pos)
+    # Users with less unobserved items get all of them
+    URM_observed = sps.csr_matrix(URM_all, copy=True)
+    URM_observed.sum_duplicates()
 
-            URM_train_builder.add_data_lists([user_index] * len(user_profile), user_profile, user_data)
+    n_negative_items_per_user = np.minimum(negative_items_per_user, n_cols - np.ediff1d(URM_observed.indptr))
 
-    URM_train = URM_train_builder.get_SparseMatrix()
-    URM_validation = URM_validation_builder.get_SparseMatrix()
-    URM_test = URM_test_builder.get_SparseMatrix()
-    URM_negative = URM_negative_builder.get_SparseMatrix()
+    URM_negative = sample_negative_items_user_wise(URM_all, n_negative_items_per_user, get_random_generator(random_seed))
 
     return URM_train, URM_validation, URM_test, URM_negative
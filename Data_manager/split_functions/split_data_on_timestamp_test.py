@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+from Data_manager.split_functions.split_data_on_timestamp import split_data_on_timestamp
+from Data_manager.split_functions.split_train_validation import sample_negative_items_user_wise, get_random_generator
+
+
+class MyTestCase(unittest.TestCase):
+
+    def test_split_data_on_timestamp(self):
+
+        n_users, n_items = 50, 40
+
+        URM_all = sps.random(n_users, n_items, density=0.15, format="csr")
+        URM_all.data[:] = 1.0
+
+        # Few distinct timestamps, to have ties
+        URM_timestamp = URM_all.copy()
+        URM_timestamp.data = np.random.randint(0, 5, URM_all.nnz).astype(np.float64)
+
+        URM_train, URM_validation, URM_test, URM_negative = split_data_on_timestamp(URM_all, URM_timestamp,
+                                                                                    negative_items_per_user=10)
+
+        for user_id in range(n_users):
+
+            profile = URM_all.indices[URM_all.indptr[user_id]:URM_all.indptr[user_id + 1]]
+            timestamps = URM_timestamp.data[URM_timestamp.indptr[user_id]:URM_timestamp.indptr[user_id + 1]]
+
+            # Most recent first, ties in profile order
+            profile = profile[np.argsort(-timestamps, kind="stable")]
+
+            if len(profile) >= 3:
+                self.assertEqual(set(URM_test[user_id].indices), {profile[0]})
+                self.assertEqual(set(URM_validation[user_id].indices), {profile[1]})
+                self.assertEqual(set(URM_train[user_id].indices), set(profile[2:]))
+            else:
+                self.assertEqual(URM_train[user_id].nnz + URM_validation[user_id].nnz + URM_test[user_id].nnz, 0)
+
+            negative_items = URM_negative[user_id].indices
+
+            self.assertEqual(len(negative_items), min(10, n_items - len(profile)))
+            self.assertEqual(len(np.intersect1d(negative_items, profile)), 0, "Some negative items are positive for the user")
+
+    def test_sample_negative_items_user_wise(self):
+
+        URM_all = sps.random(30, 20, density=0.5, format="csr")
+
+        # Users sampled individually and by rejection, one user with no unobserved items
+        URM_all[0, :] = 1.0
+        n_negative_items_per_user = np.random.randint(0, 12, URM_all.shape[0])
+
+        URM_negative = sample_negative_items_user_wise(URM_all, n_negative_items_per_user, get_random_generator(42))
+        URM_negative_same_seed = sample_negative_items_user_wise(URM_all, n_negative_items_per_user, get_random_generator(42))
+
+        self.assertEqual(URM_all.multiply(URM_negative).nnz, 0, "Some negative items are positive for the user")
+        self.assertTrue(np.array_equal(np.ediff1d(URM_negative.indptr),
+                                       np.minimum(n_negative_items_per_user, URM_all.shape[1] - np.ediff1d(URM_all.indptr))))
+
+        self.assertTrue(np.array_equal(URM_negative.toarray(), URM_negative_same_seed.toarray()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,234 +10,277 @@ import numpy as np
 import scipy.sparse as sps
 
 from Data_manager.IncrementalSparseMatrix import IncrementalSparseMatrix
+from Base.Recommender_utils import is_in_sorted_keys
 
 
-def split_train_validation_percentage_user_wise(URM_train, train_percentage=0.1, verbose=True):
-    from Data_manager.IncrementalSparseMatrix import IncrementalSparseMatrix
+def get_random_generator(random_seed):
+    """
+    :return: a generator initialized with random_seed, or the global numpy one if random_seed is None
+    """
 
-    # ensure to use csr matrix or we get big problem
-    URM_train = URM_train.tocsr()
+    if random_seed is None:
+        return np.random
 
-    num_users, num_items = URM_train.shape
+    return np.random.RandomState(random_seed)
 
-    URM_train_builder = IncrementalSparseMatrix(n_rows=num_users, n_cols=num_items)
-    URM_validation_builder = IncrementalSparseMatrix(n_rows=num_users, n_cols=num_items)
 
-    user_no_item_train = 0
-    user_no_item_validation = 0
+def _split_user_wise(URM, n_train_items_per_user, random_generator):
+    """
+    Randomly selects n_train_items_per_user[user] interactions of each user as train and the others as validation.
+    The interactions of all users are shuffled at once by sorting them by user and, within the same user,
+    by a random key.
+    :param URM:                     csr matrix
+    :param n_train_items_per_user:  array with the number of train interactions of each user
+    :param random_generator:
+    :return: URM_train, URM_validation
+    """
 
-    for user_id in range(URM_train.shape[0]):
+    num_users, num_items = URM.shape
 
-        start_pos = URM_train.indptr[user_id]
-        end_pos = URM_train.indptr[user_id + 1]
+    user_profile_length = np.ediff1d(URM.indptr)
+    interaction_user = np.repeat(np.arange(num_users), user_profile_length)
 
-        user_profile_items = URM_train.indices[start_pos:end_pos]
-        user_profile_ratings = URM_train.data[start_pos:end_pos]
-        user_profile_length = len(user_profile_items)
+    random_keys = random_generator.rand(URM.nnz)
 
-        n_train_items = round(user_profile_length * train_percentage)
+    # Positions of the interactions grouped by user and in random order within each user
+    shuffled_position = np.lexsort((random_keys, interaction_user))
+    shuffled_user = interaction_user[shuffled_position]
 
-        if n_train_items == len(user_profile_items) and n_train_items > 1:
-            n_train_items -= 1
+    # Position of each shuffled interaction within its user profile
+    rank_in_profile = np.arange(URM.nnz) - URM.indptr[shuffled_user]
 
-        indices_for_sampling = np.arange(0, user_profile_length, dtype=np.int)
-        np.random.shuffle(indices_for_sampling)
+    train_mask = rank_in_profile < n_train_items_per_user[shuffled_user]
 
-        train_items = user_profile_items[indices_for_sampling[0:n_train_items]]
-        train_ratings = user_profile_ratings[indices_for_sampling[0:n_train_items]]
+    URM_split_list = []
 
-        validation_items = user_profile_items[indices_for_sampling[n_train_items:]]
-        validation_ratings = user_profile_ratings[indices_for_sampling[n_train_items:]]
+    for split_mask in [train_mask, np.logical_not(train_mask)]:
 
-        if len(train_items) == 0:
-            if verbose: print("User {} has 0 train items".format(user_id))
-            user_no_item_train += 1
+        split_position = shuffled_position[split_mask]
 
-        if len(validation_items) == 0:
-            if verbose: print("User {} has 0 validation items".format(user_id))
-            user_no_item_validation += 1
+        URM_split = sps.csr_matrix((URM.data[split_position], (shuffled_user[split_mask], URM.indices[split_position])),
+                                   shape=(num_users, num_items), dtype=np.float64)
+        URM_split.eliminate_zeros()
 
-        URM_train_builder.add_data_lists([user_id] * len(train_items), train_items, train_ratings)
-        URM_validation_builder.add_data_lists([user_id] * len(validation_items), validation_items, validation_ratings)
+        URM_split_list.append(URM_split)
 
-    if user_no_item_train != 0:
-        print("Warning split: {} users with 0 train items ({} total users)".format(user_no_item_train,
-                                                                                   URM_train.shape[0]))
-    if user_no_item_validation != 0:
-        print("Warning split: {} users with 0 validation items ({} total users)".format(user_no_item_validation,
-                                                                                        URM_train.shape[0]))
+    return URM_split_list[0], URM_split_list[1]
 
-    URM_train = URM_train_builder.get_SparseMatrix()
-    URM_validation = URM_validation_builder.get_SparseMatrix()
 
-    return URM_train, URM_validation
+def _print_users_with_empty_split(URM_split, split_name, verbose, message):
+    """
+    Prints the users with no interactions in URM_split, if verbose, and how many they are
+    :return: number of users with no interactions
+    """
 
+    empty_users = np.where(np.ediff1d(URM_split.indptr) == 0)[0]
 
-def split_train_validation_leave_one_out_user_wise(URM_train, verbose=True, at_least_n_train_items=0):
-    from Data_manager.IncrementalSparseMatrix import IncrementalSparseMatrix
+    if verbose:
+        for user_id in empty_users:
+            print("User {} has 0 {} items".format(user_id, split_name))
 
-    num_users, num_items = URM_train.shape
+    if len(empty_users) != 0:
+        print(message.format(len(empty_users), URM_split.shape[0]))
 
-    URM_train_builder = IncrementalSparseMatrix(n_rows=num_users, n_cols=num_items)
-    URM_validation_builder = IncrementalSparseMatrix(n_rows=num_users, n_cols=num_items)
+    return len(empty_users)
+
+
+def split_train_validation_percentage_user_wise(URM_train, train_percentage=0.1, verbose=True, random_seed=None):
+    """
+    Splits the interactions of each user, train_percentage of them are train and the others validation.
+    :param URM_train:
+    :param train_percentage:
+    :param verbose:
+    :param random_seed:         if not None the split is reproducible, otherwise the global numpy generator is used
+    :return: URM_train, URM_validation
+    """
 
-    count_train = 0
-    count_validation = 0
-    for user_id in range(URM_train.shape[0]):
+    # ensure to use csr matrix or we get big problem
+    URM_train = sps.csr_matrix(URM_train)
 
-        start_pos = URM_train.indptr[user_id]
-        end_pos = URM_train.indptr[user_id + 1]
+    user_profile_length = np.ediff1d(URM_train.indptr)
 
-        user_profile_items = URM_train.indices[start_pos:end_pos]
-        user_profile_ratings = URM_train.data[start_pos:end_pos]
-        user_profile_length = len(user_profile_items)
+    # np.round rounds half to even, as the builtin round
+    n_train_items = np.round(user_profile_length * train_percentage).astype(np.int64)
 
-        n_train_items = user_profile_length
+    full_train = np.logical_and(n_train_items == user_profile_length, n_train_items > 1)
+    n_train_items[full_train] -= 1
 
-        if n_train_items > at_least_n_train_items:
-            n_train_items -= 1
+    URM_train, URM_validation = _split_user_wise(URM_train, n_train_items, get_random_generator(random_seed))
 
-        indices_for_sampling = np.arange(0, user_profile_length, dtype=np.int)
-        np.random.shuffle(indices_for_sampling)
+    _print_users_with_empty_split(URM_train, "train", verbose,
+                                  "Warning split: {} users with 0 train items ({} total users)")
+    _print_users_with_empty_split(URM_validation, "validation", verbose,
+                                  "Warning split: {} users with 0 validation items ({} total users)")
 
-        train_items = user_profile_items[indices_for_sampling[0:n_train_items]]
-        train_ratings = user_profile_ratings[indices_for_sampling[0:n_train_items]]
+    return URM_train, URM_validation
 
-        validation_items = user_profile_items[indices_for_sampling[n_train_items:]]
-        validation_ratings = user_profile_ratings[indices_for_sampling[n_train_items:]]
 
-        if len(train_items) == 0:
-            if verbose: print("User {} has 0 train items".format(user_id))
-            count_train += 1
+def split_train_validation_leave_one_out_user_wise(URM_train, verbose=True, at_least_n_train_items=0, random_seed=None):
+    """
+    Selects one random interaction of each user with more than at_least_n_train_items as validation.
+    :param URM_train:
+    :param verbose:
+    :param at_least_n_train_items:
+    :param random_seed:             if not None the split is reproducible, otherwise the global numpy generator is used
+    :return: URM_train, URM_validation
+    """
 
-        if len(validation_items) == 0:
-            if verbose: print("User {} has 0 validation items".format(user_id))
-            count_validation += 1
+    URM_train = sps.csr_matrix(URM_train)
 
-        URM_train_builder.add_data_lists([user_id] * len(train_items), train_items, train_ratings)
-        URM_validation_builder.add_data_lists([user_id] * len(validation_items), validation_items, validation_ratings)
+    user_profile_length = np.ediff1d(URM_train.indptr)
 
-    if count_train > 0:
-        print("{} users with 0 train items".format(count_train))
-    if count_validation > 0:
-        print("{} users with 0 validation items".format(count_validation))
+    n_train_items = user_profile_length.copy()
+    n_train_items[user_profile_length > at_least_n_train_items] -= 1
 
-    URM_train = URM_train_builder.get_SparseMatrix()
-    URM_validation = URM_validation_builder.get_SparseMatrix()
+    URM_train, URM_validation = _split_user_wise(URM_train, n_train_items, get_random_generator(random_seed))
+
+    _print_users_with_empty_split(URM_train, "train", verbose, "{} users with 0 train items")
+    _print_users_with_empty_split(URM_validation, "validation", verbose, "{} users with 0 validation items")
 
     return URM_train, URM_validation
 
 
-def split_data_train_validation_test_negative_user_wise(URM_all, negative_items_per_positive=50):
+def sample_negative_items_user_wise(URM_all, n_negative_items_per_user, random_generator):
     """
-    This function creates a Train, Test, Validation split with negative items sampled
-    The split is perfomed user-wise, 20% is test, 80% is train. Train is further divided in 90% final train and 10% validation
+    Samples for each user n_negative_items_per_user[user] distinct items the user did not interact with.
+    Candidate items are drawn at random for all users at once and the ones the user interacted with
+    or already sampled are discarded, the missing ones are drawn again.
+    Users for which the required items are more than half of their unobserved items are sampled individually,
+    as rejection would be inefficient.
     :param URM_all:
-    :param negative_items_per_positive:
-    :return:
+    :param n_negative_items_per_user:
+    :param random_generator:
+    :return: URM_negative
     """
 
-    URM_all = sps.csr_matrix(URM_all)
-
     n_rows, n_cols = URM_all.shape
 
-    URM_train_all, URM_test = split_train_validation_percentage_user_wise(URM_all, train_percentage=0.8)
+    URM_all = sps.csr_matrix(URM_all, copy=True)
+    URM_all.sum_duplicates()
+
+    n_unobserved_items = n_cols - np.ediff1d(URM_all.indptr)
+
+    for user_index in np.where(n_negative_items_per_user > n_unobserved_items)[0]:
+        print(
+            "split_data_train_validation_test_negative: WARNING number of negative to sample for user {} is greater than available negative items {}".format(
+                n_negative_items_per_user[user_index], n_unobserved_items[user_index]))
+
+    n_negative_items_per_user = np.minimum(n_negative_items_per_user, n_unobserved_items)
+
+    # Sorted keys user*n_cols + item of the interactions
+    observed_keys = np.repeat(np.arange(n_rows, dtype=np.int64), np.ediff1d(URM_all.indptr)) * n_cols + URM_all.indices
+
+    dense_users = 2 * n_negative_items_per_user > n_unobserved_items
+    dense_users[n_negative_items_per_user == 0] = False
+
+    sampled_keys_list = []
+
+    for user_index in np.where(dense_users)[0]:
+        user_profile = URM_all.indices[URM_all.indptr[user_index]:URM_all.indptr[user_index + 1]]
+
+        unobserved_items = np.setdiff1d(np.arange(n_cols), user_profile, assume_unique=True)
+        random_generator.shuffle(unobserved_items)
+
+        sampled_keys_list.append(user_index * n_cols + unobserved_items[:n_negative_items_per_user[user_index]])
 
-    URM_train, URM_validation = split_train_validation_percentage_user_wise(URM_train_all, train_percentage=0.9)
+    n_required = np.where(dense_users, 0, n_negative_items_per_user)
+    n_missing = n_required.copy()
+    accepted_keys = np.zeros(0, dtype=np.int64)
 
-    URM_negative_builder = IncrementalSparseMatrix(n_rows=n_rows, n_cols=n_cols)
+    while n_missing.sum() > 0:
 
-    all_items = np.arange(0, n_cols, dtype=np.int)
+        # Some more candidates than the missing ones, as a fraction of them will be rejected
+        n_candidates = np.where(n_missing > 0, n_missing + n_missing // 4 + 1, 0)
 
-    for user_index in range(URM_train_all.shape[0]):
+        candidate_user = np.repeat(np.arange(n_rows, dtype=np.int64), n_candidates)
+        candidate_keys = candidate_user * n_cols + random_generator.randint(0, n_cols, size=len(candidate_user))
 
-        if user_index % 10000 == 0:
-            print("split_data_train_validation_test_negative: user {} of {}".format(user_index, URM_all.shape[0]))
+        candidate_keys = candidate_keys[np.logical_not(is_in_sorted_keys(observed_keys, candidate_keys))]
 
-        start_pos = URM_all.indptr[user_index]
-        end_pos = URM_all.indptr[user_index + 1]
+        accepted_keys = np.unique(np.concatenate((accepted_keys, candidate_keys)))
 
-        user_profile = URM_all.indices[start_pos:end_pos]
+        n_accepted = np.bincount(accepted_keys // n_cols, minlength=n_rows)
+        n_missing = np.maximum(n_required - n_accepted, 0)
 
-        unobserved_index = np.in1d(all_items, user_profile, assume_unique=True, invert=True)
+    # Keep a random subset of the required size of the accepted items of each user
+    accepted_user = accepted_keys // n_cols
+    shuffled_position = np.lexsort((random_generator.rand(len(accepted_keys)), accepted_user))
+    shuffled_user = accepted_user[shuffled_position]
 
-        unobserved_items = all_items[unobserved_index]
-        np.random.shuffle(unobserved_items)
+    user_start = np.searchsorted(shuffled_user, np.arange(n_rows))
+    rank_in_user = np.arange(len(shuffled_user)) - user_start[shuffled_user]
 
-        n_test_items = URM_test.indptr[user_index + 1] - URM_test.indptr[user_index]
+    sampled_keys_list.append(accepted_keys[shuffled_position[rank_in_user < n_required[shuffled_user]]])
 
-        num_negative_items = n_test_items * negative_items_per_positive
+    sampled_keys = np.concatenate(sampled_keys_list).astype(np.int64)
 
-        if num_negative_items > len(unobserved_items):
-            print(
-                "split_data_train_validation_test_negative: WARNING number of negative to sample for user {} is greater than available negative items {}".format(
-                    num_negative_items, len(unobserved_items)))
-            num_negative_items = min(num_negative_items, len(unobserved_items))
+    URM_negative = sps.csr_matrix((np.ones(len(sampled_keys)), (sampled_keys // n_cols, sampled_keys % n_cols)),
+                                  shape=(n_rows, n_cols), dtype=np.float64)
 
-        URM_negative_builder.add_single_row(user_index, unobserved_items[:num_negative_items], 1.0)
+    return URM_negative
 
-    URM_negative = URM_negative_builder.get_SparseMatrix()
+
+def split_data_train_validation_test_negative_user_wise(URM_all, negative_items_per_positive=50, random_seed=None):
+    """
+    This function creates a Train, Test, Validation split with negative items sampled
+    The split is perfomed user-wise, 20% is test, 80% is train. Train is further divided in 90% final train and 10% validation
+    :param URM_all:
+    :param negative_items_per_positive:
+    :param random_seed:     if not None the split is reproducible, otherwise the global numpy generator is used
+    :return:
+    """
+
+    URM_all = sps.csr_matrix(URM_all)
+
+    random_generator = get_random_generator(random_seed)
+    split_seed_list = [None, None] if random_seed is None else random_generator.randint(0, 2**31 - 1, size=2)
+
+    URM_train_all, URM_test = split_train_validation_percentage_user_wise(URM_all, train_percentage=0.8,
+                                                                          random_seed=split_seed_list[0])
+
+    URM_train, URM_validation = split_train_validation_percentage_user_wise(URM_train_all, train_percentage=0.9,
+                                                                            random_seed=split_seed_list[1])
+
+    n_negative_items_per_user = np.ediff1d(URM_test.indptr) * negative_items_per_positive
+
+    URM_negative = sample_negative_items_user_wise(URM_all, n_negative_items_per_user, random_generator)
 
     return URM_train, URM_validation, URM_test, URM_negative
 
 
 def split_train_validation_test_negative_leave_one_out_user_wise(URM_all, negative_items_per_positive=50, verbose=True,
                                                                  at_least_n_train_items_test=0,
-                                                                 at_least_n_train_items_validation=0):
+                                                                 at_least_n_train_items_validation=0,
+                                                                 random_seed=None):
     """
     This function creates a Train, Test, Validation split with negative items sampled
     The split is perfomed user-wise, hold 1 out for validation and test
     :param URM_all:
     :param negative_items_per_positive:
+    :param random_seed:     if not None the split is reproducible, otherwise the global numpy generator is used
     :return:
     """
 
     URM_all = sps.csr_matrix(URM_all)
 
-    n_rows, n_cols = URM_all.shape
+    random_generator = get_random_generator(random_seed)
+    split_seed_list = [None, None] if random_seed is None else random_generator.randint(0, 2**31 - 1, size=2)
 
     print('Creation test...')
     URM_train_all, URM_test = split_train_validation_leave_one_out_user_wise(URM_all,
                                                                              at_least_n_train_items=at_least_n_train_items_test,
-                                                                             verbose=verbose)
+                                                                             verbose=verbose,
+                                                                             random_seed=split_seed_list[0])
 
     print('Creation validation...')
     URM_train, URM_validation = split_train_validation_leave_one_out_user_wise(URM_train_all,
                                                                                at_least_n_train_items=at_least_n_train_items_validation,
-                                                                               verbose=verbose)
-
-    URM_negative_builder = IncrementalSparseMatrix(n_rows=n_rows, n_cols=n_cols)
-
-    all_items = np.arange(0, n_cols, dtype=np.int)
-
-    for user_index in range(URM_train_all.shape[0]):
-
-        if user_index % 10000 == 0:
-            print("split_data_train_validation_test_negative: user {} of {}".format(user_index, URM_all.shape[0]))
-
-        start_pos = URM_all.indptr[user_index]
-        end_pos = URM_all.indptr[user_index + 1]
-
-        user_profile = URM_all.indices[start_pos:end_pos]
+                                                                               verbose=verbose,
+                                                                               random_seed=split_seed_list[1])
 
-        unobserved_index = np.in1d(all_items, user_profile, assume_unique=True, invert=True)
+    n_negative_items_per_user = np.ediff1d(URM_test.indptr) * negative_items_per_positive
 
-        unobserved_items = all_items[unobserved_index]
-        np.random.shuffle(unobserved_items)
-
-        n_test_items = URM_test.indptr[user_index + 1] - URM_test.indptr[user_index]
-
-        num_negative_items = n_test_items * negative_items_per_positive
-
-        if num_negative_items > len(unobserved_items):
-            print(
-                "split_data_train_validation_test_negative: WARNING number of negative to sample for user {} is greater than available negative items {}".format(
-                    num_negative_items, len(unobserved_items)))
-            num_negative_items = min(num_negative_items, len(unobserved_items))
-
-        URM_negative_builder.add_single_row(user_index, unobserved_items[:num_negative_items], 1.0)
-
-    URM_negative = URM_negative_builder.get_SparseMatrix()
+    URM_negative = sample_negative_items_user_wise(URM_all, n_negative_items_per_user, random_generator)
 
     return URM_train, URM_validation, URM_test, URM_negative
 
@@ -265,86 +308,59 @@ def split_train_validation_percentage_random_holdout(URM_train, train_percentage
     return URM_train, URM_validation
 
 
-def split_train_validation_cold_start_user_wise(URM_train, full_train_percentage=0.0, cold_items=1, verbose=True):
-    from Data_manager.IncrementalSparseMatrix import IncrementalSparseMatrix
+def split_train_validation_cold_start_user_wise(URM_train, full_train_percentage=0.0, cold_items=1, verbose=True,
+                                                random_seed=None):
+    """
+    Selects a random fraction 1-full_train_percentage of the users with more than cold_items interactions as cold users,
+    only cold_items of their interactions are train and the others validation. All interactions of the other users are train.
+    :param URM_train:
+    :param full_train_percentage:
+    :param cold_items:
+    :param verbose:
+    :param random_seed:             if not None the split is reproducible, otherwise the global numpy generator is used
+    :return: URM_train, URM_validation
+    """
 
     # ensure to use csr matrix or we get big problem
-    URM_train = URM_train.tocsr()
+    URM_train = sps.csr_matrix(URM_train)
 
-    num_users, num_items = URM_train.shape
-
-    URM_train_builder = IncrementalSparseMatrix(n_rows=num_users, n_cols=num_items)
-    URM_validation_builder = IncrementalSparseMatrix(n_rows=num_users, n_cols=num_items)
-
-    user_no_item_train = 0
-    user_no_item_validation = 0
+    random_generator = get_random_generator(random_seed)
 
     # if we split two time train-test and train-validation we could get users with no items in the second split,
     # in order to get good test with enough non empty users, get the random users within the users with at least <cold_items>
-    nnz_per_row = URM_train.getnnz(axis=1)
+    nnz_per_row = np.ediff1d(URM_train.indptr)
 
     users_enough_items = np.where(nnz_per_row > cold_items)[0]
     users_no_enough_items = np.where(nnz_per_row <= cold_items)[0]
 
-    np.random.shuffle(users_enough_items)
+    random_generator.shuffle(users_enough_items)
 
     n_train_users = round(len(users_enough_items) * full_train_percentage)
 
     print("Users enough items: {}".format(len(users_enough_items)))
     print("Users no enough items: {}".format(len(users_no_enough_items)))
 
-    # create full train part without coldstart
-    for user_id in np.concatenate((users_enough_items[0:n_train_users], users_no_enough_items), axis=0):
-        start_pos = URM_train.indptr[user_id]
-        end_pos = URM_train.indptr[user_id + 1]
-        user_profile_items = URM_train.indices[start_pos:end_pos]
-        user_profile_ratings = URM_train.data[start_pos:end_pos]
-        user_profile_length = len(user_profile_items)
-        URM_train_builder.add_data_lists([user_id] * user_profile_length, user_profile_items, user_profile_ratings)
-
-    # create test + train for the cold start users
-    for user_id in users_enough_items[n_train_users:]:
-
-        start_pos = URM_train.indptr[user_id]
-        end_pos = URM_train.indptr[user_id + 1]
-
-        user_profile_items = URM_train.indices[start_pos:end_pos]
-        user_profile_ratings = URM_train.data[start_pos:end_pos]
-        user_profile_length = len(user_profile_items)
+    cold_users = users_enough_items[n_train_users:]
 
-        n_train_items = min(cold_items, user_profile_length)
+    # The users which are not cold have all their interactions in train
+    n_train_items = nnz_per_row.copy()
+    n_train_items[cold_users] = np.minimum(cold_items, nnz_per_row[cold_users])
 
-        if n_train_items == len(user_profile_items) and n_train_items > 1:
-            n_train_items -= 1
+    full_train = np.logical_and(n_train_items[cold_users] == nnz_per_row[cold_users], n_train_items[cold_users] > 1)
+    n_train_items[cold_users[full_train]] -= 1
 
-        indices_for_sampling = np.arange(0, user_profile_length, dtype=np.int)
-        np.random.shuffle(indices_for_sampling)
+    URM_train, URM_validation = _split_user_wise(URM_train, n_train_items, random_generator)
 
-        train_items = user_profile_items[indices_for_sampling[0:n_train_items]]
-        train_ratings = user_profile_ratings[indices_for_sampling[0:n_train_items]]
+    for URM_split, split_name in [(URM_train, "train"), (URM_validation, "validation")]:
 
-        validation_items = user_profile_items[indices_for_sampling[n_train_items:]]
-        validation_ratings = user_profile_ratings[indices_for_sampling[n_train_items:]]
+        cold_users_empty = cold_users[np.ediff1d(URM_split.indptr)[cold_users] == 0]
 
-        if len(train_items) == 0:
-            if verbose: print("User {} has 0 train items".format(user_id))
-            user_no_item_train += 1
+        if verbose:
+            for user_id in cold_users_empty:
+                print("User {} has 0 {} items".format(user_id, split_name))
 
-        if len(validation_items) == 0:
-            if verbose: print("User {} has 0 validation items".format(user_id))
-            user_no_item_validation += 1
-
-        URM_train_builder.add_data_lists([user_id] * len(train_items), train_items, train_ratings)
-        URM_validation_builder.add_data_lists([user_id] * len(validation_items), validation_items, validation_ratings)
-
-    if user_no_item_train != 0:
-        print("Warning split: {} users with 0 train items ({} total users)".format(user_no_item_train,
-                                                                                   URM_train.shape[0]))
-    if user_no_item_validation != 0:
-        print("Warning split: {} users with 0 validation items ({} total users)".format(user_no_item_validation,
-                                                                                        URM_train.shape[0]))
-
-    URM_train = URM_train_builder.get_SparseMatrix()
-    URM_validation = URM_validation_builder.get_SparseMatrix()
+        if len(cold_users_empty) != 0:
+            print("Warning split: {} users with 0 {} items ({} total users)".format(len(cold_users_empty), split_name,
+                                                                                    URM_train.shape[0]))
 
     return URM_train, URM_validation
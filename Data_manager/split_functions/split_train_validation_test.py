@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+from Data_manager.split_functions.split_train_validation import split_train_validation_percentage_user_wise, \
+    split_train_validation_leave_one_out_user_wise, split_train_validation_cold_start_user_wise, \
+    split_data_train_validation_test_negative_user_wise, split_train_validation_test_negative_leave_one_out_user_wise
+
+
+def get_random_URM(n_users=100, n_items=60, density=0.1):
+
+    URM_all = sps.random(n_users, n_items, density=density, format="csr")
+    URM_all.data = np.random.randint(1, 6, URM_all.nnz).astype(np.float64)
+
+    return URM_all
+
+
+class MyTestCase(unittest.TestCase):
+
+    def _assert_is_partition(self, URM_all, URM_split_list):
+
+        URM_sum = sps.csr_matrix(URM_all.shape)
+        URM_nnz = 0
+
+        for URM_split in URM_split_list:
+            URM_sum += URM_split
+            URM_nnz += URM_split.nnz
+
+        self.assertEqual(URM_nnz, URM_all.nnz, "Splits overlap")
+        self.assertTrue(np.array_equal(URM_sum.toarray(), URM_all.toarray()))
+
+    def _assert_negative_items(self, URM_all, URM_negative, n_negative_items_per_user):
+
+        self.assertEqual((URM_all.multiply(URM_negative)).nnz, 0, "Some negative items are positive for the user")
+        self.assertTrue(np.array_equal(np.ediff1d(URM_negative.indptr), n_negative_items_per_user))
+
+    def test_split_percentage_user_wise(self):
+
+        URM_all = get_random_URM()
+
+        URM_train, URM_validation = split_train_validation_percentage_user_wise(URM_all, train_percentage=0.8, verbose=False)
+
+        self._assert_is_partition(URM_all, [URM_train, URM_validation])
+
+        user_profile_length = np.ediff1d(URM_all.indptr)
+        n_train_items = np.round(user_profile_length * 0.8)
+        n_train_items[np.logical_and(n_train_items == user_profile_length, n_train_items > 1)] -= 1
+
+        self.assertTrue(np.array_equal(np.ediff1d(URM_train.indptr), n_train_items))
+
+    def test_split_leave_one_out_user_wise(self):
+
+        URM_all = get_random_URM()
+
+        URM_train, URM_validation = split_train_validation_leave_one_out_user_wise(URM_all, verbose=False,
+                                                                                   at_least_n_train_items=2)
+
+        self._assert_is_partition(URM_all, [URM_train, URM_validation])
+        self.assertTrue(np.array_equal(np.ediff1d(URM_validation.indptr), np.ediff1d(URM_all.indptr) > 2))
+
+    def test_split_random_seed(self):
+
+        URM_all = get_random_URM()
+
+        URM_train, _ = split_train_validation_percentage_user_wise(URM_all, verbose=False, random_seed=42)
+        URM_train_same_seed, _ = split_train_validation_percentage_user_wise(URM_all, verbose=False, random_seed=42)
+
+        self.assertTrue(np.array_equal(URM_train.toarray(), URM_train_same_seed.toarray()))
+
+    def test_split_cold_start_user_wise(self):
+
+        URM_all = get_random_URM()
+        cold_items = 2
+
+        URM_train, URM_validation = split_train_validation_cold_start_user_wise(URM_all, full_train_percentage=0.5,
+                                                                                cold_items=cold_items, verbose=False)
+
+        self._assert_is_partition(URM_all, [URM_train, URM_validation])
+
+        # Cold users have cold_items train interactions, the others no validation interactions
+        cold_users = np.ediff1d(URM_validation.indptr) > 0
+
+        self.assertTrue(np.all(np.ediff1d(URM_train.indptr)[cold_users] == cold_items))
+
+        n_users_enough_items = (np.ediff1d(URM_all.indptr) > cold_items).sum()
+        self.assertEqual(cold_users.sum(), n_users_enough_items - round(n_users_enough_items * 0.5))
+
+    def test_split_negative_user_wise(self):
+
+        URM_all = get_random_URM()
+        negative_items_per_positive = 3
+
+        URM_train, URM_validation, URM_test, URM_negative = split_data_train_validation_test_negative_user_wise(
+            URM_all, negative_items_per_positive=negative_items_per_positive)
+
+        self._assert_is_partition(URM_all, [URM_train, URM_validation, URM_test])
+
+        n_negative_items_per_user = np.minimum(np.ediff1d(URM_test.indptr) * negative_items_per_positive,
+                                               URM_all.shape[1] - np.ediff1d(URM_all.indptr))
+
+        self._assert_negative_items(URM_all, URM_negative, n_negative_items_per_user)
+
+    def test_split_negative_leave_one_out_user_wise(self):
+
+        # Users with many interactions, for which the negative items are sampled individually
+        URM_all = get_random_URM(density=0.7)
+
+        URM_train, URM_validation, URM_test, URM_negative = split_train_validation_test_negative_leave_one_out_user_wise(
+            URM_all, negative_items_per_positive=15, verbose=False)
+
+        self._assert_is_partition(URM_all, [URM_train, URM_validation, URM_test])
+        self.assertTrue(np.array_equal(np.ediff1d(URM_test.indptr), np.ediff1d(URM_all.indptr) > 0))
+
+        n_negative_items_per_user = np.minimum(np.ediff1d(URM_test.indptr) * 15,
+                                               URM_all.shape[1] - np.ediff1d(URM_all.indptr))
+
+        self._assert_negative_items(URM_all, URM_negative, n_negative_items_per_user)
+
+
+if __name__ == '__main__':
+    unittest.main()
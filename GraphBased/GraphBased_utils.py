@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+
+Computation of the item-item similarity of the graph based random walk models (P3alpha, RP3beta)
+as Piu * Pui, in blocks of rows. The row blocks are independent and can be computed by multiple processes.
+
+"""
+
+import numpy as np
+import scipy.sparse as sps
+import time, sys, multiprocessing
+
+from Utils.shared_memory_sparse import sparse_to_shared_memory, release_shared_memory
+from Utils.pool_worker_state import init_worker_state, get_worker_state
+
+
+def compute_rows_block_topK(Piu, Pui, degree, start_row, end_row, topK):
+    """
+    Computes the rows [start_row, end_row) of Piu * Pui and selects the TopK values of each row
+    :param Piu:         csr matrix |items|x|users|
+    :param Pui:         csr matrix |users|x|items|
+    :param degree:      array of the item weights applied to the columns, or None
+    :param start_row:
+    :param end_row:
+    :param topK:
+    :return: rows, cols, values of the non-zero selected cells
+    """
+
+    n_items = Pui.shape[1]
+    block_dim = end_row - start_row
+
+    local_topK = min(topK, n_items)
+
+    similarity_block = Piu[start_row:end_row, :] * Pui
+    similarity_block = similarity_block.toarray()
+
+    if degree is not None:
+        similarity_block = np.multiply(similarity_block, degree)
+
+    block_row_index = np.arange(block_dim)
+    similarity_block[block_row_index, start_row + block_row_index] = 0
+
+    if local_topK <= 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+    # Select the unordered TopK of all rows of the block at once
+    best = np.argpartition(-similarity_block, local_topK - 1, axis=1)[:, :local_topK]
+    values_to_add = np.take_along_axis(similarity_block, best, axis=1)
+
+    notZerosMask = values_to_add != 0.0
+
+    rows = np.repeat(start_row + block_row_index, notZerosMask.sum(axis=1)).astype(np.int32)
+    cols = best[notZerosMask].astype(np.int32)
+    values = values_to_add[notZerosMask].astype(np.float32)
+
+    return rows, cols, values
+
+
+def _compute_rows_block_topK_worker(block_start_end):
+
+    start_row, end_row = block_start_end
+    worker_state = get_worker_state()
+
+    return compute_rows_block_topK(worker_state["Piu"],
+                                   worker_state["Pui"],
+                                   worker_state["degree"],
+                                   start_row, end_row,
+                                   worker_state["topK"])
+
+
+def compute_W_sparse_random_walk(Piu, Pui, degree, topK, block_dim, n_jobs=1, verbose=True):
+    """
+    Computes the TopK rows of Piu * Pui in blocks of block_dim rows
+    :param Piu:         csr matrix |items|x|users|
+    :param Pui:         csr matrix |users|x|items|
+    :param degree:      array of the item weights applied to the columns, or None
+    :param topK:
+    :param block_dim:
+    :param n_jobs:      if > 1 the blocks are computed by a pool of processes, Piu and Pui are placed in shared memory
+    :param verbose:
+    :return: W_sparse as csr matrix |items|x|items|
+    """
+
+    n_items = Pui.shape[1]
+
+    Piu = sps.csr_matrix(Piu)
+    Pui = sps.csr_matrix(Pui)
+
+    block_list = [(start_row, min(start_row + block_dim, n_items)) for start_row in range(0, n_items, block_dim)]
+
+    rows_list = []
+    cols_list = []
+    values_list = []
+
+    processed_rows = 0
+
+    start_time = time.time()
+    start_time_printBatch = start_time
+
+    def _print_progress():
+        print("Processed {} ( {:.2f}% ) in {:.2f} minutes. Rows per second: {:.0f}".format(
+            processed_rows,
+            100.0 * float(processed_rows) / n_items,
+            (time.time() - start_time) / 60,
+            float(processed_rows) / (time.time() - start_time)))
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    if n_jobs is None or n_jobs <= 1 or len(block_list) == 1:
+
+        for start_row, end_row in block_list:
+
+            rows, cols, values = compute_rows_block_topK(Piu, Pui, degree, start_row, end_row, topK)
+
+            rows_list.append(rows)
+            cols_list.append(cols)
+            values_list.append(values)
+
+            processed_rows += end_row - start_row
+
+            if verbose and time.time() - start_time_printBatch > 60:
+                _print_progress()
+                start_time_printBatch = time.time()
+
+    else:
+
+        shared_memory_list = []
+        pool = None
+
+        try:
+            Piu_descriptor, Piu_shared_memory_list = sparse_to_shared_memory(Piu)
+            shared_memory_list.extend(Piu_shared_memory_list)
+
+            Pui_descriptor, Pui_shared_memory_list = sparse_to_shared_memory(Pui)
+            shared_memory_list.extend(Pui_shared_memory_list)
+
+            pool = multiprocessing.Pool(processes=n_jobs,
+                                        initializer=init_worker_state,
+                                        initargs=({"Piu": Piu_descriptor, "Pui": Pui_descriptor},
+                                                  {"degree": degree, "topK": topK}))
+
+            for (start_row, end_row), (rows, cols, values) in zip(block_list,
+                                                                  pool.imap(_compute_rows_block_topK_worker, block_list)):
+
+                rows_list.append(rows)
+                cols_list.append(cols)
+                values_list.append(values)
+
+                processed_rows += end_row - start_row
+
+                if verbose and time.time() - start_time_printBatch > 60:
+                    _print_progress()
+                    start_time_printBatch = time.time()
+
+            pool.close()
+            pool.join()
+
+        finally:
+            # If an exception is raised the workers are still attached to the shared memory
+            if pool is not None:
+                pool.terminate()
+
+            release_shared_memory(shared_memory_list)
+
+    W_sparse = sps.csr_matrix((np.concatenate(values_list), (np.concatenate(rows_list), np.concatenate(cols_list))),
+                              shape=(n_items, n_items))
+
+    return W_sparse
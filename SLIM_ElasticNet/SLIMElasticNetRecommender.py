@@ -10,7 +10,88 @@ from Base.Recommender_utils import check_matrix
 from sklearn.linear_model import ElasticNet
 
 from Base.BaseSimilarityMatrixRecommender import BaseSimilarityMatrixRecommender
-import time, sys
+import time, sys, multiprocessing
+
+from Utils.shared_memory_sparse import sparse_to_shared_memory, release_shared_memory
+from Utils.pool_worker_state import init_worker_state, get_worker_state
+
+
+def _fit_item_coefficients(model, URM_train, currentItem, topK):
+    """
+    Fits the ElasticNet model of currentItem and returns its topK non-zero coefficients.
+    The data of the currentItem column is set to zero during the fit and restored afterwards
+    :param model:       ElasticNet object
+    :param URM_train:   csc matrix, its data array is modified in place
+    :param currentItem:
+    :param topK:
+    :return: rows, values of the selected coefficients
+    """
+
+    # get the target column
+    y = URM_train[:, currentItem].toarray()
+
+    # set the j-th column of X to zero
+    start_pos = URM_train.indptr[currentItem]
+    end_pos = URM_train.indptr[currentItem + 1]
+
+    current_item_data_backup = URM_train.data[start_pos: end_pos].copy()
+    URM_train.data[start_pos: end_pos] = 0.0
+
+    # fit one ElasticNet model per column
+    model.fit(URM_train, y)
+
+    # model.coef_ contains the coefficient of the ElasticNet model
+    # let's keep only the non-zero values
+
+    # Select topK values
+    # Sorting is done in three steps. Faster then plain np.argsort for higher number of items
+    # - Partition the data to extract the set of relevant items
+    # - Sort only the relevant items
+    # - Get the original item index
+
+    nonzero_model_coef_index = model.sparse_coef_.indices
+    nonzero_model_coef_value = model.sparse_coef_.data
+
+    local_topK = min(len(nonzero_model_coef_value) - 1, topK)
+
+    relevant_items_partition = (-nonzero_model_coef_value).argpartition(local_topK)[0:local_topK]
+    relevant_items_partition_sorting = np.argsort(-nonzero_model_coef_value[relevant_items_partition])
+    ranking = relevant_items_partition[relevant_items_partition_sorting]
+
+    # finally, replace the original values of the j-th column
+    URM_train.data[start_pos:end_pos] = current_item_data_backup
+
+    return nonzero_model_coef_index[ranking], nonzero_model_coef_value[ranking]
+
+
+def _fit_items_block(item_block):
+    """
+    Fits the ElasticNet models of all items in item_block
+    :return: rows, cols, values of the coefficients, as numpy arrays, and the number of items fitted
+    """
+
+    worker_state = get_worker_state()
+
+    URM_train = worker_state["URM_train"]
+    model = worker_state["model"]
+    topK = worker_state["topK"]
+
+    rows_list = []
+    values_list = []
+    cols_list = []
+
+    for currentItem in item_block:
+
+        item_rows, item_values = _fit_item_coefficients(model, URM_train, currentItem, topK)
+
+        rows_list.append(item_rows)
+        values_list.append(item_values)
+        cols_list.append(np.full(len(item_rows), currentItem, dtype=np.int32))
+
+    return np.concatenate(rows_list).astype(np.int32), \
+           np.concatenate(cols_list).astype(np.int32), \
+           np.concatenate(values_list).astype(np.float32), \
+           len(item_block)
 
 
 class SLIMElasticNetRecommender(BaseSimilarityMatrixRecommender):
@@ -34,7 +115,11 @@ class SLIMElasticNetRecommender(BaseSimilarityMatrixRecommender):
         super(SLIMElasticNetRecommender, self).__init__(URM_train)
 
     def fit(self, l1_ratio=0.1, alpha=1.0, positive_only=True, topK=100,
-            verbose=True):
+            verbose=True, n_jobs=1):
+        """
+        :param n_jobs:  number of processes among which the items are split. If > 1 each process fits the models of
+                        a subset of the items on a shared memory copy of URM_train
+        """
 
         assert l1_ratio >= 0 and l1_ratio <= 1, "{}: l1_ratio must be between 0 and 1, provided value was {}".format(
             self.RECOMMENDER_NAME, l1_ratio)
@@ -58,6 +143,10 @@ class SLIMElasticNetRecommender(BaseSimilarityMatrixRecommender):
 
         n_items = URM_train.shape[1]
 
+        if n_jobs is not None and n_jobs > 1 and n_items > 1:
+            self._fit_parallel(URM_train, n_jobs, verbose)
+            return
+
         # Use array as it reduces memory requirements compared to lists
         dataBlock = 10000000
 
@@ -73,56 +162,21 @@ class SLIMElasticNetRecommender(BaseSimilarityMatrixRecommender):
         # fit each item's factors sequentially (not in parallel)
         for currentItem in range(n_items):
 
-            # get the target column
-            y = URM_train[:, currentItem].toarray()
-
-            # set the j-th column of X to zero
-            start_pos = URM_train.indptr[currentItem]
-            end_pos = URM_train.indptr[currentItem + 1]
-
-            current_item_data_backup = URM_train.data[start_pos: end_pos].copy()
-            URM_train.data[start_pos: end_pos] = 0.0
+            item_rows, item_values = _fit_item_coefficients(self.model, URM_train, currentItem, self.topK)
 
-            # fit one ElasticNet model per column
-            self.model.fit(URM_train, y)
-
-            # self.model.coef_ contains the coefficient of the ElasticNet model
-            # let's keep only the non-zero values
-
-            # Select topK values
-            # Sorting is done in three steps. Faster then plain np.argsort for higher number of items
-            # - Partition the data to extract the set of relevant items
-            # - Sort only the relevant items
-            # - Get the original item index
-
-            # nonzero_model_coef_index = self.model.coef_.nonzero()[0]
-            # nonzero_model_coef_value = self.model.coef_[nonzero_model_coef_index]
-
-            nonzero_model_coef_index = self.model.sparse_coef_.indices
-            nonzero_model_coef_value = self.model.sparse_coef_.data
-
-            local_topK = min(len(nonzero_model_coef_value) - 1, self.topK)
-
-            relevant_items_partition = (-nonzero_model_coef_value).argpartition(local_topK)[0:local_topK]
-            relevant_items_partition_sorting = np.argsort(-nonzero_model_coef_value[relevant_items_partition])
-            ranking = relevant_items_partition[relevant_items_partition_sorting]
-
-            for index in range(len(ranking)):
+            for index in range(len(item_rows)):
 
                 if numCells == len(rows):
                     rows = np.concatenate((rows, np.zeros(dataBlock, dtype=np.int32)))
                     cols = np.concatenate((cols, np.zeros(dataBlock, dtype=np.int32)))
                     values = np.concatenate((values, np.zeros(dataBlock, dtype=np.float32)))
 
-                rows[numCells] = nonzero_model_coef_index[ranking[index]]
+                rows[numCells] = item_rows[index]
                 cols[numCells] = currentItem
-                values[numCells] = nonzero_model_coef_value[ranking[index]]
+                values[numCells] = item_values[index]
 
                 numCells += 1
 
-            # finally, replace the original values of the j-th column
-            URM_train.data[start_pos:end_pos] = current_item_data_backup
-
             if verbose and (time.time() - start_time_printBatch > 300 or currentItem == n_items - 1):
                 print("{}: Processed {} ( {:.2f}% ) in {:.2f} minutes. Items per second: {:.0f}".format(
                     self.RECOMMENDER_NAME,
@@ -139,3 +193,74 @@ class SLIMElasticNetRecommender(BaseSimilarityMatrixRecommender):
         # generate the sparse weight matrix
         self.W_sparse = sps.csr_matrix((values[:numCells], (rows[:numCells], cols[:numCells])),
                                        shape=(n_items, n_items), dtype=np.float32)
+
+    def _fit_parallel(self, URM_train, n_jobs, verbose):
+        """
+        Splits the items in blocks which are fitted by a pool of n_jobs processes.
+        URM_train is placed in shared memory so that the workers do not receive a copy of the whole matrix.
+        The indices and indptr arrays are shared read-only, while each worker copies the data array so that it can
+        mask its target column without affecting the others
+        """
+
+        n_items = URM_train.shape[1]
+
+        URM_descriptor, shared_memory_list = sparse_to_shared_memory(URM_train)
+        pool = None
+
+        try:
+            # Several blocks per worker to balance the load and to print the progress
+            n_blocks = min(n_items, n_jobs * 10)
+            item_block_list = np.array_split(np.arange(n_items), n_blocks)
+
+            pool = multiprocessing.Pool(processes=n_jobs,
+                                        initializer=init_worker_state,
+                                        initargs=({"URM_train": URM_descriptor},
+                                                  {"model": ElasticNet(**self.model.get_params()), "topK": self.topK},
+                                                  ["URM_train"]))
+
+            rows_list = []
+            cols_list = []
+            values_list = []
+
+            processed_items = 0
+
+            start_time = time.time()
+            start_time_printBatch = start_time
+
+            for block_rows, block_cols, block_values, block_n_items in pool.imap_unordered(_fit_items_block,
+                                                                                          item_block_list):
+
+                rows_list.append(block_rows)
+                cols_list.append(block_cols)
+                values_list.append(block_values)
+
+                processed_items += block_n_items
+
+                if verbose and (time.time() - start_time_printBatch > 300 or processed_items == n_items):
+                    print("{}: Processed {} ( {:.2f}% ) with {} workers in {:.2f} minutes. Items per second: {:.0f}".format(
+                        self.RECOMMENDER_NAME,
+                        processed_items,
+                        100.0 * float(processed_items) / n_items,
+                        n_jobs,
+                        (time.time() - start_time) / 60,
+                        float(processed_items) / (time.time() - start_time)))
+
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+
+                    start_time_printBatch = time.time()
+
+            pool.close()
+            pool.join()
+
+        finally:
+            # If an exception is raised the workers are still attached to the shared memory
+            if pool is not None:
+                pool.terminate()
+
+            release_shared_memory(shared_memory_list)
+
+        # generate the sparse weight matrix
+        self.W_sparse = sps.csr_matrix((np.concatenate(values_list),
+                                        (np.concatenate(rows_list), np.concatenate(cols_list))),
+                                       shape=(n_items, n_items), dtype=np.float32)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+
+Densifies batches of rows of a sparse matrix into preallocated buffers, to be used as the input of dense models.
+While the current batch is being used, e.g., by a tensorflow training step which releases the GIL,
+a background thread prepares the following ones.
+
+"""
+
+import numpy as np
+import scipy.sparse as sps
+import threading, queue
+
+
+class SparseBatchPrefetcher(object):
+    """
+    The arrays returned are views of the internal buffers and remain valid only until the next batch is requested.
+    Only the cells written by the previous batch are reset, so the cost of a batch depends on its non-zeros.
+    """
+
+    def __init__(self, X, batch_size, n_buffers=2, dtype=np.float32):
+        """
+        :param X:           sparse matrix whose rows are densified, it must not be modified while in use
+        :param batch_size:  max number of rows of a batch
+        :param n_buffers:   number of batches that can be prepared in advance
+        :param dtype:
+        """
+
+        super(SparseBatchPrefetcher, self).__init__()
+
+        assert n_buffers >= 1, "SparseBatchPrefetcher: n_buffers must be >= 1, provided was {}".format(n_buffers)
+
+        self.X = sps.csr_matrix(X, dtype=dtype)
+        self.X.sum_duplicates()
+
+        self.batch_size = batch_size
+        self.n_buffers = n_buffers
+
+        # The last buffer is reserved to get_rows
+        self._buffer_list = [np.zeros((batch_size, self.X.shape[1]), dtype=dtype) for _ in range(n_buffers + 1)]
+        self._buffer_written_cells = [None] * (n_buffers + 1)
+
+    def _densify_rows(self, buffer_index, row_array):
+        """
+        Writes the rows of X in the first len(row_array) rows of the buffer
+        :return: the view of the buffer containing the rows
+        """
+
+        buffer = self._buffer_list[buffer_index]
+
+        # Reset the cells written by the previous batch
+        if self._buffer_written_cells[buffer_index] is not None:
+            buffer[self._buffer_written_cells[buffer_index]] = 0.0
+
+        row_array = np.asarray(row_array, dtype=np.int64)
+        n_rows = len(row_array)
+
+        row_start = self.X.indptr[row_array]
+        row_nnz = self.X.indptr[row_array + 1] - row_start
+
+        buffer_row = np.repeat(np.arange(n_rows), row_nnz)
+        data_position = np.arange(len(buffer_row)) - np.repeat(np.cumsum(row_nnz) - row_nnz, row_nnz) + \
+                        np.repeat(row_start, row_nnz)
+
+        written_cells = (buffer_row, self.X.indices[data_position])
+
+        buffer[written_cells] = self.X.data[data_position]
+        self._buffer_written_cells[buffer_index] = written_cells
+
+        return buffer[:n_rows]
+
+    def get_rows(self, row_array):
+        """
+        Densifies the rows in row_array, at most batch_size
+        :return: dense array (len(row_array), n_columns)
+        """
+
+        assert len(row_array) <= self.batch_size, "SparseBatchPrefetcher: requested {} rows, more than the batch size {}".format(
+            len(row_array), self.batch_size)
+
+        return self._densify_rows(self.n_buffers, row_array)
+
+    def iterate_batches(self, row_array):
+        """
+        Densifies the rows in row_array in consecutive batches of batch_size, prepared by a background thread
+        :return: generator of the dense batches
+        """
+
+        free_buffers = queue.Queue()
+        ready_batches = queue.Queue()
+        stop_event = threading.Event()
+
+        for buffer_index in range(self.n_buffers):
+            free_buffers.put(buffer_index)
+
+        batch_start_list = list(range(0, len(row_array), self.batch_size))
+
+        def _producer():
+            try:
+                for start_idx in batch_start_list:
+                    buffer_index = free_buffers.get()
+
+                    if stop_event.is_set():
+                        return
+
+                    batch = self._densify_rows(buffer_index, row_array[start_idx:start_idx + self.batch_size])
+                    ready_batches.put((buffer_index, batch, None))
+
+            except Exception as exception:
+                ready_batches.put((None, None, exception))
+
+        producer_thread = threading.Thread(target=_producer, daemon=True)
+        producer_thread.start()
+
+        try:
+            for _ in batch_start_list:
+                buffer_index, batch, exception = ready_batches.get()
+
+                if exception is not None:
+                    raise exception
+
+                yield batch
+
+                # The batch has been used, the buffer can be filled again
+                free_buffers.put(buffer_index)
+
+        finally:
+            # Unblock the producer if the iteration ended early
+            stop_event.set()
+            free_buffers.put(None)
+            producer_thread.join()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sps
+
+from Utils.SparseBatchPrefetcher import SparseBatchPrefetcher
+
+
+class MyTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.X = sps.random(100, 30, density=0.2, format="csr", dtype=np.float32)
+        self.X_dense = self.X.toarray()
+
+    def test_iterate_batches(self):
+
+        batch_size = 16
+        batch_prefetcher = SparseBatchPrefetcher(self.X, batch_size, n_buffers=2)
+
+        row_array = np.random.permutation(self.X.shape[0])
+
+        # Iterated twice, the cells written by the previous batches of each buffer must be reset
+        for _ in range(2):
+
+            n_batches = 0
+
+            for batch_index, batch in enumerate(batch_prefetcher.iterate_batches(row_array)):
+
+                batch_rows = row_array[batch_index * batch_size:(batch_index + 1) * batch_size]
+
+                self.assertEqual(batch.dtype, np.float32)
+                self.assertTrue(np.array_equal(batch, self.X_dense[batch_rows]))
+                n_batches += 1
+
+            self.assertEqual(n_batches, int(np.ceil(len(row_array) / batch_size)))
+
+    def test_iterate_batches_early_stop(self):
+
+        batch_prefetcher = SparseBatchPrefetcher(self.X, 10, n_buffers=2)
+
+        for batch in batch_prefetcher.iterate_batches(np.arange(self.X.shape[0])):
+            break
+
+        # The producer thread is stopped, a new iteration starts from the first batch
+        batch = next(iter(batch_prefetcher.iterate_batches(np.arange(5, self.X.shape[0]))))
+        self.assertTrue(np.array_equal(batch, self.X_dense[5:15]))
+
+    def test_get_rows(self):
+
+        batch_prefetcher = SparseBatchPrefetcher(self.X, 20)
+
+        self.assertTrue(np.array_equal(batch_prefetcher.get_rows(np.arange(20)), self.X_dense[:20]))
+        self.assertTrue(np.array_equal(batch_prefetcher.get_rows([3, 50, 3]), self.X_dense[[3, 50, 3]]))
+
+        with self.assertRaises(AssertionError):
+            batch_prefetcher.get_rows(np.arange(21))
+
+
+if __name__ == '__main__':
+    unittest.main()
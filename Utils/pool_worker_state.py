@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+
+State of the processes of a multiprocessing.Pool.
+init_worker_state is given as the pool initializer, it attaches to the matrices placed in shared memory by the
+parent process and stores them, together with the other objects the worker needs, in the state of the process.
+The functions executed by the pool read them with get_worker_state.
+
+"""
+
+from Utils.shared_memory_sparse import sparse_from_shared_memory, dense_from_shared_memory
+
+
+# State of each worker process, set by the pool initializer
+_worker_state = {}
+
+
+def init_worker_state(shared_descriptor_dict, state_dict, copy_data_list=()):
+    """
+    Pool initializer
+    :param shared_descriptor_dict:  {name: descriptor} of the matrices in shared memory, as returned by sparse_to_shared_memory
+                                    or dense_to_shared_memory
+    :param state_dict:              {name: object} of the other objects required by the worker
+    :param copy_data_list:          names of the sparse matrices whose data array is copied, see sparse_from_shared_memory
+    :return:
+    """
+
+    _worker_state.clear()
+
+    shared_memory_list = []
+
+    for name, descriptor in shared_descriptor_dict.items():
+
+        if descriptor["format"] == "dense":
+            X, X_shared_memory_list = dense_from_shared_memory(descriptor)
+        else:
+            X, X_shared_memory_list = sparse_from_shared_memory(descriptor, copy_data=name in copy_data_list)
+
+        shared_memory_list.extend(X_shared_memory_list)
+        _worker_state[name] = X
+
+    # Keep a reference to the blocks, otherwise the buffers are released
+    _worker_state["shared_memory_list"] = shared_memory_list
+    _worker_state.update(state_dict)
+
+
+def get_worker_state():
+    return _worker_state
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 18/10/2026
+
+@author: agent
+
+Utilities to share a CSR or CSC matrix, or a dense array, among worker processes without copying it.
+The parent process copies data, indices and indptr (or the dense array) in shared memory blocks and passes to the
+workers only the descriptor, which contains the block names, shapes and dtypes.
+
+"""
+
+import numpy as np
+import scipy.sparse as sps
+
+
+def sparse_to_shared_memory(X):
+    """
+    Copies the data structures of a CSR or CSC matrix in shared memory
+    :param X:   csr or csc matrix
+    :return: descriptor, shared_memory_list. The blocks in shared_memory_list must be released with
+             release_shared_memory once the workers have terminated
+    """
+
+    # Available from python 3.8, imported here so that the module can be imported also by older versions
+    from multiprocessing import shared_memory
+
+    assert X.getformat() in ["csr", "csc"], "sparse_to_shared_memory: matrix format must be csr or csc, provided was {}".format(X.getformat())
+
+    descriptor = {"format": X.getformat(),
+                  "shape": X.shape,
+                  "arrays": {}}
+
+    shared_memory_list = []
+
+    try:
+        for array_name in ["data", "indices", "indptr"]:
+
+            array = getattr(X, array_name)
+
+            # A block of size 0 is not allowed
+            shared_block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared_memory_list.append(shared_block)
+
+            shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=shared_block.buf)
+            shared_array[:] = array[:]
+
+            descriptor["arrays"][array_name] = {"name": shared_block.name,
+                                                "shape": array.shape,
+                                                "dtype": array.dtype}
+    except (OSError, ValueError, MemoryError):
+        release_shared_memory(shared_memory_list)
+        raise
+
+    return descriptor, shared_memory_list
+
+
+def sparse_from_shared_memory(descriptor, copy_data=False):
+    """
+    Attaches to the shared memory blocks and builds the sparse matrix on them, the arrays must not be modified
+    :param descriptor:  as returned by sparse_to_shared_memory
+    :param copy_data:   if True the data array is copied in the memory of the current process and can be modified,
+                        indices and indptr remain shared
+    :return: X, shared_memory_list. The caller must keep a reference to shared_memory_list as long as X is used
+    """
+
+    from multiprocessing import shared_memory
+
+    shared_memory_list = []
+    array_dict = {}
+
+    for array_name, array_descriptor in descriptor["arrays"].items():
+
+        shared_block = shared_memory.SharedMemory(name=array_descriptor["name"])
+        shared_memory_list.append(shared_block)
+
+        array_dict[array_name] = np.ndarray(array_descriptor["shape"],
+                                            dtype=array_descriptor["dtype"],
+                                            buffer=shared_block.buf)
+
+    if copy_data:
+        array_dict["data"] = array_dict["data"].copy()
+
+    if descriptor["format"] == "csr":
+        constructor = sps.csr_matrix
+    else:
+        constructor = sps.csc_matrix
+
+    X = constructor((array_dict["data"], array_dict["indices"], array_dict["indptr"]),
+                    shape=descriptor["shape"], copy=False)
+
+    return X, shared_memory_list
+
+
+def dense_to_shared_memory(X):
+    """
+    Copies a dense array in shared memory
+    :param X:   numpy array
+    :return: descriptor, shared_memory_list. The blocks in shared_memory_list must be released with
+             release_shared_memory once the workers have terminated
+    """
+
+    from multiprocessing import shared_memory
+
+    X = np.ascontiguousarray(X)
+
+    shared_block = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+
+    try:
+        shared_array = np.ndarray(X.shape, dtype=X.dtype, buffer=shared_block.buf)
+        shared_array[:] = X[:]
+    except (OSError, ValueError, MemoryError):
+        release_shared_memory([shared_block])
+        raise
+
+    descriptor = {"format": "dense",
+                  "name": shared_block.name,
+                  "shape": X.shape,
+                  "dtype": X.dtype}
+
+    return descriptor, [shared_block]
+
+
+def dense_from_shared_memory(descriptor):
+    """
+    Attaches to the shared memory block and builds the array on it, the array must not be modified
+    :param descriptor:  as returned by dense_to_shared_memory
+    :return: X, shared_memory_list. The caller must keep a reference to shared_memory_list as long as X is used
+    """
+
+    from multiprocessing import shared_memory
+
+    shared_block = shared_memory.SharedMemory(name=descriptor["name"])
+
+    X = np.ndarray(descriptor["shape"], dtype=descriptor["dtype"], buffer=shared_block.buf)
+
+    return X, [shared_block]
+
+
+def release_shared_memory(shared_memory_list):
+    """
+    Closes and removes the shared memory blocks created by sparse_to_shared_memory
+    :param shared_memory_list:
+    :return:
+    """
+
+    for shared_block in shared_memory_list:
+        shared_block.close()
+        shared_block.unlink()
@@ -200,9 +200,13 @@ def read_data_split_and_search_MCRec(dataset_name):
                                            evaluator_validation=evaluator_validation,
                                            evaluator_test=evaluator_test)
 
+        # The memory-mapped path stores are kept with the results of the experiment
+        MCRec_fit_keyword_args = dict(MCRec_earlystopping_parameters)
+        MCRec_fit_keyword_args["path_store_folder"] = output_folder_path + "MCRec_path_store/"
+
         recommender_parameters = SearchInputRecommenderParameters(
             CONSTRUCTOR_POSITIONAL_ARGS=[URM_train],
-            FIT_KEYWORD_ARGS=MCRec_earlystopping_parameters)
+            FIT_KEYWORD_ARGS=MCRec_fit_keyword_args)
 
         parameterSearch.search(recommender_parameters,
                                fit_parameters_values=MCRec_article_parameters,
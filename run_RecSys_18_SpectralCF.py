@@ -78,7 +78,8 @@ def runParameterSearch_SpectralCF(recommender_class, URM_train, earlystopping_pa
 
 def read_data_split_and_search_SpectralCF(dataset_name, cold_start=False,
                                           cold_items=None, isKNN_multiprocess=True, isKNN_tune=True,
-                                          isSpectralCF_train_default=True, isSpectralCF_tune=True, print_results=True):
+                                          isSpectralCF_train_default=True, isSpectralCF_tune=True, print_results=True,
+                                          n_eigenpairs=None):
     if dataset_name == "movielens1m_original":
         assert (cold_start is not True)
         dataset = Movielens1MReader(type="original")
@@ -100,6 +101,10 @@ def read_data_split_and_search_SpectralCF(dataset_name, cold_start=False,
         output_folder_path = "result_experiments/{}/{}_cold_{}_{}/".format(CONFERENCE_NAME, ALGORITHM_NAME, cold_items,
                                                                            dataset_name)
 
+    # The truncated spectrum is not the model of the article, its results are kept apart
+    if n_eigenpairs is not None:
+        output_folder_path = output_folder_path[:-1] + "_{}_eigenpairs/".format(n_eigenpairs)
+
     URM_train = dataset.URM_train.copy()
     URM_validation = dataset.URM_validation.copy()
     URM_test = dataset.URM_test.copy()
@@ -187,6 +192,7 @@ def read_data_split_and_search_SpectralCF(dataset_name, cold_start=False,
                 "decay": 0.001,
                 "k": 3,
                 "learning_rate": 1e-3,
+                "n_eigenpairs": n_eigenpairs,
             }
 
             spectralCF_earlystopping_parameters = {
@@ -228,7 +234,8 @@ def read_data_split_and_search_SpectralCF(dataset_name, cold_start=False,
                 "evaluator_object": evaluator_validation,
                 "validation_metric": metric_to_optimize,
                 "epochs_min": 400,
-                "epochs": 2000
+                "epochs": 2000,
+                "n_eigenpairs": n_eigenpairs,
             }
 
             runParameterSearch_SpectralCF(SpectralCF_RecommenderWrapper,
@@ -297,6 +304,10 @@ if __name__ == '__main__':
     isSpectralCF_tune = True
     # print_results = True: print the results read from the output folder, False: avoid this step
     print_results = True
+    # n_eigenpairs: number of eigenpairs of the laplacian with the smallest eigenvalues used by SpectralCF, computed with a sparse solver.
+    # None computes all of them with the dense decomposition of the article, cubic in the number of users and items.
+    # Set it only for catalogues too large for the dense decomposition, the model is then not the one of the article
+    n_eigenpairs = None
 
     cold_start = False
 
@@ -311,7 +322,8 @@ if __name__ == '__main__':
                                                       isKNN_multiprocess=isKNN_multiprocess,
                                                       isKNN_tune=isKNN_tune,
                                                       isSpectralCF_train_default=isSpectralCF_train_default,
-                                                      print_results=print_results
+                                                      print_results=print_results,
+                                                      n_eigenpairs=n_eigenpairs
                                                       )
 
 
@@ -321,7 +333,8 @@ if __name__ == '__main__':
                                                   isKNN_multiprocess=isKNN_multiprocess,
                                                   isKNN_tune=isKNN_tune,
                                                   isSpectralCF_train_default=isSpectralCF_train_default,
-                                                  print_results=print_results
+                                                  print_results=print_results,
+                                                  n_eigenpairs=n_eigenpairs
                                                   )
 
     # mantain compatibility with latex parameteres function
@@ -12,6 +12,7 @@ from CythonCompiler.run_compile_subprocess import run_compile_subprocess
 if __name__ == '__main__':
 
     subfolder_to_compile_list = [
+        "Base",
         "Base/Similarity",
     ]
 